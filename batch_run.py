@@ -0,0 +1,209 @@
+"""Bulk plan recommendations from a JSONL file of PreferenceRequest records.
+
+Each input line is {"preferences": ..., "plans": [...]} with an optional
+"id". Results are written as JSONL in completion order. With --checkpoint,
+finished records are saved as they complete and skipped when the same
+batch is run again; the output file is rewritten with every record's result.
+
+    python batch_run.py employees.jsonl --output results.jsonl --checkpoint batch.ckpt --concurrency 8
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import sys
+import threading
+import time
+
+from pydantic import ValidationError
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def record_key(preferences, plans) -> str:
+    """Identical preference/plan pairs share a key and are only run once."""
+    payload = json.dumps({"preferences": preferences, "plans": plans}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Checkpoint:
+    """Append-only JSONL of finished records, keyed by ``record_key``."""
+
+    def __init__(self, path):
+        self.path = path
+        self._results = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A crash can leave a torn last line behind
+                        continue
+                    self._results[entry["key"]] = entry["result"]
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, key):
+        return key in self._results
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, key):
+        return self._results.get(key)
+
+    def record(self, key, result):
+        with self._lock:
+            self._results[key] = result
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "result": result}) + "\n")
+
+
+async def run_batch(lines, run_one, request_model, concurrency=4, checkpoint=None, progress_every=25):
+    """Run every record in ``lines`` through ``run_one`` and yield results as they finish.
+
+    ``lines`` is an async iterable of JSONL lines, ``run_one`` an async
+    callable taking a validated ``request_model`` and returning the answer
+    text. At most ``concurrency`` records run at once, and reading input
+    pauses while all slots are busy. Every input line yields exactly one
+    result, followed by a final summary.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    out = asyncio.Queue()
+    waiting = {}   # key -> [(index, id)] for records sharing an in-flight run
+    finished = {}  # key -> result, to answer later duplicates
+    stats = {"records": 0, "ok": 0, "errors": 0, "deduplicated": 0, "resumed": 0}
+    started = time.perf_counter()
+
+    def emit(index, record_id, status, payload, **extra):
+        stats["ok" if status == "ok" else "errors"] += 1
+        done = stats["ok"] + stats["errors"]
+        if progress_every and done % progress_every == 0:
+            logger.info("batch progress: %d/%d records done (%d errors)", done, stats["records"], stats["errors"])
+        out.put_nowait({"index": index, "id": record_id, "status": status, payload[0]: payload[1], **extra})
+
+    async def execute(key, request):
+        try:
+            result = await run_one(request)
+        except Exception as e:
+            outcome = ("error", ("error", str(e)))
+        else:
+            outcome = ("ok", ("result", result))
+            finished[key] = result
+            if checkpoint is not None:
+                await asyncio.to_thread(checkpoint.record, key, result)
+        finally:
+            slots.release()
+        for index, record_id in waiting.pop(key):
+            emit(index, record_id, *outcome)
+
+    async def feed():
+        tasks = []
+        index = -1
+        async for line in lines:
+            if not line.strip():
+                continue
+            index += 1
+            stats["records"] += 1
+            record_id = None
+            try:
+                data = json.loads(line)
+                record_id = data.get("id") if isinstance(data, dict) else None
+                request = request_model.model_validate(data)
+            except (ValueError, ValidationError) as e:
+                emit(index, record_id, "error", ("error", f"Invalid record: {e}"))
+                continue
+
+            key = record_key(request.preferences, request.plans)
+            if checkpoint is not None and key in checkpoint:
+                stats["resumed"] += 1
+                emit(index, record_id, "ok", ("result", checkpoint.get(key)), resumed=True)
+            elif key in finished:
+                stats["deduplicated"] += 1
+                emit(index, record_id, "ok", ("result", finished[key]), deduplicated=True)
+            elif key in waiting:
+                stats["deduplicated"] += 1
+                waiting[key].append((index, record_id))
+            else:
+                await slots.acquire()
+                waiting[key] = [(index, record_id)]
+                tasks.append(asyncio.create_task(execute(key, request)))
+
+        await asyncio.gather(*tasks)
+        out.put_nowait(_DONE)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while True:
+            getter = asyncio.ensure_future(out.get())
+            await asyncio.wait({getter, feeder}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                item = getter.result()
+            else:
+                # The feeder finished first: re-raise if it failed, else drain the queue
+                feeder.result()
+                item = await getter
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        feeder.cancel()
+        getter.cancel()
+
+    stats["elapsed_s"] = round(time.perf_counter() - started, 3)
+    yield {"summary": stats}
+
+
+# ---- CLI ----
+async def _file_lines(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield line
+
+
+async def _main(args):
+    import main
+    from streaming import output_text
+
+    loop = asyncio.get_running_loop()
+
+    async def run_one(request):
+        response = await loop.run_in_executor(None, main.kickoff_crew, request.preferences, request.plans)
+        return output_text(response)
+
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+    if checkpoint is not None and len(checkpoint):
+        print(f"Resuming: {len(checkpoint)} records already done", file=sys.stderr)
+
+    # Rewritten in full: resumed records come back from the checkpoint, so
+    # appending would repeat everything an earlier run already wrote
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    processed = 0
+    try:
+        async for item in run_batch(_file_lines(args.input), run_one, main.PreferenceRequest,
+                                    concurrency=args.concurrency, checkpoint=checkpoint, progress_every=0):
+            out.write(json.dumps(item) + "\n")
+            out.flush()
+            if "summary" in item:
+                print(f"\nDone: {item['summary']}", file=sys.stderr)
+            else:
+                processed += 1
+                print(f"\r{processed} records processed", end="", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of PreferenceRequest records")
+    parser.add_argument("--output", help="Where to write JSONL results (default: stdout)")
+    parser.add_argument("--checkpoint", help="Checkpoint file used to resume an interrupted batch")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(_main(args))
@@ -0,0 +1,64 @@
+"""Micro-benchmark of per-request crew setup cost for POST /run.
+
+"before" builds the Agents, Tasks and Crew for every request, as /run used
+to. "after" checks a prebuilt crew out of the registry and only binds the
+request inputs. Neither variant calls an LLM.
+
+    python benchmarks/crew_setup.py --iterations 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Agent construction resolves a default LLM; it never gets called here
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import main
+
+INPUTS = {
+    "preferences": "Low deductible, keep my current doctor.",
+    "plans": main.format_plans([
+        {"name": "Gold PPO", "deductible": 500, "monthly_premium": 420, "network": "PPO"},
+        {"name": "Silver HMO", "deductible": 1500, "monthly_premium": 280, "network": "HMO"},
+    ]),
+}
+
+
+def per_request_build():
+    crew = main.build_recommendation_crew()
+    crew._interpolate_inputs(INPUTS)
+
+
+def registry_checkout():
+    with main.crew_registry.get("recommendation").checkout() as crew:
+        crew._interpolate_inputs(INPUTS)
+
+
+def measure(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "mean_ms": round(statistics.mean(samples), 3),
+        "p50_ms": round(statistics.median(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    main.crew_registry.warm()
+    before = measure(per_request_build, args.iterations)
+    after = measure(registry_checkout, args.iterations)
+    print("before (build per request):", before)
+    print("after (registry checkout): ", after)
+    print(f"speedup: {before['mean_ms'] / after['mean_ms']:.1f}x")
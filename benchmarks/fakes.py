@@ -0,0 +1,265 @@
+"""Deterministic local stand-ins for Gemini, the crewAI default LLM, Vectorize and Supabase.
+
+Nothing here talks to the network except the Vectorize stub, which listens
+on 127.0.0.1 so the real VectorizeClient (pooling, retries, breaker) is
+exercised end to end.
+"""
+import hashlib
+import json
+import operator
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+# Questions the fake Stage 1 can't answer from the DBG, so they go to Stage 2
+KB_ONLY_QUESTIONS = (
+    "Are pets covered by any of our benefits?",
+    "Is there a commuter benefit for transit passes?",
+    "Does the company match charitable donations?",
+    "Can I get reimbursed for a standing desk?",
+)
+DBG_QUESTIONS = (
+    "What is the HSA contribution limit?",
+    "How many PTO days do I get?",
+    "Does the medical plan cover acupuncture?",
+    "How does parental leave work?",
+    "What dental plans are available?",
+)
+
+_FILLER = ("Your", "plan", "covers", "this", "benefit", "with", "a", "modest", "copay", "and",
+           "no", "extra", "paperwork", "so", "you", "can", "use", "it", "right", "away")
+
+
+def is_kb_only(text: str) -> bool:
+    return any(q in text for q in KB_ONLY_QUESTIONS)
+
+
+def count_tokens(text: str) -> int:
+    # Close enough to a real tokenizer for latency modelling
+    return max(1, len(text) // 4)
+
+
+class LatencyModel:
+    """A fixed time to first token plus ``answer_tokens`` generated at ``tokens_per_second``."""
+
+    def __init__(self, first_token: float = 0.2, tokens_per_second: float = 200.0, answer_tokens: int = 120):
+        self.first_token = first_token
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+
+    def answer(self, seed: str, tokens: int = None) -> str:
+        tokens = tokens or self.answer_tokens
+        offset = int(hashlib.sha256(seed.encode("utf-8")).hexdigest()[:8], 16)
+        return " ".join(_FILLER[(offset + i) % len(_FILLER)] for i in range(tokens))
+
+    def wait(self, tokens: int):
+        time.sleep(self.first_token + tokens / self.tokens_per_second)
+
+
+# ---- Gemini ----
+class FakeGeminiClient:
+    """Drop-in for ``genai.GenerativeModel`` as used by GeminiLLM.
+
+    Stage 1 answers "Insufficient information" for KB_ONLY_QUESTIONS, the
+    router gets a JSON verdict, everything else a filler answer.
+    """
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.calls = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _respond(self, prompt, generation_config):
+        if generation_config and generation_config.get("response_mime_type") == "application/json":
+            kind = "router"
+            question = prompt.split("**QUESTION**")[-1]
+            text = json.dumps({"label": "New question", "answerable": not is_kb_only(question)})
+        elif "Stage 2" in prompt:
+            kind = "stage2"
+            text = self.latency.answer(prompt[-200:])
+        else:
+            kind = "stage1"
+            question = prompt.split("**CURRENT QUESTION:**")[-1]
+            text = "Insufficient information" if is_kb_only(question) else self.latency.answer(prompt[-200:])
+        with self._lock:
+            self.calls[kind] += 1
+        # crewAI agents parse the answer out of this format
+        return f"Thought: I can answer this.\nFinal Answer: {text}"
+
+    @staticmethod
+    def _usage(prompt, text):
+        return SimpleNamespace(prompt_token_count=count_tokens(prompt), candidates_token_count=count_tokens(text))
+
+    def generate_content(self, prompt, stream=False, generation_config=None):
+        text = self._respond(prompt, generation_config)
+        usage = self._usage(prompt, text)
+        if not stream:
+            self.latency.wait(count_tokens(text))
+            return SimpleNamespace(text=text, parts=[text], usage_metadata=usage)
+        return self._stream(text, usage)
+
+    def _stream(self, text, usage):
+        time.sleep(self.latency.first_token)
+        words = text.split(" ")
+        for i in range(0, len(words), 8):
+            piece = " ".join(words[i:i + 8]) + " "
+            time.sleep(count_tokens(piece) / self.latency.tokens_per_second)
+            last = i + 8 >= len(words)
+            yield SimpleNamespace(text=piece, parts=[piece], usage_metadata=usage if last else None)
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        import asyncio
+
+        return await asyncio.to_thread(self.generate_content, prompt, False, generation_config)
+
+
+# ---- crewAI default LLM (POST /run) ----
+def fake_crewai_call(latency: LatencyModel):
+    """A replacement for ``crewai.llm.LLM.call`` that answers like the three /run agents."""
+
+    def call(self, messages, *args, **kwargs):
+        prompt = messages if isinstance(messages, str) else "\n".join(str(m.get("content", "")) for m in messages)
+        text = latency.answer(prompt[-200:])
+        latency.wait(count_tokens(text))
+        return f"Thought: I have what I need.\nFinal Answer: {text}"
+
+    return call
+
+
+# ---- Vectorize ----
+class VectorizeStub:
+    """Local HTTP server answering Vectorize retrieval and batch requests after ``latency`` seconds."""
+
+    def __init__(self, latency: float = 0.05, num_documents: int = 6):
+        stub = self
+        self.latency = latency
+        self.num_documents = num_documents
+        self.requests = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stub.requests += 1
+                time.sleep(stub.latency)
+                if "queries" in body:
+                    payload = {"results": [stub.documents(q["question"]) for q in body["queries"]]}
+                else:
+                    payload = stub.documents(body.get("question", ""))
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                # A client that timed out has hung up before the answer; that's expected
+                if not isinstance(sys.exc_info()[1], ConnectionError):
+                    super().handle_error(request, client_address)
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/retrieval"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def documents(self, question):
+        return {"documents": [
+            {
+                "text": f"Excerpt {i} about {question}: employees are eligible after 30 days and "
+                        f"can enroll through the benefits portal. " * 3,
+                "source_display_name": f"Benefits_Summary_{i % 3}.pdf",
+                "metadata": {"page": i + 1},
+                "relevancy": round(0.9 - i * 0.05, 2),
+            }
+            for i in range(self.num_documents)
+        ]}
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# ---- Supabase ----
+class FakeSupabase:
+    """Enough of the supabase-py query builder for SupabaseHistoryBackend."""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.tables = defaultdict(list)
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def table(self, name):
+        return _FakeQuery(self, name)
+
+
+# PostgREST filter operators the fake understands
+_FILTER_OPS = {
+    "eq": operator.eq,
+    "neq": operator.ne,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+
+class _FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self._filters = []
+        self._order = None
+        self._limit = None
+        self._insert = None
+
+    def select(self, *columns):
+        return self
+
+    def filter(self, column, op, value):
+        if op not in _FILTER_OPS:
+            raise ValueError(f"Unsupported filter operator {op!r}")
+        self._filters.append((column, _FILTER_OPS[op], value))
+        return self
+
+    def order(self, column, desc=False):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def insert(self, row):
+        self._insert = row
+        return self
+
+    def execute(self):
+        time.sleep(self.db.latency)
+        with self.db._lock:
+            if self._insert is not None:
+                self.db._next_id += 1
+                row = {**self._insert, "created_at": self.db._next_id}
+                self.db.tables[self.table].append(row)
+                return SimpleNamespace(data=[row])
+            rows = [r for r in self.db.tables[self.table] if all(c in r and op(r[c], v) for c, op, v in self._filters)]
+        if self._order is not None:
+            column, desc = self._order
+            rows.sort(key=lambda r: r[column], reverse=desc)
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return SimpleNamespace(data=rows)
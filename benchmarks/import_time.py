@@ -0,0 +1,70 @@
+"""Cold-start cost of planyear_kb_content_generator, measured in fresh interpreters.
+
+"import" only imports the module, which is what every worker, test and CLI
+pays. "import + services" also builds the Gemini, Supabase, Vectorize and
+cache clients the way the lifespan does at startup, which is roughly what
+importing the module used to cost. Dummy credentials are used; nothing
+talks to the network.
+
+    python benchmarks/import_time.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("crewai", "google.generativeai", "supabase", "requests", "chromadb")
+
+SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import planyear_kb_content_generator as app
+if {build}:
+    for name in ("gemini_llm", "history_store", "vectorize_client", "response_cache"):
+        app.services.get(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+DUMMY_ENV = {
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_SERVICE_ROLE_KEY": "eyJhbGciOiJIUzI1NiJ9.e30.benchmark",
+    "GEMINI_API_KEY": "benchmark",
+    "VECTORIZE_URL": "http://localhost:1/",
+    "CREWAI_DISABLE_TELEMETRY": "true",
+    "OTEL_SDK_DISABLED": "true",
+}
+
+
+def measure(build, runs):
+    code = SNIPPET.format(root=ROOT, build=build, heavy=HEAVY_MODULES)
+    env = {**os.environ, **DUMMY_ENV}
+    samples, loaded = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(result["seconds"] * 1000)
+        loaded = result["loaded"]
+    return {
+        "p50_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "heavy_modules_loaded": loaded,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    import_only = measure(False, args.runs)
+    with_services = measure(True, args.runs)
+    print(f"import:            p50 {import_only['p50_ms']:8.1f} ms  loads {import_only['heavy_modules_loaded']}")
+    print(f"import + services: p50 {with_services['p50_ms']:8.1f} ms  loads {with_services['heavy_modules_loaded']}")
+    print(f"speedup: {with_services['p50_ms'] / import_only['p50_ms']:.1f}x")
@@ -0,0 +1,281 @@
+"""Offline load test for POST /ask and POST /run, run in-process against local fakes.
+
+Gemini and the crewAI default LLM are replaced by a deterministic fake with
+configurable latency and token rate, Vectorize by a local HTTP stub and
+Supabase by an in-memory stand-in (see fakes.py). Everything else - crews,
+routing, caches, pools - is the real code.
+
+Scenarios:
+  single      one request at a time, for baseline latency
+  concurrent  open-loop arrivals at --rate requests/second
+  fallback    open-loop, with --fallback-ratio of /ask questions needing Stage 2
+
+Results go to stdout and, with --output, to JSON. --compare prints the change
+against an earlier JSON file. Run with GEMINI_PROMPT_CACHE=local
+DBG_FULL_GUIDE=true to include prompt-prefix cache savings in the /ask
+results; the guide is below the default caching minimum, so also lower
+GEMINI_PROMPT_CACHE_MIN_TOKENS to the target model's minimum.
+
+    python benchmarks/load_test.py --app ask --requests 40 --rate 8 --output bench.json
+    python benchmarks/load_test.py --compare bench.json --output bench-new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The repo root goes first so its modules win over same-named benchmark scripts
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("CREW_VERBOSE", "false")
+# Keep the job queue's SQLite file out of the working tree
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "jobs.sqlite3"))
+
+import httpx
+
+from fakes import (
+    DBG_QUESTIONS,
+    KB_ONLY_QUESTIONS,
+    FakeGeminiClient,
+    FakeSupabase,
+    LatencyModel,
+    VectorizeStub,
+    fake_crewai_call,
+)
+
+RUN_PAYLOAD = {
+    "preferences": "Low deductible matters most, and I want to keep my current doctor.",
+    "plans": [
+        {"name": "Gold PPO", "deductible": 500, "monthly_premium": 420, "network": "PPO"},
+        {"name": "Silver HMO", "deductible": 1500, "monthly_premium": 280, "network": "HMO"},
+        {"name": "Bronze HDHP", "deductible": 3000, "monthly_premium": 190, "network": "PPO"},
+    ],
+}
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 1)
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---- Request plans ----
+def ask_requests(n, fallback_ratio, repeat, rng, tag=""):
+    """``n`` /ask bodies; unless ``repeat``, each question is unique so caches don't hide the pipeline."""
+    users = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(8)]
+    bodies = []
+    for i in range(n):
+        pool = KB_ONLY_QUESTIONS if rng.random() < fallback_ratio else DBG_QUESTIONS
+        question = rng.choice(pool)
+        if not repeat:
+            question = f"{question} #{tag}{i:04d}"
+        bodies.append({"question": question, "user_id": rng.choice(users)})
+    return bodies
+
+
+async def send_all(client, path, bodies, rate):
+    """Send ``bodies`` open loop: request i starts at i / rate whether or not earlier ones finished."""
+    latencies, statuses = [], []
+
+    async def one(i, body):
+        if rate:
+            await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+        sent = time.perf_counter()
+        try:
+            response = await client.post(path, json=body)
+            statuses.append(response.status_code)
+        except httpx.HTTPError:
+            statuses.append(0)
+        latencies.append((time.perf_counter() - sent) * 1000)
+
+    start = time.perf_counter()
+    if rate:
+        await asyncio.gather(*(one(i, body) for i, body in enumerate(bodies)))
+    else:
+        for i, body in enumerate(bodies):
+            await one(i, body)
+    return time.perf_counter() - start, latencies, statuses
+
+
+def summarize(app_name, scenario, elapsed, latencies, statuses, rss_before, extra=None):
+    ok = sum(s == 200 for s in statuses)
+    return {
+        "app": app_name,
+        "scenario": scenario,
+        "requests": len(statuses),
+        "ok": ok,
+        "rejected": sum(s == 503 for s in statuses),
+        "errors": sum(s not in (200, 503) for s in statuses),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 2) if elapsed else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "rss_mb": rss_mb(),
+        "rss_growth_mb": round(rss_mb() - rss_before, 1),
+        "peak_rss_mb": peak_rss_mb(),
+        **(extra or {}),
+    }
+
+
+# ---- Apps ----
+async def bench_ask(args, latency, scenarios):
+    import planyear_kb_content_generator as app_module
+    from history_store import HistoryStore, SupabaseHistoryBackend
+    from vectorize_client import VectorizeClient
+
+    results = []
+    with VectorizeStub(latency=args.vectorize_latency) as stub:
+        services = app_module.services
+        llm = services.gemini_llm
+        fake = FakeGeminiClient(latency)
+        llm.client = fake
+        services.override(
+            supabase=FakeSupabase(latency=args.supabase_latency),
+            vectorize_client=VectorizeClient(stub.url, "benchmark"),
+        )
+        services.override(history_store=HistoryStore(SupabaseHistoryBackend(services.supabase), size=4))
+
+        async with app_module.app.router.lifespan_context(app_module.app):
+            transport = httpx.ASGITransport(app=app_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+                for scenario in scenarios:
+                    rng = random.Random(args.seed)
+                    fallback_ratio = args.fallback_ratio if scenario == "fallback" else args.base_fallback_ratio
+                    bodies = ask_requests(args.requests, fallback_ratio, args.repeat_questions, rng, tag=scenario)
+                    rate = 0 if scenario == "single" else args.rate
+                    calls_before, vectorize_before = dict(fake.calls), stub.requests
+                    rss_before = rss_mb()
+                    elapsed, latencies, statuses = await send_all(client, "/ask", bodies, rate)
+                    results.append(summarize("ask", scenario, elapsed, latencies, statuses, rss_before, {
+                        "fallback_ratio": fallback_ratio,
+                        "llm_calls": {k: v - calls_before.get(k, 0) for k, v in fake.calls.items()},
+                        "vectorize_requests": stub.requests - vectorize_before,
+                        "prompt_cache": services.prompt_cache.stats() if services.prompt_cache is not None else None,
+                    }))
+    return results
+
+
+async def bench_run(args, latency, scenarios):
+    import crewai.llm
+
+    crewai.llm.LLM.call = fake_crewai_call(latency)
+    import main as app_module
+
+    results = []
+    async with app_module.app.router.lifespan_context(app_module.app):
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            for scenario in scenarios:
+                if scenario == "fallback":
+                    continue  # /run has no fallback path
+                rate = 0 if scenario == "single" else args.rate
+                rss_before = rss_mb()
+                elapsed, latencies, statuses = await send_all(client, "/run", [RUN_PAYLOAD] * args.requests, rate)
+                results.append(summarize("run", scenario, elapsed, latencies, statuses, rss_before))
+    return results
+
+
+# ---- Reporting ----
+def print_results(results):
+    header = f"{'app':<4} {'scenario':<11} {'ok':>4} {'rej':>4} {'err':>4} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rss MB':>7}"
+    print(header)
+    for r in results:
+        print(f"{r['app']:<4} {r['scenario']:<11} {r['ok']:>4} {r['rejected']:>4} {r['errors']:>4} "
+              f"{r['throughput_rps'] or 0:>7.2f} {r['p50_ms'] or 0:>8.1f} {r['p95_ms'] or 0:>8.1f} "
+              f"{r['p99_ms'] or 0:>8.1f} {r['rss_mb']:>7.1f}")
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(r["app"], r["scenario"]): r for r in baseline["results"]}
+    print(f"\nChange vs {baseline_path} (commit {baseline.get('commit')}):")
+    for r in results:
+        before = previous.get((r["app"], r["scenario"]))
+        if before is None:
+            continue
+        changes = []
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "rss_mb"):
+            if before.get(key) and r.get(key) is not None:
+                changes.append(f"{key} {100 * (r[key] - before[key]) / before[key]:+.1f}%")
+        print(f"  {r['app']}/{r['scenario']}: " + ", ".join(changes))
+
+
+async def main_async(args):
+    latency = LatencyModel(args.first_token, args.tokens_per_second, args.answer_tokens)
+    results = []
+    if args.app in ("ask", "both"):
+        results += await bench_ask(args, latency, args.scenarios)
+    if args.app in ("run", "both"):
+        results += await bench_run(args, latency, args.scenarios)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", choices=("ask", "run", "both"), default="both")
+    parser.add_argument("--scenarios", nargs="+", choices=("single", "concurrent", "fallback"),
+                        default=["single", "concurrent", "fallback"])
+    parser.add_argument("--requests", type=int, default=20, help="Requests per scenario")
+    parser.add_argument("--rate", type=float, default=5.0, help="Open-loop arrivals per second")
+    parser.add_argument("--first-token", type=float, default=0.2, help="Fake LLM seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--vectorize-latency", type=float, default=0.05)
+    parser.add_argument("--supabase-latency", type=float, default=0.02)
+    parser.add_argument("--base-fallback-ratio", type=float, default=0.2)
+    parser.add_argument("--fallback-ratio", type=float, default=0.8, help="Share of Stage 2 questions in 'fallback'")
+    parser.add_argument("--repeat-questions", action="store_true", help="Allow repeated questions (cache hits)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print_results(results)
+    if args.compare:
+        print_comparison(results, args.compare)
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved {args.output}")
@@ -0,0 +1,50 @@
+"""Benchmark plan_ranker at 10, 1k and 100k plans.
+
+    python benchmarks/plan_ranker.py --sizes 10 1000 100000 --repeat 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plan_ranker import rank_for_preferences
+
+CRITERIA = """1. Keeping monthly premiums low is the top priority
+2. Wants to stay with current doctors in a PPO network
+3. Moderate deductible is acceptable
+"""
+
+
+def make_plans(n, seed=0):
+    rng = random.Random(seed)
+    networks = ["PPO", "HMO", "EPO", "HDHP"]
+    return [
+        {
+            "name": f"Plan {i}",
+            "deductible": f"${rng.randrange(0, 7000, 50):,}",
+            "monthly_premium": rng.randrange(50, 900),
+            "network": rng.choice(networks),
+        }
+        for i in range(n)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        plans = make_plans(size)
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            ranked = rank_for_preferences(plans, CRITERIA, top_k=args.top_k)
+            samples.append((time.perf_counter() - start) * 1000)
+        print(f"{size:>7} plans: median {statistics.median(samples):8.2f} ms, best {min(samples):8.2f} ms, top pick {ranked[0][0]['name']}")
@@ -0,0 +1,82 @@
+"""Load test for POST /run against a stubbed crew.
+
+The real kickoff is replaced by a sleep that stands in for three sequential
+LLM calls, so the numbers only reflect how the endpoint schedules work.
+
+    python benchmarks/run_load.py --requests 32 --latency 0.5 --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from crew_pool import CrewPool
+
+PAYLOAD = {
+    "preferences": "Low deductible, keep my current doctor.",
+    "plans": [
+        {"name": "Gold PPO", "deductible": 500, "monthly_premium": 420, "network": "PPO"},
+        {"name": "Silver HMO", "deductible": 1500, "monthly_premium": 280, "network": "HMO"},
+    ],
+}
+
+
+def stub_kickoff(latency):
+    def kickoff(user_text, plans):
+        time.sleep(latency)
+        return "Gold PPO"
+    return kickoff
+
+
+async def run_scenario(workers, queue_size, n_requests, latency):
+    main.crew_pool = CrewPool(workers=workers, queue_size=queue_size)
+    main.kickoff_crew = stub_kickoff(latency)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/run", json=PAYLOAD) for _ in range(n_requests)))
+        elapsed = time.perf_counter() - start
+
+        # The root endpoint must stay responsive while the pool is busy
+        busy = [client.post("/run", json=PAYLOAD) for _ in range(workers)]
+        probe_start = time.perf_counter()
+        tasks = [asyncio.ensure_future(b) for b in busy]
+        await asyncio.sleep(0)
+        await client.get("/")
+        probe = time.perf_counter() - probe_start
+        await asyncio.gather(*tasks)
+
+    main.crew_pool.shutdown()
+    ok = sum(r.status_code == 200 for r in responses)
+    rejected = sum(r.status_code == 503 for r in responses)
+    return {
+        "workers": workers,
+        "ok": ok,
+        "rejected": rejected,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 2),
+        "root_latency_ms": round(probe * 1000, 2),
+    }
+
+
+async def main_async(args):
+    for workers in args.workers:
+        # Size the queue so every request is admitted and throughput reflects the pool
+        result = await run_scenario(workers, args.requests, args.requests, args.latency)
+        print(result)
+    print("admission control:", await run_scenario(1, 0, args.requests, args.latency))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per stubbed kickoff")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    asyncio.run(main_async(parser.parse_args()))
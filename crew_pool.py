@@ -0,0 +1,109 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class PoolSaturated(Exception):
+    """Raised when a crew run is rejected because the pool is at capacity."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Crew pool is at capacity, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class CrewPool:
+    """Bounded executor for blocking crew kickoffs with admission control.
+
+    At most ``workers`` kickoffs run at once and at most ``queue_size`` more
+    wait for a free worker. Anything beyond that is rejected immediately with
+    ``PoolSaturated`` instead of piling up behind slow LLM calls.
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 0, kind: str = "thread", retry_after: int = 5):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind!r}")
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.kind = kind
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crew")
+        return self._executor
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def reserve(self) -> "Reservation":
+        """Take a slot now, for work submitted later with ``Reservation.run``.
+
+        Raises ``PoolSaturated`` when the pool is full, so a caller can reject
+        a request before committing to a response.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise PoolSaturated(self.retry_after)
+        with self._lock:
+            self._in_flight += 1
+        return Reservation(self)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on the pool without blocking the event loop.
+
+        With the process executor ``fn`` and its arguments must be picklable.
+        """
+        return await self.reserve().run(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+class Reservation:
+    """A pool slot held for one run. ``release`` gives it back if the run never starts."""
+
+    def __init__(self, pool: CrewPool):
+        self._pool = pool
+        self._done = False
+        self._lock = threading.Lock()
+
+    def _claim(self) -> bool:
+        with self._lock:
+            if self._done:
+                return False
+            self._done = True
+            return True
+
+    async def run(self, fn, *args, **kwargs):
+        if not self._claim():
+            raise RuntimeError("Reservation already used or released")
+        try:
+            future = self._pool._get_executor().submit(functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self._pool._release()
+            raise
+
+        # Free the slot when the work actually finishes, not when the awaiting
+        # request goes away, so a disconnected client can't overcommit the pool.
+        future.add_done_callback(self._pool._release)
+        return await asyncio.wrap_future(future)
+
+    def release(self):
+        """Safe to call more than once, and a no-op once ``run`` has started."""
+        if self._claim():
+            self._pool._release()
@@ -0,0 +1,73 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+
+class CrewTemplate:
+    """A named crew definition with a pool of prebuilt instances.
+
+    ``factory`` builds a complete Crew whose task descriptions contain
+    ``{placeholders}``; requests bind their inputs through
+    ``crew.kickoff(inputs=...)`` instead of rebuilding agents and tasks.
+    A crew instance is handed to one request at a time because kickoff
+    interpolates inputs into its tasks in place.
+    """
+
+    def __init__(self, name, factory, size=1):
+        self.name = name
+        self.factory = factory
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._built = 0
+        self._lock = threading.Lock()
+
+    @property
+    def built(self) -> int:
+        return self._built
+
+    def _build(self):
+        crew = self.factory()
+        with self._lock:
+            self._built += 1
+        return crew
+
+    def warm(self):
+        while self._idle.qsize() < self.size:
+            self._idle.put(self._build())
+
+    @contextmanager
+    def checkout(self):
+        try:
+            crew = self._idle.get_nowait()
+        except queue.Empty:
+            # Never block a request on the pool; build an extra instance instead
+            crew = self._build()
+        try:
+            yield crew
+        finally:
+            if self._idle.qsize() < self.size:
+                self._idle.put(crew)
+
+
+class CrewRegistry:
+    def __init__(self):
+        self._templates = {}
+
+    def register(self, name, factory, size=1):
+        template = CrewTemplate(name, factory, size)
+        self._templates[name] = template
+        return template
+
+    def get(self, name) -> CrewTemplate:
+        try:
+            return self._templates[name]
+        except KeyError:
+            raise KeyError(f"No crew registered as {name!r}") from None
+
+    def warm(self):
+        for template in self._templates.values():
+            template.warm()
+
+    def kickoff(self, name, inputs):
+        with self.get(name).checkout() as crew:
+            return crew.kickoff(inputs=inputs)
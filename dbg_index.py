@@ -0,0 +1,126 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+DBG_DIR = os.getenv("DBG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dbg"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9$%]+(?:[.,][0-9]+)*")
+_TAG_RE = re.compile(r"<[^>]+>")
+# "401(k)" and "403 (b)" are written "401k"/"403b" in questions
+_PLAN_NUMBER_RE = re.compile(r"\b(\d{3})\s*\(([a-z])\)")
+# Longest first; a stem keeps at least three letters
+_SUFFIXES = ("ements", "ement", "ments", "ment", "ings", "ing", "ed", "es", "s")
+
+
+def tokenize(text: str):
+    return _TOKEN_RE.findall(_PLAN_NUMBER_RE.sub(r"\1\2", _TAG_RE.sub(" ", text.lower())))
+
+
+def stem(term: str) -> str:
+    """Strip a common suffix, so "reimbursed" and "reimbursements" compare equal."""
+    for suffix in _SUFFIXES:
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+            return term[: -len(suffix)]
+    return term
+
+
+class DigitalBenefitsGuide:
+    """An employer's Digital Benefits Guide, parsed once into a BM25 page index."""
+
+    def __init__(self, employer: str, pages, k1: float = 1.5, b: float = 0.75):
+        self.employer = employer
+        self.pages = pages
+        self.k1 = k1
+        self.b = b
+
+        self._term_freqs = [Counter(tokenize(p["content"])) for p in pages]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = sum(self._lengths) / len(pages) if pages else 0.0
+
+        doc_freqs = Counter()
+        for tf in self._term_freqs:
+            doc_freqs.update(tf.keys())
+        n = len(pages)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+        self._stems = {stem(term) for term in doc_freqs}
+
+        self.full_text = render_pages(pages)
+        self.fingerprint = hashlib.sha256(self.full_text.encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def load(cls, path: str, employer: str):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(employer, data["pages"])
+
+    def score(self, question: str):
+        terms = set(tokenize(question))
+        scores = []
+        for tf, length in zip(self._term_freqs, self._lengths):
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term)
+                if not freq:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * length / self._avg_length)
+                score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            scores.append(score)
+        return scores
+
+    def knows(self, term: str) -> bool:
+        """Whether any page uses ``term``, ignoring common suffixes."""
+        return stem(term) in self._stems
+
+    def search(self, question: str, top_k: int = 4):
+        """Return ``(score, page)`` pairs for the ``top_k`` best matching pages, best first."""
+        ranked = sorted(zip(self.score(question), self.pages), key=lambda item: item[0], reverse=True)
+        return [(score, page) for score, page in ranked[:top_k] if score > 0]
+
+    def context_for(self, question: str, top_k: int = 4, full_guide: bool = False):
+        """Render the DBG section of the Stage 1 prompt for ``question``.
+
+        Returns the rendered text and the pages it contains. With
+        ``full_guide`` (or ``top_k`` <= 0) every page is included.
+        """
+        if full_guide or top_k <= 0:
+            return self.full_text, self.pages
+
+        hits = self.search(question, top_k)
+        if not hits:
+            return self.full_text, self.pages
+
+        # Keep the guide's own page order so related pages read naturally
+        selected = sorted((page for _, page in hits), key=lambda p: int(p["page"]))
+        return render_pages(selected), selected
+
+
+def render_pages(pages) -> str:
+    return json.dumps({"pages": [{"content": p["content"], "page": p["page"]} for p in pages]}, ensure_ascii=False)
+
+
+_guides = {}
+_guides_lock = threading.Lock()
+
+
+def get_guide(employer: str) -> DigitalBenefitsGuide:
+    """Load ``<DBG_DIR>/<employer>.json`` on first use and keep it in memory."""
+    guide = _guides.get(employer)
+    if guide is not None:
+        return guide
+
+    if not re.fullmatch(r"[A-Za-z0-9_-]+", employer):
+        raise ValueError(f"Invalid employer id: {employer!r}")
+
+    with _guides_lock:
+        guide = _guides.get(employer)
+        if guide is None:
+            guide = DigitalBenefitsGuide.load(os.path.join(DBG_DIR, f"{employer}.json"), employer)
+            _guides[employer] = guide
+    return guide
@@ -0,0 +1,134 @@
+import contextvars
+import queue
+import threading
+import time
+
+import google.generativeai as genai
+from crewai import LLM
+
+from metrics import record_tokens
+from rate_limit import RateLimiter
+from streaming import current_stream
+
+
+def flatten_messages(messages):
+    # If prompt is a list of messages, flatten to text
+    if isinstance(messages, list):
+        return "\n".join(f"{m.get('role', '')}: {m.get('content', '')}" for m in messages)
+    return messages
+
+def record_usage(response):
+    # usage_metadata is only populated on the final chunk of a streamed response
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        record_tokens(usage.prompt_token_count, usage.candidates_token_count,
+                      cached_tokens=getattr(usage, "cached_content_token_count", 0))
+
+class GeminiLLM(LLM):
+    """crewAI LLM backed by one long-lived Gemini model client.
+
+    All calls, sync or async, share ``limiter`` so concurrent crews stay
+    within the provider's rate limits. With a ``prefix_cache``, prompts
+    starting with a registered static prefix only send the rest.
+    """
+
+    def __init__(self, model="gemini-1.5-pro", max_output_tokens=None, temperature=None, limiter=None,
+                 prefix_cache=None):
+        super().__init__(model=model, temperature=temperature, max_tokens=max_output_tokens)  # pass model to parent
+        self.model = model
+        self.generation_config = genai.GenerationConfig(
+            max_output_tokens=max_output_tokens,
+            temperature=temperature,
+        )
+        self.client = genai.GenerativeModel(model, generation_config=self.generation_config)
+        self.limiter = limiter or RateLimiter()
+        self.prefix_cache = prefix_cache
+
+    def _resolve(self, prompt):
+        if self.prefix_cache is None:
+            return self.client, prompt, None
+        return self.prefix_cache.resolve(prompt, self.client, self.generation_config)
+
+    def _record(self, entry, contents, start):
+        if self.prefix_cache is not None:
+            self.prefix_cache.record(entry, contents, (time.perf_counter() - start) * 1000)
+
+    def generate(self, prompt: str, generation_config=None) -> str:
+        # generation_config overrides the client's defaults for this call only
+        with self.limiter.slot():
+            client, contents, entry = self._resolve(prompt)
+            start = time.perf_counter()
+            response = client.generate_content(contents, generation_config=generation_config)
+            self._record(entry, contents, start)
+            record_usage(response)
+            return response.text
+
+    def generate_stream(self, prompt: str):
+        """Yield the response text as it arrives.
+
+        A background thread reads the provider's stream, so the limiter slot
+        is held only while Gemini is generating, not while a slow consumer
+        works through the chunks.
+        """
+        chunks = queue.Queue()
+        stopped = threading.Event()
+
+        def produce():
+            try:
+                with self.limiter.slot():
+                    client, contents, entry = self._resolve(prompt)
+                    start = time.perf_counter()
+                    chunk = None
+                    for chunk in client.generate_content(contents, stream=True):
+                        if stopped.is_set():
+                            return
+                        # Chunks without text parts (e.g. safety metadata) raise on .text
+                        if chunk.parts:
+                            chunks.put(("text", chunk.text))
+                    self._record(entry, contents, start)
+                    record_usage(chunk)
+            except Exception as e:
+                chunks.put(("error", e))
+            finally:
+                chunks.put(("done", None))
+
+        # Copy the context so token counts are labelled with the caller's stage span
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(produce,), name="gemini-stream", daemon=True).start()
+        try:
+            while True:
+                kind, value = chunks.get()
+                if kind == "done":
+                    return
+                if kind == "error":
+                    raise value
+                yield value
+        finally:
+            # The consumer stopped early: let the reader give up its slot
+            stopped.set()
+
+    async def agenerate(self, prompt: str) -> str:
+        async with self.limiter.async_slot():
+            client, contents, entry = self._resolve(prompt)
+            start = time.perf_counter()
+            response = await client.generate_content_async(contents)
+            self._record(entry, contents, start)
+            record_usage(response)
+            return response.text
+
+    def call(self, prompt, **kwargs):
+        prompt = flatten_messages(prompt)
+
+        # Stream tokens to the client when serving /ask/stream
+        stream = current_stream()
+        if stream is not None and stream.tokens_enabled:
+            parts = []
+            for text in self.generate_stream(prompt):
+                parts.append(text)
+                stream.token(text)
+            return "".join(parts)
+
+        return self.generate(prompt)
+
+    async def acall(self, prompt, **kwargs):
+        return await self.agenerate(flatten_messages(prompt))
@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+
+
+# ---- Backends ----
+class HistoryBackend(ABC):
+    """Where chat messages are persisted. ``fetch`` returns oldest first."""
+
+    @abstractmethod
+    def fetch(self, user_id: str, limit: int):
+        ...
+
+    @abstractmethod
+    def append(self, user_id: str, message: str):
+        ...
+
+
+class SupabaseHistoryBackend(HistoryBackend):
+    def __init__(self, client, table: str = "chat_history"):
+        self.client = client
+        self.table = table
+
+    def fetch(self, user_id, limit):
+        res = self.client.table(self.table) \
+            .select("message") \
+            .filter("user_id", "eq", user_id) \
+            .order("created_at", desc=True) \
+            .limit(limit) \
+            .execute()
+
+        rows = res.data or []
+        return [r["message"] for r in reversed(rows)]
+
+    def append(self, user_id, message):
+        self.client.table(self.table).insert({"user_id": user_id, "message": message}).execute()
+
+
+class InMemoryHistoryBackend(HistoryBackend):
+    """Local stand-in for Supabase. ``latency`` simulates the database round trip."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._messages = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, user_id, limit):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            return list(self._messages.get(user_id, []))[-limit:]
+
+    def append(self, user_id, message):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self._messages.setdefault(user_id, []).append(message)
+
+
+# ---- Store ----
+def _percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+class HistoryStore:
+    """Per-user ring buffer of the last ``size`` messages in front of a HistoryBackend.
+
+    Writes go through the store to the backend and update the buffer.
+    Writes made any other way aren't seen until the buffer expires after
+    ``ttl`` seconds, so only buffer (``ttl`` > 0) when every writer calls
+    ``append``; ``ttl=0`` reads the backend every time. At most
+    ``max_users`` buffers are kept.
+    """
+
+    def __init__(self, backend: HistoryBackend, size: int = 4, ttl: float = 300, max_users: int = 10000):
+        self.backend = backend
+        self.size = size
+        self.ttl = ttl
+        self.max_users = max_users
+        self._buffers = OrderedDict()  # user_id -> (loaded_at, deque)
+        self._lock = threading.Lock()
+        # Bumped by every write; a read that overlapped one doesn't buffer what it fetched
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        # Recent samples only, for percentiles
+        self._latencies = {"hit": deque(maxlen=1000), "miss": deque(maxlen=1000)}
+
+    def _cached(self, user_id):
+        with self._lock:
+            item = self._buffers.get(user_id)
+            if item is None:
+                return None
+            loaded_at, buffer = item
+            if time.monotonic() - loaded_at > self.ttl:
+                del self._buffers[user_id]
+                return None
+            self._buffers.move_to_end(user_id)
+            return "\n".join(buffer)
+
+    def _store(self, user_id, messages, generation):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._buffers[user_id] = (time.monotonic(), deque(messages, maxlen=self.size))
+            self._buffers.move_to_end(user_id)
+            while len(self._buffers) > self.max_users:
+                self._buffers.popitem(last=False)
+
+    def _record(self, kind, start):
+        with self._lock:
+            if kind == "hit":
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    def _load(self, user_id, start):
+        generation = self._generation
+        messages = self.backend.fetch(user_id, self.size)
+        self._store(user_id, messages, generation)
+        self._record("miss", start)
+        return "\n".join(messages)
+
+    def get_sync(self, user_id: str) -> str:
+        start = time.perf_counter()
+        history = self._cached(user_id)
+        if history is not None:
+            self._record("hit", start)
+            return history
+        return self._load(user_id, start)
+
+    async def get(self, user_id: str) -> str:
+        """The last ``size`` messages joined by newlines, without blocking the event loop."""
+        start = time.perf_counter()
+        history = self._cached(user_id)
+        if history is not None:
+            self._record("hit", start)
+            return history
+        # Only the database read needs a thread
+        return await asyncio.to_thread(self._load, user_id, start)
+
+    async def append(self, user_id: str, message: str):
+        await asyncio.to_thread(self.backend.append, user_id, message)
+        with self._lock:
+            self._generation += 1
+            item = self._buffers.get(user_id)
+            if item is not None:
+                item[1].append(message)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._generation += 1
+            self._buffers.pop(user_id, None)
+
+    def stats(self):
+        hits = list(self._latencies["hit"])
+        misses = list(self._latencies["miss"])
+        combined = hits + misses
+        return {
+            "cached_users": len(self._buffers),
+            "hits": self.hits,
+            "misses": self.misses,
+            # "miss" is the plain database round trip, i.e. the latency without the buffer
+            "miss_p50_ms": _percentile(misses, 50),
+            "miss_p99_ms": _percentile(misses, 99),
+            "p50_ms": _percentile(combined, 50),
+            "p99_ms": _percentile(combined, 99),
+        }
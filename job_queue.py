@@ -0,0 +1,435 @@
+"""Durable background jobs for long crew runs, queued in SQLite.
+
+``POST`` endpoints submit a job and return its id at once; a few asyncio
+workers per process claim jobs, run the handler and store the result for
+``JOB_RESULT_TTL`` seconds. Claims are leases renewed while the job runs, so
+work held by a process that dies is picked up again once its lease expires.
+Several processes (or apps) can share one database file; each queue only
+claims jobs of its own ``kind``. Workers start with the first submit, or at
+startup if the database already exists, so an app whose job endpoints are
+never used neither creates the file nor polls it.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Retries wait JOB_RETRY_BACKOFF * 2^(attempt - 1) seconds, jittered, up to JOB_RETRY_BACKOFF_MAX
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "2"))
+JOB_RETRY_BACKOFF_MAX = float(os.getenv("JOB_RETRY_BACKOFF_MAX", "60"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "86400"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+STATUSES = (QUEUED, RUNNING, SUCCEEDED, FAILED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    idempotency_key TEXT,
+    payload_hash TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL,
+    lease_until REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    expires_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_idempotency ON jobs (kind, idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (kind, status, run_after);
+"""
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler for failures that retrying won't fix."""
+
+
+class IdempotencyConflict(Exception):
+    """An idempotency key was reused with a different payload."""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str
+    attempts: int
+    payload: dict
+    result: object = None
+    error: str = None
+    created_at: float = None
+    finished_at: float = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _payload_hash(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _row_to_job(row):
+    return Job(
+        id=row["id"],
+        kind=row["kind"],
+        status=row["status"],
+        attempts=row["attempts"],
+        payload=json.loads(row["payload"]),
+        result=json.loads(row["result"]) if row["result"] is not None else None,
+        error=row["error"],
+        created_at=row["created_at"],
+        finished_at=row["finished_at"],
+    )
+
+
+# ---- Store ----
+class JobStore:
+    """The jobs table. Every method is a short transaction, safe to call from any thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        """Whether the database has been created, by this process or another."""
+        return self._conn is not None or os.path.exists(self.path)
+
+    def _db(self):
+        # Opened on first use so importing an app doesn't create the file
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _transaction(self, fn):
+        with self._lock:
+            db = self._db()
+            # IMMEDIATE takes the write lock up front, so two processes can't claim the same job
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(db)
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+            return result
+
+    def submit(self, kind, payload, idempotency_key=None):
+        """Queue a job; returns ``(job, created)``. A live job with the same key is returned instead."""
+        payload_hash = _payload_hash(payload)
+
+        def tx(db):
+            now = time.time()
+            if idempotency_key is not None:
+                db.execute("DELETE FROM jobs WHERE kind = ? AND idempotency_key = ? AND expires_at < ?",
+                           (kind, idempotency_key, now))
+                row = db.execute("SELECT * FROM jobs WHERE kind = ? AND idempotency_key = ?",
+                                 (kind, idempotency_key)).fetchone()
+                if row is not None:
+                    if row["payload_hash"] != payload_hash:
+                        raise IdempotencyConflict(f"Idempotency key {idempotency_key!r} was used for a different request")
+                    return _row_to_job(row), False
+            job_id = uuid.uuid4().hex
+            db.execute(
+                "INSERT INTO jobs (id, kind, idempotency_key, payload_hash, payload, status, run_after, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, idempotency_key, payload_hash, json.dumps(payload, default=str), QUEUED, now, now),
+            )
+            return Job(job_id, kind, QUEUED, 0, payload, created_at=now), True
+
+        return self._transaction(tx)
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (row["expires_at"] is not None and row["expires_at"] < time.time()):
+            return None
+        return _row_to_job(row)
+
+    def claim(self, kind, lease, max_attempts, ttl):
+        """Lease the next runnable job of ``kind``, or return None."""
+
+        def tx(db):
+            now = time.time()
+            # Leases that ran out belong to a worker that died; give up on them once out of attempts
+            db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, expires_at = ?, lease_until = NULL "
+                "WHERE kind = ? AND status = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, "Worker stopped while running the job", now, now + ttl, kind, RUNNING, now,
+                 max_attempts),
+            )
+            row = db.execute(
+                "SELECT * FROM jobs WHERE kind = ? AND ((status = ? AND run_after <= ?) OR (status = ? AND lease_until < ?)) "
+                "ORDER BY run_after LIMIT 1",
+                (kind, QUEUED, now, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ? WHERE id = ?",
+                       (RUNNING, now + lease, row["id"]))
+            job = _row_to_job(row)
+            job.status = RUNNING
+            job.attempts += 1
+            return job
+
+        return self._transaction(tx)
+
+    def renew(self, job_id, lease):
+        with self._lock:
+            self._db().execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ?",
+                               (time.time() + lease, job_id, RUNNING))
+
+    def complete(self, job_id, result, ttl):
+        now = time.time()
+        with self._lock:
+            self._db().execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_until = NULL, finished_at = ?, expires_at = ? "
+                "WHERE id = ?",
+                (SUCCEEDED, json.dumps(result, default=str), now, now + ttl, job_id),
+            )
+
+    def fail(self, job_id, error, ttl):
+        now = time.time()
+        with self._lock:
+            self._db().execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, finished_at = ?, expires_at = ? WHERE id = ?",
+                (FAILED, error, now, now + ttl, job_id),
+            )
+
+    def retry(self, job_id, error, delay):
+        with self._lock:
+            self._db().execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, run_after = ? WHERE id = ?",
+                (QUEUED, error, time.time() + delay, job_id),
+            )
+
+    def release(self, job_id):
+        """Put a job back untouched, e.g. when its worker shuts down mid-run."""
+        with self._lock:
+            self._db().execute(
+                "UPDATE jobs SET status = ?, attempts = attempts - 1, lease_until = NULL, run_after = ? "
+                "WHERE id = ? AND status = ?",
+                (QUEUED, time.time(), job_id, RUNNING),
+            )
+
+    def purge(self):
+        """Delete finished jobs past their retention; returns how many."""
+        with self._lock:
+            return self._db().execute("DELETE FROM jobs WHERE expires_at < ?", (time.time(),)).rowcount
+
+    def counts(self, kind):
+        with self._lock:
+            rows = self._db().execute("SELECT status, COUNT(*) FROM jobs WHERE kind = ? GROUP BY status",
+                                      (kind,)).fetchall()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update({status: n for status, n in rows})
+        return counts
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# ---- Workers ----
+class JobQueue:
+    """Runs jobs of one ``kind`` with at most ``concurrency`` at a time in this process.
+
+    ``handler`` is an async callable taking the job payload and returning a
+    JSON-serializable result. Exceptions are retried with exponential
+    backoff up to ``max_attempts`` (or after the exception's own
+    ``retry_after``, e.g. PoolSaturated); PermanentJobError fails the job
+    straight away.
+    """
+
+    def __init__(self, store: JobStore, kind: str, handler, concurrency: int = 2, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 backoff: float = JOB_RETRY_BACKOFF, backoff_max: float = JOB_RETRY_BACKOFF_MAX,
+                 lease: float = JOB_LEASE_SECONDS, result_ttl: float = JOB_RESULT_TTL, poll_interval: float = 1.0):
+        self.store = store
+        self.kind = kind
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._tasks = []
+        self._wakeup = None
+        self._finished = None
+        self.stats = {"succeeded": 0, "failed": 0, "retried": 0}
+
+    # ---- Client side ----
+    async def submit(self, payload, idempotency_key=None):
+        await self.start()
+        job, created = await asyncio.to_thread(self.store.submit, self.kind, payload, idempotency_key)
+        if created and self._wakeup is not None:
+            self._wakeup.set()
+        return job, created
+
+    async def get(self, job_id):
+        if not self.store.exists():
+            return None
+        job = await asyncio.to_thread(self.store.get, job_id)
+        return job if job is not None and job.kind == self.kind else None
+
+    async def wait(self, job_id, timeout: float):
+        """The job once it finishes, or as it stands after ``timeout`` seconds."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = await self.get(job_id)
+            remaining = deadline - loop.time()
+            if job is None or job.finished or remaining <= 0:
+                return job
+            # Woken by this process's workers; jobs run elsewhere are caught by polling
+            finished = self._finished or asyncio.Event()
+            try:
+                await asyncio.wait_for(finished.wait(), min(self.poll_interval * 4, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    # ---- Worker side ----
+    async def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._purge_loop()))
+
+    async def resume(self):
+        """Start the workers if the database exists, e.g. holding jobs queued before a restart."""
+        if self.store.exists():
+            await self.start()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _notify_finished(self):
+        finished, self._finished = self._finished, asyncio.Event()
+        finished.set()
+
+    def _retry_delay(self, job, error):
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            return float(retry_after)
+        delay = min(self.backoff_max, self.backoff * 2 ** (job.attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _worker(self, index):
+        errors = 0
+        while True:
+            try:
+                job = await asyncio.to_thread(
+                    self.store.claim, self.kind, self.lease, self.max_attempts, self.result_ttl)
+                if job is not None:
+                    await self._run(job)
+                errors = 0
+            except Exception:
+                # e.g. "database is locked"; a job whose result couldn't be saved
+                # keeps its lease and is claimed again once that runs out
+                errors += 1
+                delay = min(self.backoff_max, self.poll_interval * 2 ** (errors - 1))
+                logger.exception("Job worker %d hit an error, retrying in %.1fs", index, delay)
+                await asyncio.sleep(delay)
+                continue
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _run(self, job):
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        try:
+            result = await self.handler(job.payload)
+        except asyncio.CancelledError:
+            await asyncio.shield(asyncio.to_thread(self.store.release, job.id))
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if isinstance(e, PermanentJobError) or job.attempts >= self.max_attempts:
+                logger.warning("Job %s failed after %d attempt(s): %s", job.id, job.attempts, error)
+                await asyncio.to_thread(self.store.fail, job.id, error, self.result_ttl)
+                self.stats["failed"] += 1
+                self._notify_finished()
+            else:
+                delay = self._retry_delay(job, e)
+                logger.info("Job %s attempt %d failed, retrying in %.1fs: %s", job.id, job.attempts, delay, error)
+                await asyncio.to_thread(self.store.retry, job.id, error, delay)
+                self.stats["retried"] += 1
+        else:
+            await asyncio.to_thread(self.store.complete, job.id, result, self.result_ttl)
+            self.stats["succeeded"] += 1
+            self._notify_finished()
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await asyncio.to_thread(self.store.renew, job_id, self.lease)
+            except sqlite3.Error:
+                # Two more tries before the lease runs out
+                logger.exception("Renewing the lease on job %s failed", job_id)
+
+    async def _purge_loop(self):
+        while True:
+            try:
+                purged = await asyncio.to_thread(self.store.purge)
+                if purged:
+                    logger.info("Purged %d expired jobs", purged)
+            except sqlite3.Error:
+                logger.exception("Purging expired jobs failed")
+            await asyncio.sleep(60)
+
+    def counts(self):
+        if not self.store.exists():
+            return dict.fromkeys(STATUSES, 0)
+        return self.store.counts(self.kind)
@@ -0,0 +1,191 @@
+import logging
+import re
+from functools import lru_cache
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+KB_CONTEXT_TOKENS = REGISTRY.counter(
+    "kb_context_tokens_total", "Tokens of raw Vectorize responses kept in or dropped from the KB context", ("kind",))
+
+
+# ---- Token counting ----
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads its vocabulary on first use; estimate when that fails
+        logger.warning("tiktoken unavailable, estimating token counts: %s", e)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Token count for ``text``. cl100k_base only approximates Gemini's tokenizer,
+    which is close enough for budgeting."""
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encoding = _encoding()
+    if encoding is None:
+        return text[: max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+# ---- Chunk normalization ----
+def _page_number(*sources):
+    for source in sources:
+        if not isinstance(source, dict):
+            continue
+        for key in ("page", "page_number", "pageNumber"):
+            value = source.get(key)
+            if value is not None:
+                try:
+                    return int(value)
+                except (TypeError, ValueError):
+                    pass
+    return None
+
+
+def extract_chunks(data):
+    """Flatten a Vectorize response into ``{source, page, text, score}`` dicts.
+
+    Handles both the ``documents`` shape of the retrieval endpoint and the
+    ``matches``/``payload`` shape.
+    """
+    if not isinstance(data, dict):
+        return []
+
+    chunks = []
+    for doc in data.get("documents") or []:
+        metadata = doc.get("metadata") or {}
+        chunks.append({
+            "source": doc.get("source_display_name") or doc.get("source") or metadata.get("source") or "Unknown source",
+            "page": _page_number(doc, metadata),
+            "text": doc.get("text") or "",
+            "score": doc.get("relevancy", doc.get("similarity")) or 0.0,
+        })
+
+    for match in data.get("matches") or []:
+        payload = match.get("payload") or {}
+        metadata = payload.get("metadata") or {}
+        chunks.append({
+            "source": payload.get("source_display_name") or payload.get("source") or metadata.get("source") or "Unknown source",
+            "page": _page_number(payload, metadata),
+            "text": payload.get("content") or payload.get("text") or "",
+            "score": match.get("score") or 0.0,
+        })
+
+    return [c for c in chunks if c["text"].strip()]
+
+
+# ---- Assembly steps ----
+def _words(text):
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def dedupe_chunks(chunks, overlap: float = 0.85):
+    """Drop chunks that repeat, or mostly overlap, a higher scoring chunk from the same source."""
+    kept = []
+    for chunk in sorted(chunks, key=lambda c: c["score"], reverse=True):
+        words = _words(chunk["text"])
+        duplicate = False
+        for other in kept:
+            if other["source"] != chunk["source"]:
+                continue
+            other_words = other["_words"]
+            shared = len(words & other_words)
+            if shared >= overlap * min(len(words), len(other_words)):
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append({**chunk, "_words": words})
+    for chunk in kept:
+        del chunk["_words"]
+    return kept
+
+
+def merge_adjacent(chunks):
+    """Merge chunks from the same source on the same or consecutive pages into one block."""
+    by_source = {}
+    for chunk in chunks:
+        by_source.setdefault(chunk["source"], []).append(chunk)
+
+    blocks = []
+    for source, items in by_source.items():
+        paged = sorted((c for c in items if c["page"] is not None), key=lambda c: c["page"])
+        current = None
+        for chunk in paged:
+            if current is not None and chunk["page"] - current["last_page"] <= 1:
+                current["texts"].append(chunk["text"])
+                current["last_page"] = chunk["page"]
+                current["score"] = max(current["score"], chunk["score"])
+                continue
+            if current is not None:
+                blocks.append(current)
+            current = {"source": source, "first_page": chunk["page"], "last_page": chunk["page"],
+                       "texts": [chunk["text"]], "score": chunk["score"]}
+        if current is not None:
+            blocks.append(current)
+
+        for chunk in items:
+            if chunk["page"] is None:
+                blocks.append({"source": source, "first_page": None, "last_page": None,
+                               "texts": [chunk["text"]], "score": chunk["score"]})
+
+    return sorted(blocks, key=lambda b: b["score"], reverse=True)
+
+
+def _citation(block):
+    if block["first_page"] is None:
+        return block["source"]
+    if block["first_page"] == block["last_page"]:
+        return f"{block['source']}, page {block['first_page']}"
+    return f"{block['source']}, pages {block['first_page']}-{block['last_page']}"
+
+
+def pack_blocks(blocks, token_budget: int, min_tail_tokens: int = 64):
+    """Render blocks best-first as numbered citation excerpts until ``token_budget`` is spent.
+
+    The first block that doesn't fit is truncated if at least
+    ``min_tail_tokens`` of budget remain; everything after it is dropped.
+    """
+    parts = []
+    remaining = token_budget
+    for block in blocks:
+        header = f"[{len(parts) + 1}] {_citation(block)}\n"
+        body = "\n".join(" ".join(t.split()) for t in block["texts"])
+        entry = header + body
+        cost = count_tokens(entry) + 1
+        if cost <= remaining:
+            parts.append(entry)
+            remaining -= cost
+            continue
+        available = remaining - count_tokens(header) - 1
+        if available >= min_tail_tokens:
+            parts.append(header + truncate_tokens(body, available))
+        break
+    return "\n\n".join(parts)
+
+
+def build_kb_context(data, min_score: float = 0.0, token_budget: int = 2000):
+    """Turn a raw Vectorize response into a compact, ranked, citation-friendly context."""
+    chunks = [c for c in extract_chunks(data) if c["score"] >= min_score]
+    context = pack_blocks(merge_adjacent(dedupe_chunks(chunks)), token_budget)
+
+    raw_tokens = count_tokens(str(data))
+    context_tokens = count_tokens(context)
+    KB_CONTEXT_TOKENS.inc(context_tokens, kind="kept")
+    KB_CONTEXT_TOKENS.inc(max(raw_tokens - context_tokens, 0), kind="dropped")
+    logger.debug(
+        "KB context: %d chunks -> %d tokens (raw response %d tokens, %d saved)",
+        len(chunks), context_tokens, raw_tokens, raw_tokens - context_tokens,
+    )
+    return context
@@ -1,13 +1,98 @@
-from fastapi import FastAPI
+import json
+import logging
+import os
+import re
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from crewai import Agent, Crew, Task
+from crewai.utilities.events import (
+    LLMStreamChunkEvent,
+    TaskCompletedEvent,
+    TaskFailedEvent,
+    TaskStartedEvent,
+    crewai_event_bus,
+)
+from crewai.utilities.llm_utils import create_llm
+
+from batch_run import Checkpoint, run_batch
+from crew_pool import CrewPool, PoolSaturated
+from crew_registry import CrewRegistry
+from job_queue import IdempotencyConflict, JobQueue, JobStore
+from metrics import CONTENT_TYPE, REGISTRY, Span, record_tokens, render as render_metrics
+from plan_ranker import format_ranked_plans, rank_for_preferences
+from streaming import begin_answer, current_stream, emit, output_text, stream_events
+
+logger = logging.getLogger(__name__)
+
+# crewAI's verbose console output is slow under load; set CREW_VERBOSE=false in production
+CREW_VERBOSE = os.getenv("CREW_VERBOSE", "true").lower() == "true"
+
+# Blocking crew kickoffs run on a bounded pool so the event loop stays free
+RUN_CREW_WORKERS = int(os.getenv("RUN_CREW_WORKERS", "4"))
+RUN_CREW_QUEUE_SIZE = int(os.getenv("RUN_CREW_QUEUE_SIZE", "8"))
+RUN_CREW_EXECUTOR = os.getenv("RUN_CREW_EXECUTOR", "thread")  # "thread" or "process"
+RUN_CREW_RETRY_AFTER = int(os.getenv("RUN_CREW_RETRY_AFTER", "5"))
+
+crew_pool = CrewPool(
+    workers=RUN_CREW_WORKERS,
+    queue_size=RUN_CREW_QUEUE_SIZE,
+    kind=RUN_CREW_EXECUTOR,
+    retry_after=RUN_CREW_RETRY_AFTER,
+)
+
+# Batch runs get their own pool so bulk enrollment can't starve interactive /run calls
+RUN_BATCH_CONCURRENCY = int(os.getenv("RUN_BATCH_CONCURRENCY", "4"))
+RUN_BATCH_CHECKPOINT_DIR = os.getenv("RUN_BATCH_CHECKPOINT_DIR", "batch_checkpoints")
+
+batch_pool = CrewPool(
+    workers=RUN_BATCH_CONCURRENCY,
+    queue_size=int(os.getenv("RUN_BATCH_QUEUE_SIZE", "1000")),
+    kind=RUN_CREW_EXECUTOR,
+)
+
+# Job mode: POST /run/jobs returns a job id and RUN_JOB_CONCURRENCY workers
+# per process run queued jobs from the SQLite file at JOBS_DB_PATH
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.sqlite3")
+RUN_JOB_CONCURRENCY = int(os.getenv("RUN_JOB_CONCURRENCY", "2"))
+# Longest a GET /run/jobs/{id}?wait=... long poll is held open
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", "30"))
+
+job_pool = CrewPool(workers=RUN_JOB_CONCURRENCY, kind=RUN_CREW_EXECUTOR)
+
+# Streaming hands events back through thread-local state, so /run/stream
+# always runs on threads even when /run uses the process executor
+stream_pool = crew_pool if RUN_CREW_EXECUTOR == "thread" else CrewPool(
+    workers=RUN_CREW_WORKERS,
+    queue_size=RUN_CREW_QUEUE_SIZE,
+    retry_after=RUN_CREW_RETRY_AFTER,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if RUN_CREW_EXECUTOR == "thread":
+        # Process workers build their own crews on first use
+        crew_registry.warm()
+    # Workers otherwise start with the first POST /run/jobs
+    await run_jobs.resume()
+    yield
+    await run_jobs.stop()
+    job_store.close()
+    crew_pool.shutdown(wait=False)
+    stream_pool.shutdown(wait=False)
+    batch_pool.shutdown(wait=False)
+    job_pool.shutdown(wait=False)
 
 app = FastAPI(
     title="CrewAI Backend",
     description="API for analyzing user preferences and recommending plans.",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 @app.get("/")
@@ -29,46 +114,123 @@ def format_plans(plans_list):
         )
     return formatted
 
-@app.post("/run")
-async def run_crew(req: PreferenceRequest):
-    user_text = req.preferences
-    plans = req.plans
-    formatted_plans = format_plans(plans)
-    print(formatted_plans)
+# ---- Streaming hooks ----
+# Both are no-ops unless the crew is running for a /run/stream request
+NEXT_STAGE = {"analyzer": "selector", "selector": "recommender"}
+
+def on_task_done(output):
+    stream = current_stream()
+    if stream is None:
+        return
+    stream.emit("stage", {"stage": output.name, "status": "done"})
+    next_stage = NEXT_STAGE.get(output.name)
+    if next_stage:
+        stream.emit("stage", {"stage": next_stage, "status": "started"})
+    if next_stage == "recommender":
+        # Only the recommender's text is shown to the employee
+        stream.begin_answer()
+
+@crewai_event_bus.on(LLMStreamChunkEvent)
+def forward_stream_chunk(source, event):
+    stream = current_stream()
+    if stream is not None:
+        stream.token(event.chunk)
+
+# ---- Metrics ----
+# One span per agent task. Crews are checked out by one request at a time,
+# so a task's start and end events can be matched by the task object.
+_task_spans = {}
 
-    # Define agents
-    preference_analyzer = Agent(
+def _agent_tokens(task):
+    # crewAI keeps a running total per agent; a task's usage is the difference
+    usage = task.agent._token_process.get_summary()
+    return usage.prompt_tokens, usage.completion_tokens
+
+@crewai_event_bus.on(TaskStartedEvent)
+def start_task_span(source, event):
+    task = event.task
+    if task is None or task.name not in ("analyzer", "selector", "recommender"):
+        return
+    _task_spans[id(task)] = (Span(task.name), _agent_tokens(task))
+
+def end_task_span(event, outcome):
+    entry = _task_spans.pop(id(event.task), None)
+    if entry is None:
+        return
+    span, (prompt_before, completion_before) = entry
+    prompt, completion = _agent_tokens(event.task)
+    record_tokens(prompt - prompt_before, completion - completion_before, stage=span.stage)
+    span.end(outcome)
+
+@crewai_event_bus.on(TaskCompletedEvent)
+def on_task_completed(source, event):
+    end_task_span(event, "ok")
+
+@crewai_event_bus.on(TaskFailedEvent)
+def on_task_failed(source, event):
+    end_task_span(event, "error")
+
+@REGISTRY.collector
+def collect_pool_stats():
+    for name, pool in (("run", crew_pool), ("stream", stream_pool), ("batch", batch_pool), ("jobs", job_pool)):
+        yield "crew_pool_in_flight", "gauge", "Crew runs queued or running", pool.in_flight, {"pool": name}
+        yield "crew_pool_capacity", "gauge", "Crew runs a pool admits before rejecting", pool.capacity, {"pool": name}
+    for status, count in run_jobs.counts().items():
+        yield "jobs", "gauge", "Stored jobs by status", count, {"kind": "run", "status": status}
+
+# ---- Agents ----
+def make_preference_analyzer():
+    return Agent(
         name="Preference Analyzer",
         role="Summarize employee's key healthcare plan preferences",
         goal="Extract and clearly list the most important preferences from the user input",
         backstory="You excel at understanding employee needs and summarizing them clearly.",
     )
 
-    plan_selector = Agent(
+def make_plan_selector():
+    return Agent(
         name="Plan Selector",
         role="Match and rank plans",
         goal="Use employee preferences and available plan data to select the best option, providing detailed reasoning and a ranked list",
         backstory="You carefully evaluate trade-offs and match plans to the user's exact needs.",
     )
 
+def make_final_recommender(stream=False):
     final_recommender = Agent(
         name="Final Recommender",
         role="Explain recommendation clearly",
         goal="Paraphrase the selected plan recommendation into friendly, empathetic language for the employee",
         backstory="You are excellent at simplifying complex information and making the employee feel confident in their choice.",
     )
+    if stream:
+        # Same model the agent would pick by default, but emitting chunk events
+        final_recommender.llm = create_llm(None)
+        final_recommender.llm.stream = True
+    return final_recommender
 
-    task1 = Task(
-        description=f"""Analyze the following user preferences and produce a structured list of key criteria...
+# ---- Crews ----
+# Placeholders like {preferences} and {plans} are bound per request by crew.kickoff(inputs=...)
+def make_analyzer_task(agent):
+    return Task(
+        name="analyzer",
+        description="""Analyze the following user preferences and produce a structured list of key criteria...
 User Preferences:
-{user_text}
+{preferences}
 """,
         expected_output="A clear, numbered list summarizing the key criteria.",
-        agent=preference_analyzer,
+        agent=agent,
     )
 
+def build_recommendation_crew(stream=False):
+    preference_analyzer = make_preference_analyzer()
+    plan_selector = make_plan_selector()
+    final_recommender = make_final_recommender(stream)
+
+    task1 = make_analyzer_task(preference_analyzer)
+
     task2 = Task(
-        description=f"""Use the following plans data: {formatted_plans}
+        name="selector",
+        description="""Use the following plans data: {plans}
 and the extracted employee preferences from the Preference Analyzer.
 Rank the plans from best to worst based on how they match the employee's preferences...
 """,
@@ -77,6 +239,7 @@ Rank the plans from best to worst based on how they match the employee's prefere
     )
 
     task3 = Task(
+        name="recommender",
         description="""Take the ranked plans and final selection from the Plan Selector.
 Rephrase it into friendly, empathetic language that can be shown to the employee on the final answer page...
 """,
@@ -84,12 +247,249 @@ Rephrase it into friendly, empathetic language that can be shown to the employee
         agent=final_recommender,
     )
 
-    crew = Crew(
+    return Crew(
         agents=[preference_analyzer, plan_selector, final_recommender],
         tasks=[task1, task2, task3],
-        verbose=True,
+        task_callback=on_task_done,
+        verbose=CREW_VERBOSE,
+    )
+
+def build_analyzer_crew():
+    preference_analyzer = make_preference_analyzer()
+    return Crew(
+        agents=[preference_analyzer],
+        tasks=[make_analyzer_task(preference_analyzer)],
+        verbose=CREW_VERBOSE,
+    )
+
+def build_ranked_selection_crew(stream=False):
+    # "assisted" mode: the selector reviews the engine's shortlist instead of ranking every plan
+    plan_selector = make_plan_selector()
+    final_recommender = make_final_recommender(stream)
+
+    task2 = Task(
+        name="selector",
+        description="""The employee's key criteria are:
+{criteria}
+
+A scoring engine has already ranked the available plans against these criteria. The top matches are:
+{ranked_plans}
+Confirm the best option from this shortlist, explaining the trade-offs behind the ranking...
+""",
+        expected_output="A ranked list with reasoning and a final plan selection.",
+        agent=plan_selector,
+    )
+
+    task3 = Task(
+        name="recommender",
+        description="""Take the ranked plans and final selection from the Plan Selector.
+Rephrase it into friendly, empathetic language that can be shown to the employee on the final answer page...
+""",
+        expected_output="A final friendly recommendation paragraph.",
+        agent=final_recommender,
     )
 
-    final_recommendation = crew.kickoff()
+    return Crew(
+        agents=[plan_selector, final_recommender],
+        tasks=[task2, task3],
+        task_callback=on_task_done,
+        verbose=CREW_VERBOSE,
+    )
+
+def build_ranked_explanation_crew(stream=False):
+    # "engine" mode: no selector agent, the recommender explains the engine's top pick
+    final_recommender = make_final_recommender(stream)
+
+    task3 = Task(
+        name="recommender",
+        description="""The employee's key criteria are:
+{criteria}
+
+A scoring engine ranked the available plans against these criteria. The top matches, best first, are:
+{ranked_plans}
+Recommend the first plan and explain in friendly, empathetic language why it fits the employee best,
+mentioning how it compares with the runners-up...
+""",
+        expected_output="A final friendly recommendation paragraph.",
+        agent=final_recommender,
+    )
+
+    return Crew(
+        agents=[final_recommender],
+        tasks=[task3],
+        task_callback=on_task_done,
+        verbose=CREW_VERBOSE,
+    )
+
+# RUN_RANKING_MODE picks who ranks the plans:
+#   llm      - the Plan Selector agent ranks the full plan list (original behaviour)
+#   assisted - plan_ranker scores the plans, the selector reviews the top RUN_RANKING_TOP_K
+#   engine   - plan_ranker's ranking is final and the selector agent is skipped
+RUN_RANKING_MODE = os.getenv("RUN_RANKING_MODE", "llm")
+RUN_RANKING_TOP_K = int(os.getenv("RUN_RANKING_TOP_K", "3"))
+
+# Agents are built once and reused; each pool worker gets its own crew instance
+CREW_POOL_SIZE = RUN_CREW_WORKERS + RUN_BATCH_CONCURRENCY + RUN_JOB_CONCURRENCY
+
+crew_registry = CrewRegistry()
+crew_registry.register("recommendation", build_recommendation_crew, size=CREW_POOL_SIZE)
+if RUN_RANKING_MODE == "llm":
+    crew_registry.register("recommendation_stream", lambda: build_recommendation_crew(stream=True), size=RUN_CREW_WORKERS)
+else:
+    crew_registry.register("analyzer", build_analyzer_crew, size=CREW_POOL_SIZE)
+    crew_registry.register("ranked_selection", build_ranked_selection_crew, size=CREW_POOL_SIZE)
+    crew_registry.register("ranked_explanation", build_ranked_explanation_crew, size=CREW_POOL_SIZE)
+    if RUN_RANKING_MODE == "assisted":
+        crew_registry.register("ranked_selection_stream", lambda: build_ranked_selection_crew(stream=True),
+                               size=RUN_CREW_WORKERS)
+    else:
+        crew_registry.register("ranked_explanation_stream", lambda: build_ranked_explanation_crew(stream=True),
+                               size=RUN_CREW_WORKERS)
+
+def kickoff_ranked(user_text, plans, mode, stream=False):
+    # The stage events are no-ops unless this runs for /run/stream
+    emit("stage", stage="analyzer", status="started")
+    criteria = output_text(crew_registry.kickoff("analyzer", {"preferences": user_text}))
+    emit("stage", stage="analyzer", status="done")
+    # Score against the analyzer's criteria plus the employee's own words
+    ranked = rank_for_preferences(plans, f"{criteria}\n{user_text}", top_k=RUN_RANKING_TOP_K)
+    emit("stage", stage="ranking", status="done",
+         ranking=[{"name": plan.get("name"), "score": round(score, 4)} for plan, score in ranked])
+
+    if mode == "assisted":
+        crew_name = "ranked_selection"
+        emit("stage", stage="selector", status="started")
+    else:
+        crew_name = "ranked_explanation"
+        emit("stage", stage="recommender", status="started")
+        begin_answer()
+    if stream:
+        crew_name += "_stream"
+    return crew_registry.kickoff(crew_name, {"criteria": criteria, "ranked_plans": format_ranked_plans(ranked)})
+
+def kickoff_crew(user_text, plans):
+    # Runs on a crew_pool worker; must stay module-level so the process executor can pickle it
+    if RUN_RANKING_MODE in ("assisted", "engine"):
+        return kickoff_ranked(user_text, plans, RUN_RANKING_MODE)
+    return crew_registry.kickoff("recommendation", {"preferences": user_text, "plans": format_plans(plans)})
+
+@app.post("/run")
+async def run_crew(req: PreferenceRequest):
+    user_text = req.preferences
+    plans = req.plans
+    logger.debug("Plans for /run:%s", format_plans(plans))
+
+    try:
+        final_recommendation = await crew_pool.run(kickoff_crew, user_text, plans)
+    except PoolSaturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many recommendations in progress, please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
 
     return {"result": final_recommendation}
+
+@app.post("/run/batch")
+async def run_crew_batch(request: Request, batch_id: str = None):
+    """Recommendations for a JSONL body of PreferenceRequest records, streamed back as JSONL.
+
+    Identical records run once. Pass ``batch_id`` to checkpoint finished
+    records so re-posting the same batch after a crash skips them.
+    """
+    checkpoint = None
+    if batch_id is not None:
+        if not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", batch_id):
+            raise HTTPException(status_code=422, detail="batch_id may only contain letters, digits, '_' and '-'")
+        os.makedirs(RUN_BATCH_CHECKPOINT_DIR, exist_ok=True)
+        checkpoint = Checkpoint(os.path.join(RUN_BATCH_CHECKPOINT_DIR, f"{batch_id}.jsonl"))
+
+    async def run_one(req):
+        return output_text(await batch_pool.run(kickoff_crew, req.preferences, req.plans))
+
+    # Starlette's disconnect watcher shares receive() with the request body
+    # once a streaming response starts, so take the whole body up front
+    try:
+        text = (await request.body()).decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Request body must be UTF-8 encoded JSONL")
+
+    async def lines():
+        for line in text.splitlines():
+            yield line
+
+    async def results():
+        async for item in run_batch(lines(), run_one, PreferenceRequest,
+                                    concurrency=RUN_BATCH_CONCURRENCY, checkpoint=checkpoint):
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+# ---- Jobs ----
+async def run_job(payload):
+    req = PreferenceRequest(**payload)
+    return {"result": output_text(await job_pool.run(kickoff_crew, req.preferences, req.plans))}
+
+job_store = JobStore(JOBS_DB_PATH)
+run_jobs = JobQueue(job_store, "run", run_job, concurrency=RUN_JOB_CONCURRENCY)
+
+@app.post("/run/jobs", status_code=202)
+async def submit_run_job(req: PreferenceRequest, response: Response, idempotency_key: str = Header(None)):
+    """Queue a recommendation and return its job id; poll GET /run/jobs/{job_id} for the result.
+
+    Re-posting with the same ``Idempotency-Key`` header returns the original job.
+    """
+    try:
+        job, created = await run_jobs.submit(req.model_dump(mode="json"), idempotency_key)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not created:
+        response.status_code = 200
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/run/jobs/{job_id}")
+async def get_run_job(job_id: str, wait: float = 0):
+    """The job's status and, once it succeeds, its result. ``wait`` holds the request up to that many seconds for it to finish."""
+    job = await run_jobs.wait(job_id, min(max(wait, 0), JOB_MAX_WAIT))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.to_dict()
+
+def kickoff_crew_streaming(user_text, plans):
+    # Ranks the same way as /run, with the recommender's tokens streamed
+    if RUN_RANKING_MODE in ("assisted", "engine"):
+        return kickoff_ranked(user_text, plans, RUN_RANKING_MODE, stream=True)
+    emit("stage", stage="analyzer", status="started")
+    return crew_registry.kickoff("recommendation_stream", {"preferences": user_text, "plans": format_plans(plans)})
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+@app.post("/run/stream")
+async def run_crew_stream(req: PreferenceRequest):
+    # Take the slot before answering so a full pool is a 503, not an SSE error on a 200
+    try:
+        reservation = stream_pool.reserve()
+    except PoolSaturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many recommendations in progress, please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    async def events():
+        try:
+            async for message in stream_events(reservation.run, kickoff_crew_streaming, req.preferences,
+                                               req.plans, result_text=output_text):
+                yield message
+        finally:
+            reservation.release()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also covers a client that leaves before the stream starts
+        background=BackgroundTask(reservation.release),
+    )
@@ -0,0 +1,272 @@
+"""In-process counters, histograms and stage spans, rendered in the Prometheus text format.
+
+Spans time one pipeline stage (``with span("stage1"):``) into the
+``stage_duration_seconds`` histogram. LLM token counts recorded inside a span
+are labelled with its stage. Set METRICS_OTEL_EXPORT=true to also export
+spans over OTLP; the exporter reads the standard OTEL_EXPORTER_OTLP_* settings.
+"""
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS_OTEL_EXPORT = os.getenv("METRICS_OTEL_EXPORT", "false").lower() == "true"
+
+# Seconds; LLM stages take several seconds, cache hits and lookups a few ms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        k + '="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple((name, labels.get(name, "")) for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}  # label key -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    out.append((f"{self.name}_bucket", key + (("le", _format_value(bound)),), cumulative))
+                out.append((f"{self.name}_sum", key, round(total, 6)))
+                out.append((f"{self.name}_count", key, count))
+        return out
+
+
+class Registry:
+    """Owns the metrics of one process and renders them for /metrics.
+
+    ``collector`` registers a function called at scrape time that returns
+    ``(name, type, help, value, labels)`` tuples, for stats that already
+    live elsewhere (caches, pools) and shouldn't be counted twice.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric, kind):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing[0]
+            self._metrics[metric.name] = (metric, kind)
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames), "counter")
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets), "histogram")
+
+    def collector(self, fn):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric, kind in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        collected = {}
+        for fn in self._collectors:
+            try:
+                for name, kind, help_text, value, labels in fn():
+                    collected.setdefault(name, (kind, help_text, []))[2].append((labels, value))
+            except Exception:
+                logger.exception("Metrics collector %s failed", getattr(fn, "__name__", fn))
+        for name, (kind, help_text, samples) in collected.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_DURATION = REGISTRY.histogram(
+    "stage_duration_seconds", "Time spent in each pipeline stage", ("stage", "outcome"))
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "LLM tokens by pipeline stage and kind (prompt, cached_prompt or completion)", ("stage", "kind"))
+
+
+# ---- Spans ----
+_current_span = contextvars.ContextVar("current_span", default=None)
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def _get_tracer():
+    """OTLP span exporter, built on first use when METRICS_OTEL_EXPORT is set."""
+    global _tracer
+    if not METRICS_OTEL_EXPORT:
+        return None
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                try:
+                    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                    from opentelemetry.sdk.resources import Resource
+                    from opentelemetry.sdk.trace import TracerProvider
+                    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+                except ImportError:
+                    logger.warning("METRICS_OTEL_EXPORT is set but the OpenTelemetry SDK is not installed")
+                    _tracer = False
+                    return None
+                # A private provider, so crewAI's own telemetry setup is left alone
+                provider = TracerProvider(resource=Resource.create({
+                    "service.name": os.getenv("OTEL_SERVICE_NAME", "planyear"),
+                }))
+                provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+                _tracer = provider.get_tracer(__name__)
+    return _tracer or None
+
+
+class Span:
+    """One timed stage. Prefer the ``span`` context manager; start and end
+    a Span directly only when they happen in different callbacks."""
+
+    def __init__(self, stage, timings=None, **attributes):
+        self.stage = stage
+        self.timings = timings
+        self.duration_ms = None
+        tracer = _get_tracer()
+        self.otel_span = tracer.start_span(stage, attributes=attributes) if tracer else None
+        self._start = time.perf_counter()
+
+    def set(self, key, value):
+        if self.otel_span is not None:
+            self.otel_span.set_attribute(key, value)
+
+    def end(self, outcome="ok"):
+        elapsed = time.perf_counter() - self._start
+        self.duration_ms = round(elapsed * 1000, 1)
+        STAGE_DURATION.observe(elapsed, stage=self.stage, outcome=outcome)
+        if self.timings is not None:
+            self.timings[self.stage] = self.duration_ms
+        if self.otel_span is not None:
+            self.otel_span.set_attribute("outcome", outcome)
+            self.otel_span.end()
+
+
+@contextmanager
+def span(stage: str, timings=None, **attributes):
+    """Time a pipeline stage into ``stage_duration_seconds``.
+
+    When ``timings`` is given, the duration in ms is also stored under
+    ``timings[stage]`` for the per-request log line.
+    """
+    current = Span(stage, timings, **attributes)
+    token = _current_span.set(current)
+    otel_context = None
+    if current.otel_span is not None:
+        from opentelemetry import trace
+
+        # Make it the parent of any span opened inside this one
+        otel_context = trace.use_span(current.otel_span, end_on_exit=False)
+        otel_context.__enter__()
+    outcome = "ok"
+    try:
+        yield current
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        if otel_context is not None:
+            otel_context.__exit__(None, None, None)
+        _current_span.reset(token)
+        current.end(outcome)
+
+
+def current_stage() -> str:
+    current = _current_span.get()
+    return current.stage if current is not None else ""
+
+
+def record_tokens(prompt_tokens, completion_tokens, stage=None, cached_tokens=0):
+    """``cached_tokens`` is the part of ``prompt_tokens`` served from a provider context cache."""
+    stage = stage if stage is not None else current_stage()
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, stage=stage, kind="prompt")
+    if cached_tokens:
+        LLM_TOKENS.inc(cached_tokens, stage=stage, kind="cached_prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, stage=stage, kind="completion")
+    current = _current_span.get()
+    if current is not None:
+        current.set("llm.prompt_tokens", prompt_tokens or 0)
+        current.set("llm.completion_tokens", completion_tokens or 0)
+
+
+def render() -> str:
+    return REGISTRY.render()
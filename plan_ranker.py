@@ -0,0 +1,127 @@
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+
+def _terms(*words):
+    # Matches at word starts, so "flexib" covers "flexible" but "top" skips "stop"
+    return re.compile(r"\b(?:" + "|".join(re.escape(w) for w in words) + ")")
+
+
+# Keywords that signal how much an employee cares about each attribute
+PREMIUM_TERMS = _terms("premium", "monthly cost", "paycheck", "cheap", "afford", "budget", "low cost", "save money")
+DEDUCTIBLE_TERMS = _terms("deductible", "out-of-pocket", "out of pocket", "upfront", "coverage starts", "high usage")
+NETWORK_TERMS = _terms("network", "doctor", "provider", "specialist", "hospital", "flexib", "referral")
+EMPHASIS_TERMS = _terms("most important", "must", "priority", "top", "really", "very", "critical", "essential")
+
+_MONEY_RE = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+
+@dataclass
+class RankingWeights:
+    premium: float = 1.0
+    deductible: float = 1.0
+    network: float = 1.0
+    preferred_networks: tuple = ()
+
+    def normalized(self):
+        total = self.premium + self.deductible + self.network
+        return self.premium / total, self.deductible / total, self.network / total
+
+
+def parse_amount(value) -> float:
+    """Turn 500, "500", "$1,500" or "$1,500/yr" into a float; NaN when there's no number."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = _MONEY_RE.search(value)
+        if match:
+            return float(match.group().replace(",", ""))
+    return float("nan")
+
+
+def _mentions(text, terms):
+    return len(terms.findall(text))
+
+
+def weights_from_criteria(criteria: str, networks=()) -> RankingWeights:
+    """Derive weights from the Preference Analyzer's criteria (or raw preferences).
+
+    Each attribute starts at 1 and gains weight for every mention, with
+    mentions in emphasized lines counting double. Any of ``networks``
+    named in the text become preferred networks.
+    """
+    premium = deductible = network = 1.0
+    for line in criteria.lower().splitlines():
+        boost = 2.0 if _mentions(line, EMPHASIS_TERMS) else 1.0
+        premium += boost * _mentions(line, PREMIUM_TERMS)
+        deductible += boost * _mentions(line, DEDUCTIBLE_TERMS)
+        network += boost * _mentions(line, NETWORK_TERMS)
+
+    text = criteria.lower()
+    preferred = tuple(n for n in networks if n and re.search(rf"\b{re.escape(n.lower())}\b", text))
+    return RankingWeights(premium, deductible, network, preferred)
+
+
+def _lower_is_better(values):
+    # Min-max scale to [0, 1] where 1 is the cheapest; unknown amounts score 0
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return np.zeros_like(values)
+    low, high = finite.min(), finite.max()
+    if high == low:
+        scaled = np.ones_like(values)
+    else:
+        scaled = (high - values) / (high - low)
+    return np.where(np.isfinite(values), scaled, 0.0)
+
+
+def score_plans(plans, weights: RankingWeights):
+    """Score every plan in one vectorized pass. Higher is a better match."""
+    premiums = np.fromiter((parse_amount(p.get("monthly_premium")) for p in plans), dtype=float, count=len(plans))
+    deductibles = np.fromiter((parse_amount(p.get("deductible")) for p in plans), dtype=float, count=len(plans))
+    networks = np.array([str(p.get("network") or "").lower() for p in plans])
+
+    w_premium, w_deductible, w_network = weights.normalized()
+    if weights.preferred_networks:
+        network_match = np.isin(networks, [n.lower() for n in weights.preferred_networks]).astype(float)
+    else:
+        # No stated preference: the network doesn't separate plans
+        network_match = np.full(len(plans), 0.5)
+
+    return (
+        w_premium * _lower_is_better(premiums)
+        + w_deductible * _lower_is_better(deductibles)
+        + w_network * network_match
+    )
+
+
+def rank_plans(plans, weights: RankingWeights, top_k: int = None):
+    """Return ``(plan, score)`` pairs best first, limited to ``top_k`` when given."""
+    if not plans:
+        return []
+    scores = score_plans(plans, weights)
+    if top_k is not None and 0 < top_k < len(plans):
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        order = top[np.argsort(-scores[top], kind="stable")]
+    else:
+        order = np.argsort(-scores, kind="stable")
+    return [(plans[i], round(float(scores[i]), 4)) for i in order]
+
+
+def rank_for_preferences(plans, criteria: str, top_k: int = None):
+    networks = sorted({str(p.get("network")) for p in plans if p.get("network")})
+    return rank_plans(plans, weights_from_criteria(criteria, networks), top_k)
+
+
+def format_ranked_plans(ranked) -> str:
+    formatted = ""
+    for position, (plan, score) in enumerate(ranked, start=1):
+        formatted += (
+            f"\n{position}. Name: {plan.get('name')} (match score {score:.2f})\n"
+            f"   Deductible: {plan.get('deductible')}\n"
+            f"   Monthly Premium: {plan.get('monthly_premium')}\n"
+            f"   Network: {plan.get('network')}\n"
+        )
+    return formatted
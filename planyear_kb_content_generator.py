@@ -1,51 +1,194 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Header, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from crewai import Agent, Task, Crew
-from supabase import create_client
 from uuid import UUID
-from pydantic import BaseModel
-import requests
 import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from crew_registry import CrewRegistry
+from dbg_index import get_guide, render_pages
+from history_store import HistoryStore, SupabaseHistoryBackend
+from job_queue import IdempotencyConflict, JobQueue, JobStore, PermanentJobError
+from kb_context import build_kb_context
+from metrics import CONTENT_TYPE, REGISTRY, render as render_metrics, span
+from question_router import (
+    NEW_QUESTION,
+    REFUSE,
+    ROUTER_GENERATION_CONFIG,
+    ROUTER_PROMPT,
+    STAGE_1,
+    Verdict,
+    build_router_prompt,
+    classify_local,
+    parse_verdict,
+    subject_terms,
+)
+from rate_limit import RateLimiter
+from response_cache import InMemoryCache, ResponseCache, fingerprint, local_embedder
+from services import Services
+from streaming import begin_answer, emit, output_text, stream_events
 
 from dotenv import load_dotenv
 load_dotenv()
 
-import google.generativeai as genai
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
+GEMINI_MAX_OUTPUT_TOKENS = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", "0")) or None
+GEMINI_TEMPERATURE = float(os.getenv("GEMINI_TEMPERATURE")) if os.getenv("GEMINI_TEMPERATURE") else None
+# Keep below the project's Gemini quota; 0 disables a limit
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "0"))
+# Send each stage's static prompt prefix once: "gemini" uses Gemini context
+# caching (needs a versioned GEMINI_MODEL such as gemini-1.5-pro-002),
+# "local" emulates it for tests and benchmarks, "off" sends full prompts.
+# The stage preambles are ~600 tokens, far below the provider minimum
+# (GEMINI_PROMPT_CACHE_MIN_TOKENS, Gemini 1.5's 32k by default), so they are
+# always sent in full. Only DBG_FULL_GUIDE's preamble + whole guide can be
+# cached, and only when the guide is big enough or the model's minimum lower;
+# otherwise caching is a no-op apart from a warning per prefix.
+GEMINI_PROMPT_CACHE = os.getenv("GEMINI_PROMPT_CACHE", "off")
+GEMINI_PROMPT_CACHE_TTL = float(os.getenv("GEMINI_PROMPT_CACHE_TTL", "3600"))
+GEMINI_PROMPT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_PROMPT_CACHE_MIN_TOKENS", "32768"))
 
-# Load Gemini API key
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
+# Load env vars
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+VECTORIZE_URL = os.getenv("VECTORIZE_URL")
+VECTORIZE_KEY = os.getenv("VECTORIZE_API_KEY")
+VECTORIZE_BATCH_URL = os.getenv("VECTORIZE_BATCH_URL")
+KB_MIN_SCORE = float(os.getenv("KB_MIN_SCORE", "0.3"))
+KB_TOKEN_BUDGET = int(os.getenv("KB_TOKEN_BUDGET", "2000"))
+
+# Each employer's Digital Benefits Guide lives in DBG_DIR/<employer>.json.
+# Stage 1 only sees the DBG_TOP_K best matching pages unless DBG_FULL_GUIDE is set.
+DEFAULT_EMPLOYER = os.getenv("DEFAULT_EMPLOYER", "automattic")
+DBG_TOP_K = int(os.getenv("DBG_TOP_K", "4"))
+DBG_FULL_GUIDE = os.getenv("DBG_FULL_GUIDE", "false").lower() == "true"
+
+# Job mode: POST /ask/jobs returns a job id and ASK_JOB_CONCURRENCY workers
+# per process answer queued questions from the SQLite file at JOBS_DB_PATH
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.sqlite3")
+ASK_JOB_CONCURRENCY = int(os.getenv("ASK_JOB_CONCURRENCY", "2"))
+# Longest a GET /ask/jobs/{id}?wait=... long poll is held open
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", "30"))
+
+# crewAI's verbose console output is slow under load; set CREW_VERBOSE=false in production
+CREW_VERBOSE = os.getenv("CREW_VERBOSE", "true").lower() == "true"
+
+logger = logging.getLogger(__name__)
+
+# ---- Services ----
+# Clients are built on first use (or at startup by the lifespan), never at
+# import. Tests swap in fakes with services.override(supabase=..., ...).
+def make_gemini_llm():
+    import google.generativeai as genai
+    from gemini_llm import GeminiLLM
+
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return GeminiLLM(
+        model=GEMINI_MODEL,
+        max_output_tokens=GEMINI_MAX_OUTPUT_TOKENS,
+        temperature=GEMINI_TEMPERATURE,
+        limiter=RateLimiter(GEMINI_MAX_CONCURRENCY, GEMINI_REQUESTS_PER_MINUTE),
+        prefix_cache=services.prompt_cache,
+    )
 
-def gemini_generate(prompt: str):
-    """Call Gemini Pro API to generate a response."""
-    model = genai.GenerativeModel("gemini-1.5-pro")
-    response = model.generate_content(prompt)
-    return response.text
+def make_prompt_cache():
+    from prompt_cache import GeminiContextCache, LocalContextCache, PromptPrefixCache
+
+    if GEMINI_PROMPT_CACHE == "off":
+        return None
+    backend = GeminiContextCache() if GEMINI_PROMPT_CACHE == "gemini" else LocalContextCache()
+    cache = PromptPrefixCache(
+        backend,
+        GEMINI_MODEL,
+        ttl=GEMINI_PROMPT_CACHE_TTL,
+        min_tokens=GEMINI_PROMPT_CACHE_MIN_TOKENS,
+    )
+    cache.register("stage1", STAGE_1_PREFIX)
+    cache.register("stage2", STAGE_2_PREFIX)
+    return cache
+
+def make_supabase():
+    from supabase import create_client
+
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+def make_history_store():
+    # Last few messages per user, kept in memory in front of the chat_history table.
+    # Only writes through POST /chat_history update the buffer; other services
+    # write chat_history directly, so buffering is off unless CHAT_HISTORY_TTL
+    # is set. Set it only when every writer goes through this app.
+    return HistoryStore(
+        SupabaseHistoryBackend(services.supabase),
+        size=4,
+        ttl=float(os.getenv("CHAT_HISTORY_TTL", "0")),
+    )
 
-from crewai import LLM
+def make_vectorize_client():
+    from vectorize_client import VectorizeClient
 
-class GeminiLLM(LLM):
-    def __init__(self):
-        super().__init__(model="gemini-1.5-pro")  # pass model to parent
-        self.model = "gemini-1.5-pro"
+    # One pooled client for the process so lookups reuse TCP/TLS connections
+    return VectorizeClient(
+        VECTORIZE_URL,
+        VECTORIZE_KEY,
+        connect_timeout=float(os.getenv("VECTORIZE_CONNECT_TIMEOUT", "3")),
+        read_timeout=float(os.getenv("VECTORIZE_READ_TIMEOUT", "15")),
+        retries=int(os.getenv("VECTORIZE_RETRIES", "2")),
+        batch_url=VECTORIZE_BATCH_URL,
+    )
 
-    def call(self, prompt, **kwargs):
-        # If prompt is a list of messages, flatten to text
-        if isinstance(prompt, list):
-            prompt = "\n".join(f"{m.get('role', '')}: {m.get('content', '')}" for m in prompt)
-        
-        return gemini_generate(prompt)
+def make_response_cache():
+    return ResponseCache(
+        InMemoryCache(max_entries=ASK_CACHE_MAX_ENTRIES, ttl=ASK_CACHE_TTL),
+        embed_fn=local_embedder() if ASK_CACHE_SEMANTIC else None,
+        similarity_threshold=ASK_CACHE_SIMILARITY,
+    )
 
-gemini_llm = GeminiLLM()
+services = Services()
+services.register("gemini_llm", make_gemini_llm)
+services.register("prompt_cache", make_prompt_cache)
+services.register("supabase", make_supabase)
+services.register("history_store", make_history_store)
+services.register("vectorize_client", make_vectorize_client)
+services.register("response_cache", make_response_cache)
+services.register("route_cache", lambda: ResponseCache(InMemoryCache(max_entries=ASK_CACHE_MAX_ENTRIES, ttl=ASK_CACHE_TTL)))
+services.register("job_store", lambda: JobStore(JOBS_DB_PATH))
+services.register("ask_jobs", lambda: JobQueue(services.job_store, "ask", ask_job, concurrency=ASK_JOB_CONCURRENCY))
 
-# Load env vars
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-VECTORIZE_URL = os.getenv("VECTORIZE_URL")
-VECTORIZE_KEY = os.getenv("VECTORIZE_API_KEY")
+# FastAPI dependencies; override with app.dependency_overrides in tests
+def get_history_store() -> HistoryStore:
+    return services.history_store
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-app = FastAPI()
+def get_response_cache() -> ResponseCache:
+    return services.response_cache
+
+def gemini_generate(prompt: str):
+    """Call Gemini Pro API to generate a response."""
+    return services.gemini_llm.generate(prompt)
+
+def gemini_generate_stream(prompt: str):
+    """Call Gemini Pro API and yield the response text as it is generated."""
+    return services.gemini_llm.generate_stream(prompt)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build everything before taking traffic; in a forking server this runs
+    # per worker, after the fork, so no sockets are shared between processes
+    for name in ("gemini_llm", "history_store", "vectorize_client", "response_cache", "route_cache"):
+        services.get(name)
+    get_guide(DEFAULT_EMPLOYER)
+    crew_registry.warm()
+    # Workers otherwise start with the first POST /ask/jobs
+    await services.ask_jobs.resume()
+    yield
+    await services.ask_jobs.stop()
+    services.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # ---- Stage 1 and Stage 2 prompts ----
 STAGE_1_PROMPT = """
@@ -115,57 +258,6 @@ content:
 6. Sources should be cited at the very bottom of your response with appropriate break lines between each source
 
 **DBG**
-{
-"pages": [
-{
-    "content": "Automattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025 \n AUTOMATTIC\n\nAutomattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025\n\n# Your Benefits Summary\n\n## Important Dates\n\nPlan Effective Dates: January 01, 2025 December 31, 2025 Open Enrollment Date: October 14, 2024 November 04, 2024\n\nThis is your once-a-year chance to enroll in or make changes to your employer- sponsored health plan:\n\n- You may elect or decline benefits; this is a passive open enrollment. If no changes are made to your health benefits, your current 2024 elections will carry over into the 2025 benefits plan year. Exception being your pre-tax spending accounts, (e.g. Medical FSA, Dependnet Care FSA, Limited Purpose FSA).\n\n- You may add or drop dependents\n\n- You may set contributions to tax-advantaged accounts\n\nYou cannot make changes outside of open enrollment unless you have a qualifying life event (QLE).\n\n## Benefits Eligibility\n\nAny active, regular, full-time employee working a minimum of 20 hours per week is eligible for all benefits. Benefits are effective on your date of hire.\n\nOthers eligible for benefits include:\n\n- Your legal spouse or domestic partner,\n\nThis Benefits Guide offers - high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan.\n\n- Your unmarried dependent children up until age 26 (including legally adopted and stepchildren), and/or\n\n- Any dependent child who reaches the limiting age and is incapable of self- support because of a mental or physical disability.\n\n## Qualifying Life Events\n\nA change in circumstance-like starting a new job, getting married or divorced, having or adopting a baby, losing health insurance coverage or moving to a new state-makes you eligible for a special enrollment period (outside of open enrollment).\n\nExperiencing a QLE is the exception to the once-a-year rule about making health and benefits changes. You have up to 30 days after the qualifying life event to submit a QLE request to your benefits administrator.\n\nThe insurance carrier will require:\n\n1. Supporting documentation\n\n\n\n## Benefit Plans Offered\n\n\n\n- Medical\n\n- Dental\n\n- Vision\n\n- Basic Long-Term Disability\n\n- Voluntary Life W/AD&D\n\n- Basic Short-Term Disability\n\n- Basic Life W/AD&D\n\n- Accident\n\n- Critical Illness\n\n- Hospital\n\n- 401k\n\nLUMITY\nGROUP COMPANY \n ",
-    "page": "1"
-},
-{
-    "content": "Automattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025 \n  Your Benefits Summary (cont.)\n\n## Benefit Plans Offered (cont.)\n\nAUTOMATTIC\n\nAutomattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025\n\n2. The date the change occurred\n\n## Waiver Credit\n\nAre you already covered on a parent's or partner's health plan?\n\n- A waiver reimbursement is available to those with other group or government sponsored coverage\n\n- You have the option to decline medical coverage.\n\n- You will still receive the waiver even if you sign up for Dental and Vision.\n\nLUMITY\nAN ALERA GROUP COMPANY\n\nThis Benefits Guide offers a high-level overview of your available benefits The official Plan Documents are what govern your official rights and coverage under each plan. \n This Benefits Guide offers a high-level overview of your available benefits The official Plan Documents are what govern your official rights and coverage under each plan.",
-    "page": "2"
-},
-{
-Benefits At-A-Glance\n\nAutomattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025\n\nMedical\n\nIn-Network\n\n<table><tr><th></th><th></th><th>Aetna EPO</th><th>Aetna PPO 250</th><th>Aetna PPO HSA 1650</th></tr><tr><td rowspan=\"4\">Per Month\nPremiums</td><td>Employee</td><td>$0.00</td><td>$0.00</td><td>$0.00</td></tr><tr><td>+ Spouse</td><td>$0.00</td><td>$0.00</td><td>$0.00</td></tr><tr><td>+ Child(ren)</td><td>$0.00</td><td>$0.00</td><td>$0.00</td></tr><tr><td>+ Family</td><td>$0.00</td><td>$0.00</td><td>$0.00</td></tr><tr><td colspan=\"5\">Deductibles &amp; OOP Maximum</td></tr><tr><td colspan=\"2\">Individual Deductible</td><td>$0</td><td>$250</td><td>$1,650</td></tr><tr><td colspan=\"2\">Family Deductible</td><td>$0</td><td>$500</td><td>$3,300</td></tr><tr><td colspan=\"2\">Deductible (Ind within Fam)</td><td>-</td><td>-</td><td>$3,300</td></tr><tr><td colspan=\"2\">Individual Out-of-Pocket Max</td><td>$2,500</td><td>$1,250</td><td>$3,500</td></tr><tr><td colspan=\"2\">Family Out-of-Pocket Max</td><td>$5,000</td><td>$2,500</td><td>$7,000</td></tr><tr><td colspan=\"2\">Out-of-Pocket Max (Ind within Fam)</td><td>-</td><td></td><td>$3,500</td></tr><tr><td colspan=\"5\">Services</td></tr><tr><td>Office Visit</td><td></td><td>$20 per visit</td><td>$10 per visit</td><td>10%</td></tr><tr><td>Specialist Visit</td><td></td><td>$20 per visit</td><td>$10 per visit</td><td>10%</td></tr><tr><td>Preventive Care</td><td></td><td>$0 per visit</td><td>$0 per visit</td><td>$0 per visit</td></tr><tr><td colspan=\"2\">Emergency Room</td><td>$100 per visit</td><td>$100 per visit 10%</td><td>10%</td></tr><tr><td>Urgent Care</td><td></td><td>$20 per visit</td><td>$10 per visit</td><td>10%</td></tr><tr><td>Diagnostic Lab/ X-Ray</td><td></td><td>$20 per visit</td><td>$10 per visit</td><td>10%</td></tr><tr><td>Hospital Inpatient</td><td></td><td>$250 per admission</td><td>10%</td><td>10%</td></tr><tr><td>Hospital Outpatient</td><td></td><td>$100 per procedure</td><td>10%</td><td>10%</td></tr><tr><td colspan=\"5\">Rx</td></tr><tr><td>Retail Tier 1</td><td></td><td>$10/prescription (retail) and\n$20/prescription (home\ndelivery)</td><td>$10/ prescription, deductible\ndoes not apply (retail) and\n$20/prescription, deductible\ndoes not apply (home delivery)</td><td>0/prescription (retail) and\n$20/prescription (home\ndelivery)</td></tr><tr><td>Retail Tier 2</td><td></td><td>$30/prescription (retail) and\n$60/prescription (home\ndelivery)</td><td>$30/prescription, deductible\ndoes not apply (retail) and $60/\nprescription, deductible does\nnot apply (home delivery)</td><td>$25/prescription (retail) and\n$50/prescription (home\ndelivery)</td></tr><tr><td>Retail Tier 3</td><td></td><td>$50/prescription (retail) and\n$100/prescription (home\ndelivery)</td><td>$50/prescription, deductible\ndoes not apply (retail) and\n$100/prescription, deductible\ndoes not apply (home delivery)</td><td>$40/prescription (retail) and\n$80/prescription (home\ndelivery)</td></tr><tr><td>Retail Tier 4</td><td></td><td>30% up to $200 per script</td><td>30% up to $200 per script</td><td>30% up to $200 per script 1</td></tr></table>\n\n1\nAfter Deductible is Met\n\nLUMITY\nALERA GROUP COMPANY\n\nThis Benefits Guide offers a - high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan. \n This Benefits Guide offers a - high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan.",
-    "page": "3"
-},
-{
-    "content": "Automattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025 \n Benefits At-A-Glance\n\nAutomattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025\n\nIn-Network\n\n<table><tr><th></th><th></th><th>HMAA PPO</th><th>Kaiser HMO Colorado</th><th>Kaiser HMO Hawaii</th></tr><tr><td rowspan=\"4\">Per Month\nPremiums</td><td>Employee</td><td>$0.00</td><td>$0.00</td><td>$0.00</td></tr><tr><td>+ Spouse</td><td>$0.00</td><td>$0.00</td><td>$0.00</td></tr><tr><td>+ Child(ren)</td><td>$0.00</td><td>$0.00</td><td>$0.00</td></tr><tr><td>+ Family</td><td>$0.00</td><td>$0.00</td><td>$0.00</td></tr><tr><td colspan=\"5\">Deductibles &amp; OOP Maximum</td></tr><tr><td colspan=\"2\">Individual Deductible</td><td>$100</td><td>$0</td><td>$0</td></tr><tr><td colspan=\"2\">Family Deductible</td><td>$300</td><td>$0</td><td>$0</td></tr><tr><td colspan=\"2\">Deductible (Ind within Fam)</td><td>-</td><td>-</td><td>-</td></tr><tr><td colspan=\"2\">Individual Out-of-Pocket Max</td><td>$2,500</td><td>$2,000</td><td>$2,500</td></tr><tr><td colspan=\"2\">Family Out-of-Pocket Max</td><td>$7,500</td><td>$4,000</td><td>$7,500</td></tr><tr><td colspan=\"2\">Out-of-Pocket Max (Ind within Fam)</td><td>-</td><td>-</td><td>-</td></tr><tr><td>Services</td><td></td><td></td><td></td><td></td></tr><tr><td>Office Visit</td><td></td><td>10%</td><td>$20 per visit</td><td>$15 per visit</td></tr><tr><td>Specialist Visit</td><td></td><td>10%</td><td>$30 per visit</td><td>$15 per visit</td></tr><tr><td>Preventive Care</td><td></td><td>$0 per visit</td><td>$0 per visit</td><td>No Charge</td></tr><tr><td>Emergency Room</td><td></td><td>10% 1</td><td>$200 per visit</td><td>$100 per visit</td></tr><tr><td>Urgent Care</td><td></td><td>$25 per visit</td><td>$30 per visit</td><td>$15 per visit; $15 IN-AREA /\n20% (out of area)</td></tr><tr><td>Diagnostic Lab/ X-Ray</td><td></td><td>20%</td><td>$10 per visit</td><td>$15 / procedure Basic 20%\nSpecialty</td></tr><tr><td>Hospital Inpatient</td><td></td><td>10% 1</td><td>$250 per admission</td><td>10%</td></tr><tr><td>Hospital Outpatient</td><td></td><td>10%</td><td>$125 per procedure</td><td>10%</td></tr><tr><td colspan=\"4\">Rx</td><td></td></tr><tr><td>Retail Tier 1</td><td></td><td>$12 per script</td><td>$10 per script</td><td>$15 per script</td></tr><tr><td>Retail Tier 2</td><td></td><td>$24 per script</td><td>$30 per script</td><td>$50 per script</td></tr><tr><td>Retail Tier 3</td><td></td><td>$48 per script</td><td>$60 per script</td><td>$50 per script</td></tr><tr><td>Retail Tier 4</td><td></td><td>Greater of Copay or 20% for Rx\nover $250</td><td>20% up to $250 per script</td><td>$200 per script</td></tr></table>\n\n1\nAfter Deductible is Met\n\nLUMITY\nALERA GROUP COMPANY\n\nThis Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan. \n This Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan.",
-    "page": "4"
-},
-{
-    "content": "Automattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025 \n Benefits At-A-Glance\n\nAutomattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025\n\nIn-Network\n\n<table><tr><th></th><th>Kaiser HMO Northern\nCalifornia</th><th>Kaiser HMO Southern\nCalifornia</th><th>Kaiser HSA Northern\nCalifornia</th></tr><tr><td rowspan=\"4\">Employee\n\nPer Month + Spouse\nPremiums\n+ Child(ren)\n\n+ Family</td><td>$0.00</td><td>$0.00</td><td>$0.00</td></tr><tr><td>$0.00</td><td>$0.00</td><td>$0.00</td></tr><tr><td>$0.00</td><td>$0.00</td><td>$0.00</td></tr><tr><td>$0.00</td><td>$0.00</td><td>$0.00</td></tr><tr><td colspan=\"4\">Deductibles &amp; OOP Maximum</td></tr><tr><td>Individual Deductible</td><td>$0</td><td>$0</td><td>$1,650</td></tr><tr><td>Family Deductible</td><td>$0</td><td>$0</td><td>$3,300</td></tr><tr><td>Deductible (Ind within Fam)</td><td>-</td><td>-</td><td>$3,300</td></tr><tr><td>Individual Out-of-Pocket Max</td><td>$1,500</td><td>$1,500</td><td>$3,300</td></tr><tr><td>Family Out-of-Pocket Max</td><td>$3,000</td><td>$3,000</td><td>$6,600</td></tr><tr><td>Out-of-Pocket Max (Ind within Fam)</td><td>-</td><td>-</td><td>$3,300</td></tr><tr><td colspan=\"3\">Services</td><td></td></tr><tr><td>Office Visit</td><td>$20 per visit</td><td>$20 per visit</td><td>10%</td></tr><tr><td>Specialist Visit</td><td>$35 per visit</td><td>$35 per visit</td><td>10%</td></tr><tr><td>Preventive Care</td><td>$0 per visit</td><td>$0 per visit</td><td>$0 per visit 1</td></tr><tr><td>Emergency Room</td><td>$100 per visit</td><td>$100 per visit</td><td>10%</td></tr><tr><td>Urgent Care</td><td>$20 per visit</td><td>$20 per visit</td><td>10%</td></tr><tr><td>Diagnostic Lab/ X-Ray</td><td>$0 per procedure</td><td>$0 per procedure</td><td>10%</td></tr><tr><td>Hospital Inpatient</td><td>$250 per admission</td><td>$250 per admission</td><td>10%</td></tr><tr><td>Hospital Outpatient</td><td>$35 per procedure</td><td>$35 per procedure</td><td>10%</td></tr><tr><td colspan=\"4\">Rx</td></tr><tr><td>Retail Tier 1</td><td>$10 per script</td><td>$10 per script</td><td>$10 per script</td></tr><tr><td>Retail Tier 2</td><td>$35 per script</td><td>$35 per script</td><td>$30 per script</td></tr><tr><td>Retail Tier 3</td><td>$35 per script</td><td>$35 per script</td><td>$30 per script 1</td></tr><tr><td>Retail Tier 4</td><td>20% up to $150 per script</td><td>20% up to $150 per script</td><td>20% up to $250</td></tr></table>\n\n1\n\nAfter Deductible is Met\n\nLUMITY\nALERA GROUP COMPANY\n\nThis Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights\n\nand\n\ncoverage\n\nunder\n\neach\n\nplan. \n This Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights",
-    "page": "5"
-},
-{
-    "content": "Automattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025 \n Benefits At-A-Glance\n\nAutomattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025\n\nIn-Network\n\n<table><tr><th></th><th></th><th>Kaiser HSA Southern\nCalifornia</th></tr><tr><td rowspan=\"4\">Per Month\nPremiums</td><td>Employee</td><td>$0.00</td></tr><tr><td>+ Spouse</td><td>$0.00</td></tr><tr><td>+ Child(ren)</td><td>$0.00</td></tr><tr><td>+ Family</td><td>$0.00</td></tr><tr><td colspan=\"3\">Deductibles &amp; OOP Maximum</td></tr><tr><td colspan=\"2\">Individual Deductible</td><td>$1,650</td></tr><tr><td colspan=\"2\">Family Deductible</td><td>$3,300</td></tr><tr><td colspan=\"2\">Deductible (Ind within Fam)</td><td>$3,300</td></tr><tr><td colspan=\"2\">Individual Out-of-Pocket Max</td><td>$3,300</td></tr><tr><td colspan=\"2\">Family Out-of-Pocket Max</td><td>$6,600</td></tr><tr><td colspan=\"2\">Out-of-Pocket Max (Ind within Fam)</td><td>$3,300</td></tr><tr><td colspan=\"3\">Services</td></tr><tr><td>Office Visit</td><td></td><td>10%</td></tr><tr><td>Specialist Visit</td><td></td><td>10%</td></tr><tr><td>Preventive Care</td><td></td><td>$0 per visit</td></tr><tr><td>Emergency Room</td><td></td><td>10%</td></tr><tr><td>Urgent Care</td><td></td><td>10%</td></tr><tr><td>Diagnostic Lab/ X-Ray</td><td></td><td>10%</td></tr><tr><td>Hospital Inpatient</td><td></td><td>10%</td></tr><tr><td>Hospital Outpatient</td><td></td><td>10%</td></tr><tr><td colspan=\"3\">Rx</td></tr><tr><td>Retail Tier 1</td><td></td><td>$10 per script</td></tr><tr><td>Retail Tier 2</td><td></td><td>$30 per script</td></tr><tr><td>Retail Tier 3</td><td></td><td>$30 per script</td></tr><tr><td>Retail Tier 4</td><td></td><td>20% up to $250 1</td></tr></table>\n\n1\nAfter Deductible is Met\n\nLUMITY\nALERA GROUP COMPANY\n\nThis Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan. \n This Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan.",
-    "page": "6"
-},
-{
-    "content": "Automattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025 \n Benefits At-A-Glance\n\nAutomattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025\n\n## Dental\n\nIn-Network\n\n<table><tr><th></th><th></th><th>Aetna Dental PPO (Base)</th><th>Aetna Dental PPO (Buy\nUp)</th></tr><tr><td rowspan=\"4\">Per Month\nPremiums</td><td>Employee</td><td>$0.00</td><td>$8.00</td></tr><tr><td>+ Spouse</td><td>$0.00</td><td>$16.00</td></tr><tr><td>+ Child(ren)</td><td>$0.00</td><td>$16.00</td></tr><tr><td>+ Family</td><td>$0.00</td><td>$28.00</td></tr><tr><td colspan=\"4\">Deductible &amp; Benefit Maximums</td></tr><tr><td colspan=\"2\">Annual Maximum (Per Person)</td><td>$3,000</td><td>$5,000</td></tr><tr><td>Individual Deductible</td><td></td><td>$0</td><td>$0</td></tr><tr><td>Family Deductible</td><td></td><td>$0</td><td>$0</td></tr><tr><td>Orthodontia Maximum</td><td></td><td>$2,000</td><td>$3,000</td></tr><tr><td colspan=\"3\">Services</td><td></td></tr><tr><td>Preventive Care</td><td></td><td>0%</td><td>0%</td></tr><tr><td>Basic Care</td><td></td><td>10% 1</td><td>0%</td></tr><tr><td>Major Care</td><td></td><td>40%</td><td>30%</td></tr></table>\n\n## 9 Vision\n\n1\nAfter Deductible is Met\n\nIn-Network\n\n<table><tr><th colspan=\"2\"></th><th>Guardian Vision PPO\n(Base)</th><th>Guardian Vision PPO (Buy\nUp)</th></tr><tr><td rowspan=\"4\">Per Month\nPremiums</td><td>Employee</td><td>$0.00</td><td>$10.00</td></tr><tr><td>+ Spouse</td><td>$0.00</td><td>$22.00</td></tr><tr><td>+ Child(ren)</td><td>$0.00</td><td>$14.00</td></tr><tr><td>+ Family</td><td>$0.00</td><td>$26.00</td></tr><tr><td colspan=\"4\">Services</td></tr><tr><td colspan=\"2\">Exam Copay</td><td>$10 per year</td><td>$10 per year</td></tr><tr><td colspan=\"2\">Eyeglass Lenses Single</td><td>$25 per year</td><td>$25 per year</td></tr><tr><td colspan=\"2\">Eyeglass Lenses Bifocal</td><td>$25 per year</td><td>$25 per year</td></tr><tr><td colspan=\"2\">Eyeglass Lenses Trifocal</td><td>$25 per year</td><td>$25 per year</td></tr><tr><td colspan=\"2\">Frames</td><td>Up to $200 Allowance per year</td><td>Up to $250 Allowance per year</td></tr><tr><td colspan=\"2\">Elective Contacts</td><td>Up to $200</td><td>Up to $250 Allowance per year</td></tr><tr><td colspan=\"2\">Medically Necessary Contacts</td><td>Covered 100%</td><td>Covered 100%</td></tr></table>\n\nLUMITY\nALERA GROUP COMPANY\n\nThis Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan. \n This Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan.",
-    "page": "7"
-},
-{
-    "content": "Automattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025 \n Benefits At-A-Glance\n\nAutomattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025\n\n\n\n## Life & Disability\n\n<table><tr><th></th><th>Guardian Basic Life &amp; AD&amp;D</th></tr><tr><td>Benefit</td><td>2x Annual Salary</td></tr><tr><td>Benefit Maximum</td><td>$1,000,000</td></tr><tr><td>Guaranteed Issue</td><td>$1,000,000</td></tr></table>\n\n<table><tr><th></th><th>Guardian Short Term Disability</th></tr><tr><td>Benefit Percentage</td><td>60%</td></tr><tr><td>Maximum Weekly\nBenefit</td><td>$2,000</td></tr><tr><td>Maximum Benefit\nDuration</td><td>12 weeks</td></tr><tr><td>Elimination Period</td><td>3 days</td></tr></table>\n\n<table><tr><th></th><th>Guardian Long Term Disability</th></tr><tr><td>Benefit Percentage</td><td>60%</td></tr><tr><td>Maximum Monthly\nBenefit</td><td>$10,000</td></tr><tr><td>Maximum Benefit\nDuration</td><td>ADEA1 w/ SSNRA</td></tr><tr><td>Elimination Period</td><td>90 days</td></tr></table>\n\n<table><tr><th></th><th>Guardian Voluntary Life &amp; AD&amp;D</th></tr><tr><td>Employee Benefit</td><td>Increments of $10,000 up to $1,000,000</td></tr><tr><td>Spouse Benefit</td><td>Increments of $5,000 up to $100,000</td></tr><tr><td>Child Benefit</td><td>$1,000 up to $10,000</td></tr><tr><td>Employee\nGuaranteed Issue</td><td>$250,000</td></tr><tr><td>Spouse Guaranteed\nIssue</td><td>$25,000</td></tr><tr><td>Child Guaranteed\nIssue</td><td>$10,000</td></tr></table>\n\n\n\n## Worksite Benefits\n\n## Ladder Voluntary Life\n\nCoverage previously elected under Ladder is portable by default.\n\nMost experts recommend coverage of a minimum of 10x your annual salary to set your loved ones up with enough to cover living expenses, college tuition, and mortgage payments. Your Group Life offering is a great starting point, but for those with dependents it may not be enough.\n\nLadder makes it easy to fill that coverage gap, with a guaranteed digital-first application for up to $3m in coverage, the flexibility to adjust coverage over time as your needs change, and portability by default (meaning your policy stays in effect even if you change jobs).\n\nTo find out how much coverage you need and apply for term life insurance visit ladderlife.com/lumity. The digital process takes about 10 min to apply. You'll get an instant decision and if approved, the option to start protecting your family today.\n\nLadder Insurance Services, LLC (CA license OK22568; AR license  3000140372) distributes term life insurance products issued by multiple insurers - for further details see ladderlife.com. All insurance products are governed by the terms set forth in the applicable insurance policy. Each insurer has financial responsibility for its own products.\n\n- Easy digital application, with no medical exams up to $3m (only health questions are asked)\n\n- Policies are portable by default, and stay with you even if you change jobs\n\n- Available year-round (not just during open enrollment)\n\nGet started: ladderlife.com/lumity\n\nAetna Accident Plan\n\nYou must complete the Aetna Voluntary Portability form found under the Plan Resrouces link and return it to us along with payment the first premium for the portability coverage not later than 30 calendar days after your coverage under the policy ends. Portability coverage will be effective on the day after benefits under the policy end. If you have any questions, call member services at 1-800-800-8121 (TTY:711), Monday through Friday, 8 AM to 6 PM.\n\nAccident insurance provides a one-time lump sum cash payment if you suffer an accident covered under your policy. Examples may include broken bones, severe burns, or other emergency treatments. The purpose of this coverage is to help with the cost of an expensive, unexpected accident.\n\nAetna Voluntary Accident Plan Claim Submisson:\n\nLUMITY\nALERA GROUP COMPANY\n\nThis Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan. \n ",
-    "page": "8"
-},
-{
-    "content": "Automattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025 \n Benefits At-A-Glance\n\nAutomattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025\n\nClaim form: Aetna Accident Claim Form pdf\n\nOnline web link: https://www12.aetna.com/AVOnlineClaimForm/welcome.aspx?productType=HOS\n\n## Aetna Critical Illness Plan\n\nYou must complete the Aetna Voluntary Portability form found under the Plan Resrouces link and return it to us along with payment the first premium for the portability coverage not later than 30 calendar days after your coverage under the policy ends. Portability coverage will be effective on the day after benefits under the policy end. If you have any questions, call member services at 1-800-800-8121 (TTY:711). Monday through Friday, 8 AM to 6 PM.\n\nCritical illness insurance provides a one-time lump sum cash payment if you are diagnosed with a covered condition listed in the policy. Examples may include cancer, strokes, heart attacks, strokes, etc. The purpose of this coverage is to help with the cost of treating and recovering from the specific condition.\n\nAetna Voluntary Critical Illness Plan Claim Submisson:\n\nClaim form: Aetna Criticall Illness Claim Form pdf\n\nOnline web link: https://www12.aetna.com/AVOnlineClaimForm/welcome.asp?productTypesHOS\n\n## Aetna Hospital Indemnity\n\nYou must complete the Aetna Voluntary Portability form found under the Plan Resrouces link and return it to us along with payment the first premium for the portability coverage not later than 30 calendar days after your coverage under the policy ends. Portability coverage will be effective on the day after benefits under the policy end. If you have any questions, call member services at 1-800-800-8121 (TTY:711). Monday through Friday, 8 AM to 6 PM.\n\nHospital insurance (also known as hospital indemnity insurance) provides you with benefits if you are hospitalized Examples may include if you are admitted for inpatient surgery or admitted for critical care. The purpose of this coverage is to help with the cost of an expensive hospital visit or admission\n\nAetna Voluntary Hospital indemnity Plan Claim Submisson:\n\nClaim form: Aetna Hospital Indemnity Claim Form.pdf Online web link: https://ww12.aetna.com/AVOnilineClaimForm/welcome.aspx?producTypesHOS\n\nLUMITY\nALERA GROUP COMPANY\n\nThis Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan. \n This Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan.",
-    "page": "9"
-},
-{
-    "content": "Automattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025 \n Benefits At-A-Glance\n\nAutomattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025\n\n\n\n## Tax Advantaged Accounts\n\n<table><tr><th>Employer\nContribution per\nMonth</th><th colspan=\"2\">Health Equity HSA</th></tr><tr><td>Employee</td><td>$137.50</td><td></td></tr><tr><td>Spouse</td><td>$275.00</td><td>A Health Savings Account (HSA) is like a \"healthcare 401(k).\" It's a tax-advantaged account you can dip into anytime to pay for qualified</td></tr><tr><td>Child(ren)</td><td>$275.00</td><td>out-of-pocket medical, dental, and vision expenses. Or, let it build to complement your retirement savings. You own the account, and\nfunds carry over year after year.</td></tr><tr><td>Family</td><td>$275.00</td><td></td></tr><tr><td>Contribution\nLimit(s)</td><td></td><td>HSA's have an annual contribution limit. While you must be enrolled in an HSA-eligible plan to contribute to your HSA, you can always\n\nspend your already existing HSA funds on qualified medical expenses.</td></tr><tr><td>Max Yearly\nContribution\n(Individual)</td><td>$4,300.00</td><td>HSA investment Oppurtunities- Investment threshold is $1,000. For additional information please see enclosed details and/or contact\nHealth Equity at (866) 346-5800.</td></tr><tr><td>Max Yearly\nContribution\n(Family)</td><td>$8,550.00</td><td>Health Equity- HSA Investment Guide pdf</td></tr></table>\n\n<table><tr><th>Contribution\nLimit(s)</th><th colspan=\"2\">HealthEquity Dependent Care FSA</th></tr><tr><td>Max Yearly\nContribution Married\nFiling Separately</td><td>$2,500.00</td><td>A Dependent Care Flexible Spending Account (DCFSA) also known as a Dependent Care Assistance Plan (DCAP) is an employer-\n\nowned, tax-advantaged spending account that you can use to pay for qualified child and elder care expenses while you're working,</td></tr><tr><td>Max Yearly</td><td></td><td>looking for work, or attending school full-time.</td></tr><tr><td>Contribution Married\nFiling Jointly or\nSingle Parent</td><td>$5,000.00</td><td>You need to incur all eligible dependent care expenses prior to the end of the plan year. Requests for reimbursements need to be filed\nbefore the end of the claims filing deadline for your plan, typically 75 days after the end of the plan year. Check with your employer for the\nexact date.</td></tr></table>\n\n\"Runout period, 3/31/2025 *For claims incurred prior to 12/31/2024 No rollover available for DCFA.'\n\n<table><tr><th>Contribution\nLimit(s)</th><th colspan=\"2\">HealthEquity Healthcare FSA</th></tr><tr><td>Annual Max\nContributions</td><td>$3,300.00</td><td>A General-Purpose Healthcare Flexible Spending Account (Healthcare FSA) can be used to pay for qualified out-of-pocket costs for</td></tr><tr><td>End of Year Policy</td><td>Up to $660\nrollover</td><td>medical, dental, and vision care, as well as many more expenses. Because the money you contribute to an FSA isn't taxed, you can\nreduce your overall healthcare expenses.</td></tr><tr><td></td><td></td><td>You typically need to incur all expenses prior to the end of the plan year. Requests for reimbursements need to be filed before the end of\nthe claims filing deadline for your plan, typically 75 days after the end of the plan year. Check with your employer for the exact date.</td></tr><tr><td></td><td></td><td>Your employer may also offer you a grace period OR a carryover option. If your employer offers you a grace period, you have an\nadditional 2\u00bd months after the end of the plan year to incur expenses. If your employer offers you the carryover option, you may carry a\nlimited amount from your account to the next plan year.</td></tr><tr><td></td><td></td><td>\"Runout period, 3/31/2025. *For claims incurred prior to 12/31/2024 2024 rollover funds will not be available/posted into the member's\naccount until 5/31/2025.*</td></tr></table>\n\n<table><tr><th colspan=\"3\">Contribution\nLimit(s) HealthEquity Limited FSA</th></tr><tr><td>Annual Max\nContributions</td><td>$3,300.00</td><td rowspan=\"2\">A Limited Prupose flexible spending account can be used to pay for qualified out-of-pocket costs for dental, and vision care. Because the\n\nmoney you contribute to an FSA isn't taxed, you can reduce your overall healthcare expenses.</td></tr><tr><td>End of Year Policy</td><td>Up to $660\nrollover</td></tr></table>\n\nLUMITY\nGROUP COMPANY\n\nThis Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan. \n This Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan.",
-    "page": "10"
-},
-{
-    "content": "Automattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025 \n Benefits At-A-Glance\n\nAutomattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025\n\nYou typically need to incur all expenses prior to the end of the plan year. Requests for reimbursements need to be filed before the end of the claims filing deadline for your plan, typically 75 days after the end of the plan year. Check with your employer for the exact date.\n\nYour employer may also offer you a grace period OR a carryover option. If your employer offers you a grace period, you have an additional 2\u00bd months after the end of the plan year to incur expenses. If your employer offers you the carryover option, you may carry a limited amount from your account to the next plan year.\n\n*75 day runout period, 3/31/2025. *For claims incurred prior to 12/31/2024. 2024 rollover funds will not be available/posted into the member's account until 4/30/2025.*\n\n\n\n401(k)\n\n<table><tr><th></th><th>Betterment</th><th>401K</th><th>Plan</th></tr><tr><td>Annual Max\nContribution</td><td>$23,500.00</td><td></td><td>A 401(k) is an employer sponsored, tax-advantaged account that allows you to put aside money for retirement. A set percentage of your</td></tr><tr><td>Annual Catchup\nContribution 50 or\nOlder</td><td>$7,500.00</td><td></td><td>choosing is automatically taken out of each paycheck and invested in a 401(k) account. Your contributions will be invested in stocks,\n\nbonds, mutual funds, etc. that you can pick yourself or that the vendor will choose on your behalf.</td></tr></table>\n\nLUMITY\nALERA GROUP COMPANY\n\nThis Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan. \n This Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan.",
-    "page": "11"
-},
-{
-    "content": "Automattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025 \n Important Benefit Contact Resources\n\nAutomattic Inc., Benefits Guide 2025 Effective Period: January 01, 2025 December 31, 2025\n\n<table><tr><th>Contact</th><th>Phone</th><th>Website/Email</th></tr><tr><td>InsightTimer</td><td></td><td>https://insighttimer.com/</td></tr><tr><td>Guardian</td><td></td><td>https://www.guardianlife.com/life-insurance</td></tr><tr><td>Kaiser Permanente HI</td><td>1-800-966-5955</td><td>https://healthy.kaiserpermanente.org/hawaii</td></tr><tr><td>Ten Percent Happier</td><td></td><td>https://www.tenpercent.com/</td></tr><tr><td>Automattic</td><td>1-844-258-6489</td><td>https://automattic.com/</td></tr><tr><td>GoodRx</td><td>1-855-268-2822</td><td>https://www.goodrx.com/</td></tr><tr><td>Kaiser Permanente Southern CA</td><td>1-800-464-4000</td><td>https://healthy.kaiserpermanente.org/southern-california</td></tr><tr><td>Aetna</td><td></td><td>https://www.aetna.com</td></tr><tr><td>Automattic</td><td>1-844-258-6489</td><td>https://automattic.com/</td></tr><tr><td>Kaiser Permanente Rx Delivery/Coupons</td><td>1-800-464-4000</td><td>https://healthy.kaiserpermanente.org/learn/pharmacy</td></tr><tr><td>Betterment</td><td></td><td>https://www.betterment.com/retirement, https:/www.betterment.com</td></tr><tr><td>Kaiser Permanente Northern CA</td><td>1-800-464-4000</td><td>https://healthy.kaiserpermanente.org/northern-california</td></tr><tr><td>Headspace</td><td></td><td>https://www.headspace.com/</td></tr><tr><td>Aetna</td><td>1-844-365-7373</td><td>https://www.aetna.com</td></tr><tr><td>Health Equity</td><td></td><td>https://healthequity.com</td></tr><tr><td>Kaiser Permanente Telehealth</td><td></td><td>https://healthy.kaiserpermanente.org/learn/how-to-use-telehealth</td></tr><tr><td>Automattic</td><td>1-844-258-6489</td><td>https://automattic.com/</td></tr><tr><td>Pet Benefit Solutions</td><td></td><td>https://www.petbenefits.com/</td></tr><tr><td>Aetna</td><td>1-800-872-3862</td><td>https://www.aetna.com</td></tr><tr><td>HMAA</td><td>1-808-941-4622</td><td>https://www.hmaa.com/</td></tr><tr><td>Aetna</td><td></td><td>https://www.aetna.com/services/telehealth.html</td></tr><tr><td>Ladder</td><td></td><td>https://www.ladderlife.com/</td></tr><tr><td>Aetna</td><td></td><td>https://www.aetna.com/individuals-families/pharmacy/rx-home-delivery.html</td></tr><tr><td>Legal Shield</td><td></td><td>https://www.legalshield.com/</td></tr><tr><td>Guardian (VSP)</td><td>1-800-627-4200</td><td>https://www.guardianlife.com/</td></tr><tr><td>Aetna</td><td>1-877-204-9186</td><td>https://www.aetna.com</td></tr><tr><td>Aetna</td><td></td><td>https://www.aetna.com</td></tr><tr><td>Waking Up</td><td></td><td>https://www.wakingup.com/</td></tr><tr><td>Kaiser Permanente Colorado</td><td></td><td>https://healthy.kaiserpermanente.org/</td></tr><tr><td>Calm</td><td></td><td>https://www.calm.com</td></tr></table>\n\nLUMITY\nALERA GROUP COMPANY\n\nThis Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan. \n This Benefits Guide offers a high-level overview of your available benefits. The official Plan Documents are what govern your official rights and coverage under each plan.",
-    "page": "12"
-}
-] 
 """
 
 STAGE_2_PROMPT = """
@@ -181,7 +273,7 @@ context_sources:
 - CHAT_HISTORY: Last 4 chat messages
 - EMPLOYER_BENEFITS_KNOWLEDGE_BASE_DOCUMENTS:
     description: >
-        Documents broken into page-level objects with metadata.
+        Numbered excerpts, best match first, each headed by its source document and page numbers.
 
 allowed:
     - Employee benefits questions using provided context
@@ -240,127 +332,450 @@ content:
 class Query(BaseModel):
     question: str
     user_id: UUID
+    employer: str = DEFAULT_EMPLOYER
+
+class ChatMessage(BaseModel):
+    user_id: UUID
+    message: str
 
 # ---- Helpers ----
 def get_chat_history(user_id: str):
-    res = supabase.table("chat_history") \
-        .select("message") \
-        .filter("user_id", "eq", user_id) \
-        .order("created_at", desc=True) \
-        .limit(4) \
-        .execute()
-
-    rows = res.data or []
     # Just join the last 4 messages without role labeling
-    return "\n".join(r["message"] for r in reversed(rows))
+    return services.history_store.get_sync(str(user_id))
 
 def get_vector_knowledge(question: str):
-    res = requests.post(
-        VECTORIZE_URL,
-        headers={
-            "Authorization": f"Bearer {VECTORIZE_KEY}",
-            "Content-Type": "application/json"
-        },
-        json={"question": question, "numResults": 10}
-    )
+    from vectorize_client import VectorizeError
 
     try:
-        data = res.json()
-    except Exception as e:
-        print("[ERROR] Could not parse Vectorize JSON:", e)
-        print("[RAW RESPONSE]", res.text)
+        with span("vectorize"):
+            data = services.vectorize_client.retrieve(question)
+    except VectorizeError as e:
+        VECTORIZE_ERRORS.inc()
+        logger.error("Vectorize retrieval failed: %s", e)
         return ""
-    
-    return data
-
-    # # Debugging output
-    # print("\n[DEBUG] Full Vectorize response:", data)
-    # import json as _json
-    # # print(_json.dumps(data, indent=2))
-
-    # matches = data.get("matches", [])
-    # if not matches:
-    #     print("[DEBUG] No matches found for query.")
-    #     return ""
-
-    # print("\n[DEBUG] Top Matches (score + short content preview):")
-    # for m in matches:
-    #     score = m.get("score")
-    #     content = m.get("payload", {}).get("content", "")
-    #     preview = content[:120].replace("\n", " ") + "..." if content else ""
-    #     print(f"  - Score: {score:.4f} | Preview: {preview}")
-    # return res
-    # return "\n\n".join(m["payload"]["content"] for m in matches if "payload" in m)
 
-# ---- Main workflow ----
-def run_workflow(question, user_id):
-    chat_history = get_chat_history(user_id)
+    # Only ranked, deduplicated excerpts with their citations go into the prompt
+    return build_kb_context(data, min_score=KB_MIN_SCORE, token_budget=KB_TOKEN_BUDGET)
 
-    # Stage 1 prompt with question + chat history appended
-    stage1_prompt = f"""{STAGE_1_PROMPT}
+# ---- Crew templates ----
+# Agents and tasks are built once; {question}, {chat_history} and
+# {vector_knowledge} are bound per request by crew.kickoff(inputs=...).
+# Each template is a static prefix followed by the per-request slots, so the
+# prefix can be sent once through the prompt cache; keep variable text out of it.
+STAGE_1_PREFIX = STAGE_1_PROMPT
+STAGE_1_SLOTS = """{dbg}
 
 **CURRENT QUESTION:**
 {question}
 
 **PAST CHAT HISTORY**
-{chat_history or "None"}
+{chat_history}
+"""
+
+STAGE_2_PREFIX = STAGE_2_PROMPT
+STAGE_2_SLOTS = """
+
+**CURRENT QUESTION:**
+{question}
+
+**CHAT HISTORY:**
+{chat_history}
+
+**KNOWLEDGE BASE DOCUMENTS:**
+{vector_knowledge}
 """
 
+STAGE_1_TEMPLATE = STAGE_1_PREFIX + STAGE_1_SLOTS
+STAGE_2_TEMPLATE = STAGE_2_PREFIX + STAGE_2_SLOTS
+
+def build_stage1_crew():
+    from crewai import Agent, Crew, Task
+
     first_agent = Agent(
         role="Stage 1 Agent",
         goal="Answer benefits questions",
         backstory="An expert in employee benefits who helps answer employee questions using PlanYear's knowledge base.",
         allow_delegation=False,
-        verbose=True, 
-        llm=gemini_llm
+        verbose=CREW_VERBOSE,
+        llm=services.gemini_llm
     )
     first_task = Task(
-        description=stage1_prompt,
+        description=STAGE_1_TEMPLATE,
         agent=first_agent,
         expected_output="A well-formatted markdown answer to the user's benefits question with sources cited at the bottom."
     )
-    first_crew = Crew(agents=[first_agent], tasks=[first_task], verbose=True)
-    first_response = first_crew.kickoff()
+    return Crew(agents=[first_agent], tasks=[first_task], verbose=CREW_VERBOSE)
 
-    # CrewOutput has `.raw` and `.outputs` attributes
-    if hasattr(first_response, "raw"):
-        output_text = str(first_response.raw)
-    else:
-        output_text = str(first_response)
-
-    if "insufficient information" in output_text.lower():
-        vector_knowledge = get_vector_knowledge(question)
-        stage2_prompt = f"""{STAGE_2_PROMPT}
-
-**CURRENT QUESTION:**
-{question}
+def build_stage2_crew():
+    from crewai import Agent, Crew, Task
 
-**CHAT HISTORY:**
-{chat_history or "None"}
+    second_agent = Agent(
+        role="Stage 2 Agent",
+        goal="Answer benefits questions",
+        backstory="A benefits research specialist who searches the knowledge base to find detailed answers.",
+        allow_delegation=False,
+        verbose=CREW_VERBOSE,
+        llm=services.gemini_llm
+    )
+    second_task = Task(
+        description=STAGE_2_TEMPLATE,
+        agent=second_agent,
+        expected_output="A well-formatted markdown answer to the user's benefits question with sources cited at the bottom."
+    )
+    return Crew(agents=[second_agent], tasks=[second_task], verbose=CREW_VERBOSE)
+
+CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", "4"))
+
+crew_registry = CrewRegistry()
+crew_registry.register("stage1", build_stage1_crew, size=CREW_POOL_SIZE)
+crew_registry.register("stage2", build_stage2_crew, size=CREW_POOL_SIZE)
+
+# ---- Response cache ----
+# Keys include a hash of each stage's template, so editing a prompt invalidates its entries
+STAGE_1_VERSION = fingerprint(STAGE_1_TEMPLATE)
+STAGE_2_VERSION = fingerprint(f"{STAGE_2_TEMPLATE}:{KB_MIN_SCORE}:{KB_TOKEN_BUDGET}")
+
+ASK_CACHE_TTL = float(os.getenv("ASK_CACHE_TTL", "3600"))
+ASK_CACHE_MAX_ENTRIES = int(os.getenv("ASK_CACHE_MAX_ENTRIES", "1024"))
+ASK_CACHE_SEMANTIC = os.getenv("ASK_CACHE_SEMANTIC", "false").lower() == "true"
+ASK_CACHE_SIMILARITY = float(os.getenv("ASK_CACHE_SIMILARITY", "0.92"))
+
+def cached_kickoff(stage, prompt_version, question, chat_history, build_inputs):
+    # build_inputs is only called on a miss, so cache hits skip retrieval too
+    cached = services.response_cache.get(stage, question, prompt_version, chat_history)
+    if cached is not None:
+        return cached
+
+    response = crew_registry.kickoff(stage, build_inputs())
+    services.response_cache.set(stage, question, prompt_version, chat_history, response)
+    return response
+
+def get_dbg_context(question, employer):
+    guide = get_guide(employer)
+    dbg, pages = guide.context_for(question, top_k=DBG_TOP_K, full_guide=DBG_FULL_GUIDE)
+    if dbg == guide.full_text and services.prompt_cache is not None:
+        # The whole guide is as static as the preamble, so cache it along with it
+        services.prompt_cache.register(f"stage1:{employer}", STAGE_1_PREFIX + guide.full_text)
+
+    full_size = len(guide.full_text)
+    DBG_CONTEXT_CHARS.inc(len(dbg), kind="selected")
+    DBG_CONTEXT_CHARS.inc(full_size, kind="full")
+    logger.debug(
+        "DBG context for %s: %d/%d pages, %d/%d chars (%.0f%% smaller)",
+        employer, len(pages), len(guide.pages), len(dbg), full_size,
+        100 * (1 - len(dbg) / full_size) if full_size else 0,
+    )
+    return dbg
+
+# ---- Speculative Stage 2 ----
+# SPECULATIVE_MODE=retrieval starts the Vectorize lookup alongside Stage 1;
+# SPECULATIVE_MODE=full also runs the Stage 2 crew, which can't be stopped
+# once started, so a wasted full speculation costs a whole Stage 2 run. Only
+# questions where more than SPECULATION_MIN_UNKNOWN of the subject words are
+# missing from the guide are speculated on (BM25 scores don't separate the
+# two: DBG answers often score lower than questions it can't answer), and at
+# most SPECULATION_MAX_INFLIGHT speculations run at once.
+SPECULATIVE_MODE = os.getenv("SPECULATIVE_MODE", "off")
+SPECULATION_MIN_UNKNOWN = float(os.getenv("SPECULATION_MIN_UNKNOWN", "0.5"))
+SPECULATION_MAX_INFLIGHT = int(os.getenv("SPECULATION_MAX_INFLIGHT", "2"))
+
+speculation_executor = ThreadPoolExecutor(max_workers=SPECULATION_MAX_INFLIGHT, thread_name_prefix="speculate")
+speculation_slots = threading.BoundedSemaphore(SPECULATION_MAX_INFLIGHT)
+
+# ---- Metrics ----
+# Stage timings and token counts are recorded by metrics.span; the counters
+# below cover what spans can't, and existing stats are read at scrape time
+ASK_REQUESTS = REGISTRY.counter("ask_requests_total", "Questions answered by Stage 1 or Stage 2")
+ASK_FALLBACKS = REGISTRY.counter(
+    "ask_stage2_fallbacks_total", "Questions answered by Stage 2, by whether the router or Stage 1 sent them", ("reason",))
+ASK_ROUTES = REGISTRY.counter("ask_routes_total", "Router verdicts", ("route", "label", "source"))
+VECTORIZE_ERRORS = REGISTRY.counter("vectorize_errors_total", "Vectorize retrievals that failed after retries")
+SPECULATIONS = REGISTRY.counter(
+    "speculation_total", "Speculative Stage 2 runs by outcome (started, used, wasted, skipped_cap)", ("outcome",))
+DBG_CONTEXT_CHARS = REGISTRY.counter(
+    "dbg_context_chars_total", "Characters of DBG sent to Stage 1 (selected) against the whole guide (full)", ("kind",))
+
+@REGISTRY.collector
+def collect_ask_stats():
+    if services.built("response_cache"):
+        stats = services.response_cache.stats()
+        yield "ask_cache_hits_total", "counter", "Response cache hits", stats["hits"], {"match": "exact"}
+        yield "ask_cache_hits_total", "counter", "Response cache hits", stats["semantic_hits"], {"match": "semantic"}
+        yield "ask_cache_misses_total", "counter", "Response cache misses", stats["misses"], {}
+        if stats["entries"] is not None:
+            yield "ask_cache_entries", "gauge", "Entries in the response cache", stats["entries"], {}
+    if services.built("history_store"):
+        stats = services.history_store.stats()
+        yield "chat_history_hits_total", "counter", "Chat history reads served from memory", stats["hits"], {}
+        yield "chat_history_misses_total", "counter", "Chat history reads that went to the database", stats["misses"], {}
+    if services.built("prompt_cache") and services.prompt_cache is not None:
+        stats = services.prompt_cache.stats()
+        yield "prompt_cache_calls_total", "counter", "LLM calls with a registered prompt prefix", stats["cached_calls"], {"cached": "true"}
+        yield "prompt_cache_calls_total", "counter", "LLM calls with a registered prompt prefix", stats["uncached_calls"], {"cached": "false"}
+        yield "prompt_cache_input_tokens_saved_total", "counter", "Prompt tokens served from the context cache instead of sent", stats["input_tokens_saved"], {}
+        yield "prompt_cache_prefixes", "gauge", "Prompt prefixes in the context cache", stats["prefixes"], {}
+    if services.built("ask_jobs"):
+        for status, count in services.ask_jobs.counts().items():
+            yield "jobs", "gauge", "Stored jobs by status", count, {"kind": "ask", "status": status}
+
+def likely_fallback(question, employer):
+    # Stage 1 can't answer what the guide never mentions
+    guide = get_guide(employer)
+    subject = subject_terms(question)
+    unknown = sum(not guide.knows(term) for term in subject)
+    return bool(subject) and unknown / len(subject) > SPECULATION_MIN_UNKNOWN
+
+def stage2_inputs(question, chat_history, vector_knowledge):
+    return {
+        "question": question,
+        "chat_history": chat_history or "None",
+        "vector_knowledge": str(vector_knowledge),
+    }
+
+def speculate(question, chat_history, employer, timings):
+    """Start Stage 2 work in the background if the question looks like a fallback.
+
+    Returns a future for the vector knowledge (retrieval mode) or the Stage 2
+    response (full mode), or None when nothing was started.
+    """
+    if SPECULATIVE_MODE not in ("retrieval", "full"):
+        return None
+    if services.response_cache.peek("stage2", question, STAGE_2_VERSION, chat_history) is not None:
+        return None
+    if not likely_fallback(question, employer):
+        return None
+    if not speculation_slots.acquire(blocking=False):
+        SPECULATIONS.inc(outcome="skipped_cap")
+        return None
+
+    def run():
+        with span("speculative_vectorize", timings):
+            knowledge = get_vector_knowledge(question)
+        if SPECULATIVE_MODE == "retrieval":
+            return knowledge
+        with span("speculative_stage2", timings):
+            return cached_kickoff("stage2", STAGE_2_VERSION, question, chat_history,
+                                  lambda: stage2_inputs(question, chat_history, knowledge))
+
+    SPECULATIONS.inc(outcome="started")
+    future = speculation_executor.submit(run)
+    future.add_done_callback(lambda _: speculation_slots.release())
+    return future
+
+# ---- Routing ----
+# ROUTER_MODE=local labels questions with keyword rules and the DBG's BM25
+# index, llm asks Gemini for a short JSON verdict (local is used if the reply
+# is unusable), off sends every question to Stage 1 first as before.
+# Local verdicts only refuse plainly off-topic questions, and only skip Stage 1
+# when the guide never mentions the question's subject; otherwise Stage 1
+# runs and its fallback decides.
+# Verdicts are cached per question, chat history and guide.
+ROUTER_MODE = os.getenv("ROUTER_MODE", "off")
+ROUTER_MIN_SCORE = float(os.getenv("ROUTER_MIN_SCORE", "3.0"))
+ROUTER_VERSION = fingerprint(f"{ROUTER_PROMPT}:{ROUTER_MODE}:{ROUTER_MIN_SCORE}:{DBG_TOP_K}")
+
+REFUSAL_ANSWER = (
+    "I can only help with questions about your employee benefits, and I can't give personal, "
+    "legal or financial advice.\n\nContact x@y.com if you need additional information."
+)
+
+def refusal_output():
+    # Shaped like a crew's answer so /ask returns the same fields on every path
+    from crewai.crews.crew_output import CrewOutput
+    return CrewOutput(raw=REFUSAL_ANSWER)
+
+def llm_verdict(question, chat_history, guide):
+    dbg = render_pages([page for _, page in guide.search(question, top_k=DBG_TOP_K)])
+    prompt = build_router_prompt(question, chat_history, dbg)
+    try:
+        reply = services.gemini_llm.generate(prompt, generation_config=ROUTER_GENERATION_CONFIG)
+    except Exception as e:
+        logger.warning("LLM router failed, using the local classifier: %s", e)
+        return None
+    verdict = parse_verdict(reply)
+    if verdict is None:
+        logger.warning("LLM router reply wasn't a verdict, using the local classifier: %r", reply)
+    return verdict
+
+def route_question(question, chat_history, employer) -> Verdict:
+    if ROUTER_MODE not in ("local", "llm"):
+        return Verdict(NEW_QUESTION, True, source="off")
+
+    guide = get_guide(employer)
+    version = fingerprint(f"{ROUTER_VERSION}:{employer}:{guide.fingerprint}")
+    verdict = services.route_cache.get("route", question, version, chat_history)
+    if verdict is not None:
+        return verdict
+
+    if ROUTER_MODE == "llm":
+        verdict = llm_verdict(question, chat_history, guide)
+    if verdict is None:
+        verdict = classify_local(question, chat_history, guide, ROUTER_MIN_SCORE)
+    services.route_cache.set("route", question, version, chat_history, verdict)
+    return verdict
+
+def is_insufficient(answer: str) -> bool:
+    # Stage 1 is told to reply with exactly this marker, so it has to open
+    # the answer; an answer merely mentioning the phrase is not a fallback
+    return answer.strip().lower().startswith("insufficient information")
 
-**KNOWLEDGE BASE DOCUMENTS:**
-{vector_knowledge}
-"""
-        second_agent = Agent(
-            role="Stage 2 Agent",
-            goal="Answer benefits questions",
-            backstory="A benefits research specialist who searches the knowledge base to find detailed answers.",
-            allow_delegation=False,
-            verbose=True, 
-            llm=gemini_llm
-        )
-        second_task = Task(
-            description=stage2_prompt,
-            agent=second_agent,
-            expected_output="A well-formatted markdown answer to the user's benefits question with sources cited at the bottom."
-        )
-        second_crew = Crew(agents=[second_agent], tasks=[second_task], verbose=True)
-        return second_crew.kickoff()
-
-    return first_response
+# ---- Main workflow ----
+def run_workflow(question, user_id, employer=DEFAULT_EMPLOYER, chat_history=None):
+    """Answer ``question`` and return the CrewOutput of whichever stage (or the router) produced it."""
+    timings = {}
+    if chat_history is None:
+        with span("history", timings):
+            chat_history = get_chat_history(user_id)
+    emit("stage", stage="history", status="done")
+
+    # The selected DBG pages follow from the question, so the guide and the
+    # retrieval settings are enough to version Stage 1 entries per employer
+    guide = get_guide(employer)
+    stage1_version = fingerprint(f"{STAGE_1_VERSION}:{employer}:{guide.fingerprint}:{DBG_TOP_K}:{DBG_FULL_GUIDE}")
+
+    speculation = None
+    try:
+        ASK_REQUESTS.inc()
+        with span("route", timings):
+            verdict = route_question(question, chat_history, employer)
+        ASK_ROUTES.inc(route=verdict.route, label=verdict.label, source=verdict.source)
+        emit("stage", stage="route", status="done", route=verdict.route, label=verdict.label)
+
+        if verdict.route == REFUSE:
+            return refusal_output()
+
+        reason = "routed"
+        if verdict.route == STAGE_1:
+            # Hedge against a wrong "answerable" verdict
+            speculation = speculate(question, chat_history, employer, timings)
+            emit("stage", stage="stage1", status="started")
+            # Hold Stage 1 tokens back until the answer can't be the fallback marker
+            begin_answer(holdback="Insufficient information")
+            with span("stage1", timings):
+                first_response = cached_kickoff("stage1", stage1_version, question, chat_history, lambda: {
+                    "question": question,
+                    "chat_history": chat_history or "None",
+                    "dbg": get_dbg_context(question, employer),
+                })
+
+            emit("stage", stage="stage1", status="done")
+
+            with span("fallback_decision", timings):
+                fallback = is_insufficient(output_text(first_response))
+            if not fallback:
+                return first_response
+            reason = "fallback"
+
+        ASK_FALLBACKS.inc(reason=reason)
+        emit("stage", stage="stage2", status="started", reason=reason)
+        begin_answer()
+        with span("stage2", timings):
+            if speculation is not None:
+                result = speculation.result()
+                SPECULATIONS.inc(outcome="used")
+                speculation = None
+                if SPECULATIVE_MODE == "full":
+                    return result
+                return cached_kickoff("stage2", STAGE_2_VERSION, question, chat_history,
+                                      lambda: stage2_inputs(question, chat_history, result))
+
+            return cached_kickoff("stage2", STAGE_2_VERSION, question, chat_history,
+                                  lambda: stage2_inputs(question, chat_history, get_vector_knowledge(question)))
+    finally:
+        if speculation is not None:
+            # Stage 1 answered (or failed): drop the speculative work. A crew
+            # that already started can't be interrupted, so its result is discarded.
+            speculation.cancel()
+            SPECULATIONS.inc(outcome="wasted")
+        logger.info("ask stage timings (ms): %s", timings)
 
 # ---- API endpoint ----
 @app.post("/ask")
-def ask(query: Query):
-    answer = run_workflow(query.question, query.user_id)
+async def ask(query: Query, history_store: HistoryStore = Depends(get_history_store)):
+    try:
+        get_guide(query.employer)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail=f"No benefits guide for employer {query.employer!r}")
+
+    with span("history"):
+        chat_history = await history_store.get(str(query.user_id))
+    answer = await run_in_threadpool(run_workflow, query.question, query.user_id, query.employer, chat_history)
     return {"answer": answer}
+
+@app.post("/ask/stream")
+async def ask_stream(query: Query, history_store: HistoryStore = Depends(get_history_store)):
+    try:
+        get_guide(query.employer)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail=f"No benefits guide for employer {query.employer!r}")
+
+    with span("history"):
+        chat_history = await history_store.get(str(query.user_id))
+    return StreamingResponse(
+        stream_events(run_in_threadpool, run_workflow, query.question, query.user_id, query.employer, chat_history,
+                      result_text=output_text),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def ask_job(payload):
+    query = Query(**payload)
+    try:
+        get_guide(query.employer)
+    except (FileNotFoundError, ValueError):
+        raise PermanentJobError(f"No benefits guide for employer {query.employer!r}")
+
+    with span("history"):
+        chat_history = await services.history_store.get(str(query.user_id))
+    answer = await run_in_threadpool(run_workflow, query.question, query.user_id, query.employer, chat_history)
+    return {"answer": output_text(answer)}
+
+@app.post("/ask/jobs", status_code=202)
+async def submit_ask_job(query: Query, response: Response, idempotency_key: str = Header(None)):
+    """Queue a question and return its job id; poll GET /ask/jobs/{job_id} for the answer.
+
+    Re-posting with the same ``Idempotency-Key`` header returns the original job.
+    """
+    try:
+        get_guide(query.employer)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail=f"No benefits guide for employer {query.employer!r}")
+
+    try:
+        job, created = await services.ask_jobs.submit(query.model_dump(mode="json"), idempotency_key)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not created:
+        response.status_code = 200
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/ask/jobs/{job_id}")
+async def get_ask_job(job_id: str, wait: float = 0):
+    """The job's status and, once it succeeds, its answer. ``wait`` holds the request up to that many seconds for it to finish."""
+    job = await services.ask_jobs.wait(job_id, min(max(wait, 0), JOB_MAX_WAIT))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.to_dict()
+
+@app.post("/chat_history")
+async def add_chat_message(msg: ChatMessage, history_store: HistoryStore = Depends(get_history_store)):
+    # Write-through so the next /ask for this user sees the message without a database read
+    await history_store.append(str(msg.user_id), msg.message)
+    return {"status": "ok"}
+
+@app.get("/cache/stats")
+def cache_stats(response_cache: ResponseCache = Depends(get_response_cache)):
+    return response_cache.stats()
+
+@app.get("/prompt_cache/stats")
+def prompt_cache_stats():
+    cache = services.prompt_cache
+    return cache.stats() if cache is not None else {"enabled": False}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+@app.get("/history/stats")
+def history_stats(history_store: HistoryStore = Depends(get_history_store)):
+    return history_store.stats()
@@ -0,0 +1,216 @@
+"""Send static prompt prefixes to the model once, via provider context caching.
+
+A prefix is registered by its static text (e.g. a stage's preamble). When a
+prompt contains registered text, everything up to the end of it - crewAI's
+agent framing included, which is just as static - is cached with the
+provider once per distinct prefix, and later calls send only the suffix.
+Editing a prompt changes the prefix, so it gets a new cache entry.
+
+Providers only cache prefixes above a minimum size (32,768 tokens on Gemini
+1.5), so a short preamble on its own is always sent in full; only a prefix
+carrying a large static document, such as a whole benefits guide, can be
+cached.
+"""
+import datetime
+import hashlib
+import logging
+import threading
+import time
+
+from kb_context import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+# ---- Backends ----
+class GeminiContextCache:
+    """Gemini's CachedContent API. Needs an explicit model version (e.g.
+    gemini-1.5-pro-002) and a prefix above the provider's minimum size."""
+
+    def __init__(self):
+        self._models = {}
+
+    def create(self, model, prefix, ttl):
+        from google.generativeai import caching
+
+        return caching.CachedContent.create(
+            model=model if model.startswith("models/") else f"models/{model}",
+            display_name=f"prefix-{hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:12]}",
+            contents=[prefix],
+            ttl=datetime.timedelta(seconds=ttl),
+        )
+
+    def client(self, handle, base_client, generation_config):
+        import google.generativeai as genai
+
+        model = self._models.get(handle.name)
+        if model is None:
+            model = genai.GenerativeModel.from_cached_content(handle, generation_config=generation_config)
+            self._models[handle.name] = model
+        return model
+
+    def delete(self, handle):
+        self._models.pop(handle.name, None)
+        handle.delete()
+
+
+class LocalContextCache:
+    """Emulates provider caching for tests and benchmarks. The prefix stays
+    local and is put back in front of the suffix before calling the model,
+    so answers match an uncached call while the accounting runs as if cached."""
+
+    def create(self, model, prefix, ttl):
+        return prefix
+
+    def client(self, handle, base_client, generation_config):
+        return _PrefixedClient(base_client, handle)
+
+    def delete(self, handle):
+        pass
+
+
+class _PrefixedClient:
+    def __init__(self, client, prefix):
+        self._client = client
+        self._prefix = prefix
+
+    def generate_content(self, contents, **kwargs):
+        return self._client.generate_content(self._prefix + contents, **kwargs)
+
+    async def generate_content_async(self, contents, **kwargs):
+        return await self._client.generate_content_async(self._prefix + contents, **kwargs)
+
+
+# Gemini 1.5's minimum for CachedContent; later models accept smaller prefixes
+DEFAULT_MIN_TOKENS = 32768
+
+
+# ---- Cache ----
+class _Entry:
+    def __init__(self, name, handle, tokens, expires_at):
+        self.name = name
+        self.handle = handle
+        self.tokens = tokens
+        self.expires_at = expires_at
+
+
+class PromptPrefixCache:
+    """Splits prompts into a provider-cached prefix and the suffix to send.
+
+    Prefixes under ``min_tokens`` are sent in full (the provider would reject
+    them), and a prefix the provider refused is retried after ``ttl``.
+    """
+
+    def __init__(self, backend, model: str, ttl: float = 3600, min_tokens: int = DEFAULT_MIN_TOKENS):
+        self.backend = backend
+        self.model = model
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self._markers = {}  # name -> static text
+        self._entries = {}  # prefix fingerprint -> _Entry
+        self._refused_until = {}  # prefix fingerprint -> when to try creating it again
+        self._lock = threading.Lock()
+        self._stats = {"cached_calls": 0, "uncached_calls": 0, "input_tokens_saved": 0, "input_tokens_sent": 0,
+                       "cached_latency_ms": 0.0, "uncached_latency_ms": 0.0, "create_errors": 0}
+
+    def register(self, name: str, text: str):
+        self._markers[name] = text
+
+    def _split(self, prompt):
+        # The longest registered text wins, e.g. preamble + full DBG over the preamble alone
+        best = None
+        for name, text in self._markers.items():
+            index = prompt.find(text)
+            if index != -1 and (best is None or len(text) > len(best[1])):
+                best = (name, text, index + len(text))
+        if best is None:
+            return None, None, prompt
+        return best[0], prompt[:best[2]], prompt[best[2]:]
+
+    def _entry(self, name, prefix):
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > now:
+            return entry
+        if self._refused_until.get(key, 0) > now:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                return entry
+            tokens = count_tokens(prefix)
+            if tokens < self.min_tokens:
+                logger.warning("The %s prompt prefix is %d tokens, under the %d-token caching minimum; sending it in full",
+                               name, tokens, self.min_tokens)
+                self._refused_until[key] = float("inf")
+                return None
+            try:
+                handle = self.backend.create(self.model, prefix, self.ttl)
+            except Exception as e:
+                logger.warning("Context cache for the %s prefix could not be created: %s", name, e)
+                self._stats["create_errors"] += 1
+                self._refused_until[key] = now + self.ttl
+                return None
+            # Renew a little before the provider expires it
+            entry = _Entry(name, handle, tokens, now + self.ttl * 0.9)
+            self._entries[key] = entry
+            logger.info("Cached %d-token %s prompt prefix", tokens, name)
+            return entry
+
+    def resolve(self, prompt: str, base_client, generation_config=None):
+        """Return ``(client, contents, entry)`` for ``prompt``; a cached prefix gets
+        a client of its own, built with ``generation_config``.
+
+        ``entry`` is None when no registered prefix matched, and False when
+        one matched but couldn't be cached.
+        """
+        name, prefix, suffix = self._split(prompt)
+        if prefix is None:
+            return base_client, prompt, None
+        entry = self._entry(name, prefix)
+        if entry is None:
+            return base_client, prompt, False
+        return self.backend.client(entry.handle, base_client, generation_config), suffix, entry
+
+    def record(self, entry, contents: str, latency_ms: float):
+        """Account for one call made with what ``resolve`` returned."""
+        if entry is None:
+            # Not a prompt with a registered prefix (e.g. the router); nothing to compare
+            return
+        sent = count_tokens(contents)
+        with self._lock:
+            self._stats["input_tokens_sent"] += sent
+            if entry is False:
+                self._stats["uncached_calls"] += 1
+                self._stats["uncached_latency_ms"] += latency_ms
+            else:
+                self._stats["cached_calls"] += 1
+                self._stats["cached_latency_ms"] += latency_ms
+                self._stats["input_tokens_saved"] += entry.tokens
+
+    def stats(self):
+        s = dict(self._stats)
+        cached, uncached = s["cached_calls"], s["uncached_calls"]
+        saved, sent = s["input_tokens_saved"], s["input_tokens_sent"]
+        return {
+            "prefixes": len(self._entries),
+            "cached_calls": cached,
+            "uncached_calls": uncached,
+            "input_tokens_sent": sent,
+            "input_tokens_saved": saved,
+            "input_tokens_saved_pct": round(100 * saved / (saved + sent), 1) if saved + sent else 0.0,
+            "avg_cached_latency_ms": round(s["cached_latency_ms"] / cached, 1) if cached else None,
+            "avg_uncached_latency_ms": round(s["uncached_latency_ms"] / uncached, 1) if uncached else None,
+            "create_errors": s["create_errors"],
+        }
+
+    def close(self):
+        with self._lock:
+            entries, self._entries = list(self._entries.values()), {}
+        for entry in entries:
+            try:
+                self.backend.delete(entry.handle)
+            except Exception as e:
+                logger.warning("Could not delete the cached %s prefix: %s", entry.name, e)
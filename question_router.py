@@ -0,0 +1,176 @@
+"""Decide up front whether a question is refused, answered from the DBG (Stage 1)
+or sent straight to the knowledge base (Stage 2).
+
+The labels are the prompts' own classification_task labels. ``classify_local``
+uses keyword lists and the DBG's vocabulary and costs well under a
+millisecond; the LLM router asks for a short JSON verdict instead. Keyword
+rules are lossy, so a local verdict only refuses a question that is plainly
+off topic, and only skips Stage 1 when the guide never mentions what the
+question is about. Anything else goes to Stage 1, whose "Insufficient
+information" fallback still catches what the DBG can't answer.
+"""
+import json
+import re
+from dataclasses import dataclass
+
+from dbg_index import tokenize
+
+NOT_ALLOWED = "Not allowed"
+FOLLOW_UP = "Follow-up"
+NEW_QUESTION = "New question"
+UNCLEAR = "Unclear"
+LABELS = (NOT_ALLOWED, FOLLOW_UP, NEW_QUESTION, UNCLEAR)
+
+REFUSE = "refuse"
+STAGE_1 = "stage1"
+STAGE_2 = "stage2"
+
+
+@dataclass(frozen=True)
+class Verdict:
+    label: str
+    answerable: bool  # the DBG holds what's needed to answer
+    source: str = "local"
+    confident: bool = True  # False: a hint only, so Stage 1 gets the question anyway
+
+    @property
+    def route(self) -> str:
+        if not self.confident:
+            return STAGE_1
+        if self.label == NOT_ALLOWED:
+            return REFUSE
+        return STAGE_1 if self.answerable else STAGE_2
+
+
+def _terms(*words):
+    return re.compile(r"\b(?:" + "|".join(re.escape(w) for w in words) + ")")
+
+
+# Anything mentioning these is treated as a benefits question
+BENEFITS_TERMS = _terms(
+    "benefit", "insurance", "coverage", "cover", "plan", "medical", "dental", "vision", "health",
+    "hsa", "fsa", "hra", "401", "retirement", "pension", "deductible", "premium", "copay",
+    "coinsurance", "out-of-pocket", "network", "provider", "doctor", "prescription", "pharmacy",
+    "enroll", "eligib", "dependent", "spouse", "leave", "pto", "vacation", "parental", "disability",
+    "life insurance", "wellness", "eap", "stipend", "reimburse", "cobra", "open enrollment", "pet",
+    "commuter", "transit", "tuition", "gym", "childcare", "fertility", "adoption", "time off", "sick",
+    "holiday", "perk", "allowance", "discount", "match", "donation", "charit",
+)
+# Personal legal or financial advice, which the prompts don't allow
+ADVICE_TERMS = _terms(
+    "lawyer", "attorney", "lawsuit", "sue ", "legal advice", "invest", "stock", "crypto",
+    "tax return", "file my taxes", "my taxes", "mortgage", "should i buy", "financial advice",
+)
+# Plainly not about work benefits
+OFF_TOPIC_TERMS = _terms(
+    "weather", "joke", "recipe", "poem", "song", "movie", "capital of", "sports", "football",
+    "election", "president", "translate", "homework", "essay", "horoscope", "lottery",
+)
+# Words that say nothing about a question's subject
+COMMON_WORDS = frozenset("""
+    a about am an and any are as at be by can could did do does for from get got has have how i if in
+    is it its me my of on or our should so than that the their them there these they this those to us was
+    we what when where which who why will with would you your
+    benefit benefits plan plans cover covered covers coverage company employer employee offer offered
+    available work help need want know like tell much many
+""".split())
+# Opens by continuing the previous turn ("And for dependents?")
+FOLLOW_UP_RE = re.compile(r"^(?:and|also|what about|how about|what if|same for|then|so)\b")
+# Leans on the previous turn for its subject ("How much does it cost?")
+BACK_REFERENCE_RE = re.compile(r"\b(?:it|that|those|they|them)\b")
+
+
+def subject_terms(question: str):
+    """The words of ``question`` that say what it is about."""
+    return [t for t in tokenize(question) if len(t) > 1 and t not in COMMON_WORDS]
+
+
+def classify_local(question: str, chat_history: str, guide, min_score: float) -> Verdict:
+    """Label ``question`` with keyword rules and check the DBG for a page scoring ``min_score``.
+
+    Two verdicts are ``confident``: an off-topic question (no benefits terms,
+    and an off-topic term or nothing the guide mentions) is refused, and a
+    benefits question whose subject words the guide never uses goes straight
+    to Stage 2. BM25 scores some page for almost any question, so a low
+    score alone doesn't mean the DBG can't answer.
+    """
+    text = question.lower().strip()
+    words = re.findall(r"\w+", text)
+    mentions_benefits = bool(BENEFITS_TERMS.search(text))
+
+    follow_up = bool(chat_history) and bool(
+        FOLLOW_UP_RE.search(text) or (len(words) <= 6 and not mentions_benefits and BACK_REFERENCE_RE.search(text))
+    )
+    # A follow-up leans on the previous turn for what it's about
+    query = f"{chat_history.splitlines()[-1]}\n{question}" if follow_up else question
+    hits = guide.search(query, top_k=1)
+    answerable = bool(hits) and hits[0][0] >= min_score
+
+    if follow_up:
+        # Its subject is in the previous turn, which the checks below don't see
+        return Verdict(FOLLOW_UP, answerable, confident=False)
+    if ADVICE_TERMS.search(text):
+        # Stage 1's prompt decides whether a benefits question asks for advice it can't give
+        return Verdict(NOT_ALLOWED, False, confident=not mentions_benefits)
+
+    subject = subject_terms(question)
+    unknown = [t for t in subject if not guide.knows(t)]
+    off_topic = bool(OFF_TOPIC_TERMS.search(text))
+    if not mentions_benefits and (off_topic or (subject and unknown == subject)):
+        # Nothing in the question or the guide ties it to benefits
+        return Verdict(NOT_ALLOWED, False)
+    if not subject or len(words) < 2:
+        return Verdict(UNCLEAR, answerable, confident=False)
+    if unknown == subject and not off_topic:
+        # A benefits question about something the guide never mentions
+        return Verdict(NEW_QUESTION, False)
+    return Verdict(NEW_QUESTION, answerable, confident=False)
+
+
+ROUTER_PROMPT = """Classify an employee's question for an employee benefits assistant.
+Reply with JSON only: {{"label": "<label>", "answerable": <true|false>}}
+
+labels:
+- Not allowed: personal, legal or financial advice, or not about employee benefits
+- Follow-up: continues the past chat history
+- New question: a new employee benefits question
+- Unclear: too vague to answer
+
+answerable: true only if the DBG excerpts below contain what is needed to answer.
+
+**DBG EXCERPTS**
+{dbg}
+
+**PAST CHAT HISTORY**
+{chat_history}
+
+**QUESTION**
+{question}
+"""
+
+# Enough for the JSON verdict and nothing more
+ROUTER_GENERATION_CONFIG = {
+    "max_output_tokens": 40,
+    "temperature": 0,
+    "response_mime_type": "application/json",
+}
+
+
+def build_router_prompt(question: str, chat_history: str, dbg: str) -> str:
+    return ROUTER_PROMPT.format(dbg=dbg, chat_history=chat_history or "None", question=question)
+
+
+def parse_verdict(text: str):
+    """Read the LLM router's JSON reply; None when it isn't a usable verdict."""
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group())
+    except ValueError:
+        return None
+    label = next((l for l in LABELS if l.lower() == str(data.get("label", "")).strip().lower()), None)
+    answerable = data.get("answerable")
+    if label is None or not isinstance(answerable, bool):
+        return None
+    return Verdict(label, answerable, source="llm")
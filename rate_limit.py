@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+
+class RateLimiter:
+    """Caps concurrent calls and calls per minute to an upstream API.
+
+    One limiter is shared by sync and async callers, so both count
+    against the same provider quota. ``max_concurrency`` or
+    ``requests_per_minute`` of 0 disables that limit.
+    """
+
+    def __init__(self, max_concurrency: int = 0, requests_per_minute: float = 0):
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self._interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+        # Concurrency slots; threads wait on the condition, coroutines on a future
+        # that release() resolves from whichever thread frees the slot
+        self._in_use = 0
+        self._available = threading.Condition(threading.Lock())
+        self._async_waiters = []  # (loop, future)
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    def _reserve(self) -> float:
+        """Book the next start time and return how long the caller must wait for it."""
+        if not self._interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self._interval
+            return start - now
+
+    def _acquire(self):
+        if not self.max_concurrency:
+            return
+        with self._available:
+            while self._in_use >= self.max_concurrency:
+                self._available.wait()
+            self._in_use += 1
+
+    async def _async_acquire(self):
+        if not self.max_concurrency:
+            return
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._available:
+                if self._in_use < self.max_concurrency:
+                    self._in_use += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await waiter
+            finally:
+                with self._available:
+                    if (loop, waiter) in self._async_waiters:
+                        self._async_waiters.remove((loop, waiter))
+
+    def release(self):
+        if not self.max_concurrency:
+            return
+        with self._available:
+            self._in_use -= 1
+            self._available.notify()
+            # Every waiting coroutine re-checks; whoever loses waits again, and
+            # a cancelled one can't swallow the wakeup
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                pass  # its event loop is closed
+
+    @contextmanager
+    def slot(self):
+        self._acquire()
+        try:
+            delay = self._reserve()
+            if delay:
+                time.sleep(delay)
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        await self._async_acquire()
+        try:
+            delay = self._reserve()
+            if delay:
+                await asyncio.sleep(delay)
+            yield
+        finally:
+            self.release()
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
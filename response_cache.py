@@ -0,0 +1,197 @@
+import hashlib
+import math
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivial rephrasings share a key."""
+    question = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(question.split())
+
+
+def fingerprint(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:16]
+
+
+def make_key(stage: str, question: str, prompt_hash: str, chat_history: str) -> str:
+    return f"{stage}:{prompt_hash}:{fingerprint(chat_history)}:{normalize_question(question)}"
+
+
+# ---- Backends ----
+class CacheBackend(ABC):
+    """Storage interface for ResponseCache. Values are stored as given."""
+
+    @abstractmethod
+    def get(self, key):
+        ...
+
+    @abstractmethod
+    def set(self, key, value):
+        ...
+
+    @abstractmethod
+    def delete(self, key):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+
+class InMemoryCache(CacheBackend):
+    """Thread-safe in-process cache with a TTL and LRU eviction past ``max_entries``."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# ---- Response cache ----
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ResponseCache:
+    """Caches crew outputs per stage, prompt version and chat history.
+
+    Exact lookups use the normalized question. When ``embed_fn`` is given,
+    a miss falls back to the most similar cached question with the same
+    stage, prompt version and history, if it scores above
+    ``similarity_threshold``.
+    """
+
+    def __init__(self, backend: CacheBackend = None, embed_fn=None, similarity_threshold: float = 0.92):
+        self.backend = backend if backend is not None else InMemoryCache()
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        # context -> OrderedDict(key -> embedding), only used with embed_fn
+        self._vectors = {}
+        self._lock = threading.Lock()
+
+    def get(self, stage, question, prompt_hash, chat_history=""):
+        key = make_key(stage, question, prompt_hash, chat_history)
+        value = self.backend.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        if self.embed_fn is not None:
+            value = self._semantic_get(stage, question, prompt_hash, chat_history)
+            if value is not None:
+                self._count("semantic_hits")
+                return value
+
+        self._count("misses")
+        return None
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def peek(self, stage, question, prompt_hash, chat_history=""):
+        """Exact lookup that doesn't touch the hit/miss counters."""
+        return self.backend.get(make_key(stage, question, prompt_hash, chat_history))
+
+    def set(self, stage, question, prompt_hash, chat_history, value):
+        key = make_key(stage, question, prompt_hash, chat_history)
+        self.backend.set(key, value)
+
+        if self.embed_fn is not None:
+            context = (stage, prompt_hash, fingerprint(chat_history))
+            vector = self.embed_fn(normalize_question(question))
+            with self._lock:
+                vectors = self._vectors.setdefault(context, OrderedDict())
+                vectors[key] = vector
+                max_entries = getattr(self.backend, "max_entries", None)
+                while max_entries and len(vectors) > max_entries:
+                    vectors.popitem(last=False)
+
+    def _semantic_get(self, stage, question, prompt_hash, chat_history):
+        context = (stage, prompt_hash, fingerprint(chat_history))
+        with self._lock:
+            candidates = list(self._vectors.get(context, {}).items())
+        if not candidates:
+            return None
+
+        query = self.embed_fn(normalize_question(question))
+        best_key, best_score = None, self.similarity_threshold
+        for key, vector in candidates:
+            score = _cosine(query, vector)
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            return None
+
+        value = self.backend.get(best_key)
+        if value is None:
+            # Expired or evicted from the backend; forget the vector too
+            with self._lock:
+                self._vectors.get(context, {}).pop(best_key, None)
+        return value
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self._vectors.clear()
+
+    def stats(self):
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "entries": len(self.backend) if hasattr(self.backend, "__len__") else None,
+            "evictions": getattr(self.backend, "evictions", None),
+        }
+
+
+def local_embedder():
+    """Sentence embeddings computed locally with chromadb's bundled ONNX MiniLM model."""
+    from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+    embed = DefaultEmbeddingFunction()
+    return lambda text: list(embed([text])[0])
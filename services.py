@@ -0,0 +1,61 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Services:
+    """Shared clients, each built on first use by its registered factory.
+
+    Nothing is created at import time, so importing an app module needs no
+    credentials or network. Tests call ``override`` with local fakes before
+    the app starts; ``close`` shuts down whatever was built.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory):
+        self._factories[name] = factory
+
+    def get(self, name: str):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            # Another thread may have built it while we waited
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"No service registered as {name!r}")
+                self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self.get(name)
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def built(self, name: str) -> bool:
+        return name in self._instances
+
+    def override(self, **instances):
+        """Use the given objects instead of building the registered services."""
+        with self._lock:
+            self._instances.update(instances)
+
+    def close(self):
+        """Close every built service that has a ``close`` method, then forget them."""
+        with self._lock:
+            instances, self._instances = self._instances, {}
+        for name, instance in reversed(list(instances.items())):
+            close = getattr(instance, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception:
+                    logger.exception("Closing service %s failed", name)
@@ -0,0 +1,146 @@
+import asyncio
+import contextvars
+import json
+import time
+
+_current_stream = contextvars.ContextVar("current_stream", default=None)
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+_DONE = object()
+
+
+class EventStream:
+    """Carries stage events and answer tokens from a crew worker thread to an SSE response.
+
+    Tokens only flow between ``begin_answer()`` and the end of that stage.
+    They are held back until the agent's "Final Answer:" marker (crewAI
+    agents reason before it) and while the answer could still turn out to
+    be ``holdback`` (e.g. Stage 1's "Insufficient information"), so the
+    client never sees text that is about to be thrown away.
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._started = time.perf_counter()
+        self.tokens_enabled = False
+        self._holdback = ""
+        self._buffer = ""
+        self._in_answer = False
+        self._released = False
+        self._sent_tokens = False
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self._started) * 1000, 1)
+
+    def emit(self, event: str, data=None):
+        payload = dict(data or {})
+        payload["elapsed_ms"] = self.elapsed_ms()
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (event, payload))
+
+    def begin_answer(self, holdback: str = ""):
+        """Start streaming tokens for a new answer, discarding any sent for a previous one."""
+        if self._sent_tokens:
+            self.emit("answer_reset")
+        self.tokens_enabled = True
+        self._holdback = holdback.lower()
+        self._buffer = ""
+        self._in_answer = False
+        self._released = not holdback
+        self._sent_tokens = False
+
+    def token(self, text: str):
+        if not self.tokens_enabled or not text:
+            return
+
+        if not self._in_answer:
+            self._buffer += text
+            marker = self._buffer.find(FINAL_ANSWER_MARKER)
+            if marker == -1:
+                return
+            self._in_answer = True
+            text = self._buffer[marker + len(FINAL_ANSWER_MARKER):].lstrip()
+            self._buffer = ""
+
+        if not self._released:
+            self._buffer += text
+            pending = self._buffer.strip().lower()
+            if self._holdback.startswith(pending) or pending.startswith(self._holdback):
+                return
+            self._released = True
+            text = self._buffer
+            self._buffer = ""
+
+        if text:
+            self._sent_tokens = True
+            self.emit("token", {"text": text})
+
+    def _finish(self, _future=None):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, _DONE)
+
+    async def events(self):
+        while True:
+            item = await self._queue.get()
+            if item is _DONE:
+                return
+            yield item
+
+
+def current_stream():
+    """The EventStream of the request being handled on this thread, if it is streaming."""
+    return _current_stream.get()
+
+
+def emit(event: str, **data):
+    stream = _current_stream.get()
+    if stream is not None:
+        stream.emit(event, data)
+
+
+def begin_answer(holdback: str = ""):
+    stream = _current_stream.get()
+    if stream is not None:
+        stream.begin_answer(holdback)
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def stream_events(submit, fn, *args, result_text=str):
+    """Run ``fn(*args)`` through ``submit`` and yield its events as SSE messages.
+
+    ``submit`` takes a zero-argument callable and returns an awaitable, e.g.
+    a thread pool's ``run``. The stream ends with a ``done`` event carrying
+    the full answer, or an ``error`` event.
+    """
+    stream = EventStream(asyncio.get_running_loop())
+
+    def target():
+        token = _current_stream.set(stream)
+        try:
+            return fn(*args)
+        finally:
+            _current_stream.reset(token)
+
+    yield format_sse("started", {"elapsed_ms": 0.0})
+
+    task = asyncio.ensure_future(submit(target))
+    task.add_done_callback(stream._finish)
+    async for event, data in stream.events():
+        yield format_sse(event, data)
+
+    try:
+        result = task.result()
+    except Exception as e:
+        yield format_sse("error", {"detail": str(e), "elapsed_ms": stream.elapsed_ms()})
+        return
+    yield format_sse("done", {"answer": result_text(result), "elapsed_ms": stream.elapsed_ms()})
+
+
+def output_text(response) -> str:
+    # CrewOutput has `.raw` and `.outputs` attributes
+    if hasattr(response, "raw"):
+        return str(response.raw)
+    return str(response)
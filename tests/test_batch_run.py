@@ -0,0 +1,160 @@
+import asyncio
+import json
+import sys
+from types import SimpleNamespace
+
+import httpx
+from pydantic import BaseModel
+
+import batch_run
+from batch_run import Checkpoint, record_key, run_batch
+
+
+class Request(BaseModel):
+    preferences: str
+    plans: list
+
+
+def jsonl(*records):
+    return [json.dumps(r) if not isinstance(r, str) else r for r in records]
+
+
+async def aiter(lines):
+    for line in lines:
+        yield line
+
+
+def run(lines, run_one, **kwargs):
+    async def main():
+        return [item async for item in run_batch(aiter(lines), run_one, Request, **kwargs)]
+
+    items = asyncio.run(main())
+    return sorted(items[:-1], key=lambda item: item["index"]), items[-1]["summary"]
+
+
+def recorder(fail_on=()):
+    calls = []
+
+    async def run_one(request):
+        calls.append(request.preferences)
+        await asyncio.sleep(0.01)
+        if request.preferences in fail_on:
+            raise RuntimeError(f"crew failed for {request.preferences}")
+        return f"pick for {request.preferences}"
+
+    run_one.calls = calls
+    return run_one
+
+
+def test_identical_records_run_once():
+    run_one = recorder()
+    results, summary = run(jsonl(
+        {"id": "a", "preferences": "low deductible", "plans": [1]},
+        {"id": "b", "preferences": "low deductible", "plans": [1]},
+        {"id": "c", "preferences": "keep my doctor", "plans": [1]},
+        {"id": "d", "preferences": "low deductible", "plans": [1]},
+    ), run_one)
+
+    assert sorted(run_one.calls) == ["keep my doctor", "low deductible"]
+    assert [r["id"] for r in results] == ["a", "b", "c", "d"]
+    assert results[1]["result"] == results[0]["result"] == "pick for low deductible"
+    assert summary["deduplicated"] == 2
+    assert (summary["records"], summary["ok"], summary["errors"]) == (4, 4, 0)
+
+
+def test_invalid_lines_get_an_error_each_and_blank_lines_are_skipped():
+    run_one = recorder()
+    results, summary = run(jsonl(
+        "{not json",
+        "",
+        {"id": "x", "preferences": "low deductible"},
+        [1, 2],
+        {"preferences": "keep my doctor", "plans": []},
+    ), run_one)
+
+    assert [r["status"] for r in results] == ["error", "error", "error", "ok"]
+    assert results[1]["id"] == "x"
+    assert all(r["error"].startswith("Invalid record") for r in results[:3])
+    assert run_one.calls == ["keep my doctor"]
+    assert (summary["records"], summary["errors"]) == (4, 3)
+
+
+def test_a_failing_record_fails_every_duplicate_and_is_not_checkpointed(tmp_path):
+    checkpoint = Checkpoint(tmp_path / "batch.ckpt")
+    run_one = recorder(fail_on=("bad",))
+    results, summary = run(jsonl(
+        {"preferences": "bad", "plans": []},
+        {"preferences": "bad", "plans": []},
+        {"preferences": "good", "plans": []},
+    ), run_one, checkpoint=checkpoint)
+
+    assert [r["status"] for r in results] == ["error", "error", "ok"]
+    assert results[0]["error"] == "crew failed for bad"
+    assert len(checkpoint) == 1
+    assert record_key("good", []) in checkpoint
+
+
+def test_resume_skips_checkpointed_records(tmp_path):
+    path = tmp_path / "batch.ckpt"
+    lines = jsonl({"preferences": "one", "plans": []}, {"preferences": "two", "plans": []})
+    run(lines[:1], recorder(), checkpoint=Checkpoint(path))
+    # A crash can leave a torn line behind
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"key": "trunc')
+
+    run_one = recorder()
+    results, summary = run(lines, run_one, checkpoint=Checkpoint(path))
+
+    assert run_one.calls == ["two"]
+    assert results[0] == {"index": 0, "id": None, "status": "ok", "result": "pick for one", "resumed": True}
+    assert summary["resumed"] == 1
+
+
+def test_concurrency_is_capped():
+    running = []
+    peak = []
+
+    async def run_one(request):
+        running.append(request)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(request)
+        return "ok"
+
+    run(jsonl(*({"preferences": str(i), "plans": []} for i in range(10))), run_one, concurrency=3)
+    assert max(peak) == 3
+
+
+def test_cli_rewrites_the_output_on_resume(tmp_path, monkeypatch):
+    calls = []
+
+    def kickoff_crew(preferences, plans):
+        calls.append(preferences)
+        return SimpleNamespace(raw=f"pick for {preferences}")
+
+    monkeypatch.setitem(sys.modules, "main", SimpleNamespace(kickoff_crew=kickoff_crew, PreferenceRequest=Request))
+    source = tmp_path / "in.jsonl"
+    source.write_text("\n".join(jsonl(*({"preferences": p, "plans": []} for p in ("a", "b", "c")))) + "\n")
+    args = SimpleNamespace(input=str(source), output=str(tmp_path / "out.jsonl"),
+                           checkpoint=str(tmp_path / "batch.ckpt"), concurrency=2)
+
+    asyncio.run(batch_run._main(args))
+    asyncio.run(batch_run._main(args))
+
+    lines = [json.loads(line) for line in open(args.output, encoding="utf-8")]
+    assert sorted(calls) == ["a", "b", "c"]
+    assert len(lines) == 4 and "summary" in lines[-1]
+    assert all(line.get("resumed") for line in lines[:3])
+
+
+def test_run_batch_endpoint_rejects_bytes_that_are_not_utf8():
+    import main
+
+    async def post():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/run/batch", content=b'{"preferences": "\xff"}\n')
+
+    response = asyncio.run(post())
+    assert response.status_code == 400
+    assert "UTF-8" in response.json()["detail"]
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from gemini_llm import GeminiLLM, flatten_messages
+from metrics import LLM_TOKENS, span
+from prompt_cache import LocalContextCache, PromptPrefixCache
+from rate_limit import RateLimiter
+
+
+class FakeModel:
+    """Stands in for ``genai.GenerativeModel`` at the SDK boundary."""
+
+    def __init__(self, text="Final Answer: covered", chunks=("Final ", "Answer: ", "covered"), error=None):
+        self.text = text
+        self.chunks = chunks
+        self.error = error
+        self.prompts = []
+        self.configs = []
+
+    @staticmethod
+    def _usage(prompt, text):
+        return SimpleNamespace(prompt_token_count=len(prompt.split()), candidates_token_count=len(text.split()),
+                               cached_content_token_count=None)
+
+    def generate_content(self, prompt, stream=False, generation_config=None):
+        self.prompts.append(prompt)
+        self.configs.append(generation_config)
+        if self.error is not None:
+            raise self.error
+        if not stream:
+            return SimpleNamespace(text=self.text, parts=[self.text], usage_metadata=self._usage(prompt, self.text))
+        return self._stream(prompt)
+
+    def _stream(self, prompt):
+        # A metadata-only chunk first, like safety ratings
+        yield SimpleNamespace(text=None, parts=[], usage_metadata=None)
+        for i, piece in enumerate(self.chunks):
+            last = i == len(self.chunks) - 1
+            yield SimpleNamespace(text=piece, parts=[piece],
+                                  usage_metadata=self._usage(prompt, "".join(self.chunks)) if last else None)
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        return self.generate_content(prompt, generation_config=generation_config)
+
+
+def make_llm(client=None, **kwargs):
+    llm = GeminiLLM(model="gemini-1.5-pro-002", **kwargs)
+    llm.client = client or FakeModel()
+    return llm
+
+
+def test_generate_returns_text_and_passes_the_call_config():
+    llm = make_llm()
+    assert llm.generate("Is acupuncture covered?", generation_config={"temperature": 0}) == "Final Answer: covered"
+    assert llm.client.prompts == ["Is acupuncture covered?"]
+    assert llm.client.configs == [{"temperature": 0}]
+
+
+def test_generate_records_tokens_for_the_current_stage():
+    llm = make_llm()
+    before = LLM_TOKENS.value(stage="test_generate", kind="prompt")
+    with span("test_generate"):
+        llm.generate("one two three")
+    assert LLM_TOKENS.value(stage="test_generate", kind="prompt") == before + 3
+
+
+def test_generate_stream_yields_text_chunks_only():
+    llm = make_llm()
+    before = LLM_TOKENS.value(stage="test_stream", kind="completion")
+    with span("test_stream"):
+        assert list(llm.generate_stream("question")) == ["Final ", "Answer: ", "covered"]
+    assert LLM_TOKENS.value(stage="test_stream", kind="completion") > before
+
+
+def test_generate_stream_raises_provider_errors():
+    llm = make_llm(FakeModel(error=RuntimeError("429 quota exceeded")))
+    with pytest.raises(RuntimeError, match="429"):
+        list(llm.generate_stream("question"))
+    assert llm.limiter.in_use == 0
+
+
+def test_slow_stream_consumer_does_not_hold_the_limiter_slot():
+    limiter = RateLimiter(max_concurrency=1)
+    llm = make_llm(limiter=limiter)
+    stream = llm.generate_stream("question")
+    assert next(stream) == "Final "
+
+    # The provider is done, so another call gets the only slot while the first consumer idles
+    done = threading.Event()
+    threading.Thread(target=lambda: (llm.generate("other"), done.set()), daemon=True).start()
+    assert done.wait(2)
+    assert list(stream) == ["Answer: ", "covered"]
+
+
+def test_agenerate_and_acall():
+    llm = make_llm(limiter=RateLimiter(max_concurrency=1))
+
+    async def main():
+        return await asyncio.gather(
+            llm.agenerate("plain prompt"),
+            llm.acall([{"role": "user", "content": "chat prompt"}]),
+        )
+
+    assert asyncio.run(main()) == ["Final Answer: covered"] * 2
+    assert "user: chat prompt" in llm.client.prompts
+    assert llm.limiter.in_use == 0
+
+
+def test_call_flattens_messages():
+    llm = make_llm()
+    assert llm.call([{"role": "system", "content": "Be brief"}, {"role": "user", "content": "Hi"}]) == \
+        "Final Answer: covered"
+    assert llm.client.prompts == [flatten_messages([{"role": "system", "content": "Be brief"},
+                                                    {"role": "user", "content": "Hi"}])]
+
+
+def test_prefix_cache_sends_only_the_suffix():
+    cache = PromptPrefixCache(LocalContextCache(), "gemini-1.5-pro-002", min_tokens=1)
+    preamble = "You answer benefits questions. " * 20
+    cache.register("stage1", preamble)
+    llm = make_llm(prefix_cache=cache)
+
+    llm.generate(preamble + "Is dental covered?")
+    # The local backend puts the prefix back before calling the model
+    assert llm.client.prompts == [preamble + "Is dental covered?"]
+    stats = cache.stats()
+    assert stats["cached_calls"] == 1
+    assert stats["input_tokens_saved"] > stats["input_tokens_sent"]
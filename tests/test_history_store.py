@@ -0,0 +1,130 @@
+import asyncio
+import threading
+
+import pytest
+
+from history_store import HistoryBackend, HistoryStore, InMemoryHistoryBackend
+
+
+class CountingBackend(InMemoryHistoryBackend):
+    def __init__(self):
+        super().__init__()
+        self.fetches = 0
+
+    def fetch(self, user_id, limit):
+        self.fetches += 1
+        return super().fetch(user_id, limit)
+
+
+class BlockingBackend(InMemoryHistoryBackend):
+    """fetch reads the messages, then waits for ``proceed`` before returning them."""
+
+    def __init__(self):
+        super().__init__()
+        self.fetching = threading.Event()
+        self.proceed = threading.Event()
+
+    def fetch(self, user_id, limit):
+        messages = super().fetch(user_id, limit)
+        self.fetching.set()
+        self.proceed.wait(5)
+        return messages
+
+
+def seeded(backend, user_id, *messages):
+    for message in messages:
+        backend.append(user_id, message)
+    return backend
+
+
+def test_buffer_serves_repeat_reads():
+    backend = seeded(CountingBackend(), "u1", "one", "two")
+    store = HistoryStore(backend, ttl=60)
+
+    assert store.get_sync("u1") == "one\ntwo"
+    assert asyncio.run(store.get("u1")) == "one\ntwo"
+    assert backend.fetches == 1
+    assert (store.stats()["hits"], store.stats()["misses"]) == (1, 1)
+
+
+def test_zero_ttl_reads_the_backend_every_time():
+    backend = seeded(CountingBackend(), "u1", "one")
+    store = HistoryStore(backend, ttl=0)
+
+    store.get_sync("u1")
+    store.get_sync("u1")
+    assert backend.fetches == 2
+    assert store.stats()["cached_users"] == 0
+
+
+def test_buffer_expires_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("history_store.time.monotonic", lambda: now[0])
+    backend = seeded(CountingBackend(), "u1", "one")
+    store = HistoryStore(backend, ttl=60)
+
+    store.get_sync("u1")
+    now[0] += 61
+    store.get_sync("u1")
+    assert backend.fetches == 2
+
+
+def test_append_writes_through_and_keeps_the_last_size_messages():
+    backend = seeded(CountingBackend(), "u1", "one", "two")
+    store = HistoryStore(backend, size=2, ttl=60)
+    store.get_sync("u1")
+
+    asyncio.run(store.append("u1", "three"))
+
+    assert store.get_sync("u1") == "two\nthree"
+    assert backend.fetch("u1", 10) == ["one", "two", "three"]
+    assert backend.fetches == 2  # the load and the check above; the read after append was a hit
+
+
+def test_read_overlapping_a_write_does_not_buffer_stale_history():
+    backend = seeded(BlockingBackend(), "u1", "one")
+    store = HistoryStore(backend, ttl=60)
+    result = []
+    reader = threading.Thread(target=lambda: result.append(store.get_sync("u1")))
+    reader.start()
+    assert backend.fetching.wait(5)
+
+    # Lands while the read above holds the old messages
+    asyncio.run(store.append("u1", "two"))
+    backend.proceed.set()
+    reader.join(5)
+
+    assert result == ["one"]
+    assert store.stats()["cached_users"] == 0
+    assert store.get_sync("u1") == "one\ntwo"
+
+
+def test_invalidate_drops_the_buffer():
+    backend = seeded(CountingBackend(), "u1", "one")
+    store = HistoryStore(backend, ttl=60)
+    store.get_sync("u1")
+
+    store.invalidate("u1")
+    store.get_sync("u1")
+    assert backend.fetches == 2
+
+
+def test_least_recently_read_user_is_dropped_past_max_users():
+    backend = CountingBackend()
+    store = HistoryStore(backend, ttl=60, max_users=2)
+    for user_id in ("u1", "u2", "u1", "u3"):
+        store.get_sync(user_id)
+
+    assert store.stats()["cached_users"] == 2
+    store.get_sync("u1")
+    store.get_sync("u2")
+    assert backend.fetches == 4  # u1, u2, u3, then u2 again
+
+
+def test_backends_must_implement_the_interface():
+    class ReadOnly(HistoryBackend):
+        def fetch(self, user_id, limit):
+            return []
+
+    with pytest.raises(TypeError):
+        ReadOnly()
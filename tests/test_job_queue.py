@@ -0,0 +1,234 @@
+import asyncio
+import sqlite3
+
+import httpx
+import pytest
+
+from job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, IdempotencyConflict, JobQueue, JobStore, PermanentJobError
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("job_queue.time.time", lambda: now[0])
+    return now
+
+
+def run_queue(queue, *payloads, until=lambda jobs: all(j.finished for j in jobs), timeout=5):
+    """Start ``queue``, submit ``payloads`` and return their jobs once ``until`` holds."""
+    async def main():
+        jobs = [(await queue.submit(p))[0] for p in payloads]
+        deadline = asyncio.get_running_loop().time() + timeout
+        try:
+            while True:
+                current = [await queue.get(j.id) for j in jobs]
+                if until(current) or asyncio.get_running_loop().time() > deadline:
+                    return current
+                await asyncio.sleep(0.01)
+        finally:
+            await queue.stop()
+
+    return asyncio.run(main())
+
+
+def fast_queue(store, handler, **kwargs):
+    return JobQueue(store, "run", handler, backoff=0, poll_interval=0.01, **kwargs)
+
+
+# ---- Store ----
+def test_idempotency_key_returns_the_original_job(store):
+    job, created = store.submit("run", {"q": 1}, idempotency_key="k")
+    again, created_again = store.submit("run", {"q": 1}, idempotency_key="k")
+
+    assert (created, created_again) == (True, False)
+    assert again.id == job.id
+    with pytest.raises(IdempotencyConflict):
+        store.submit("run", {"q": 2}, idempotency_key="k")
+    # Keys are per kind
+    assert store.submit("ask", {"q": 2}, idempotency_key="k")[1]
+
+
+def test_idempotency_key_is_free_again_once_the_job_expires(store, clock):
+    job, _ = store.submit("run", {"q": 1}, idempotency_key="k")
+    store.complete(store.claim("run", 60, 3, 10).id, "done", ttl=10)
+
+    clock[0] += 11
+    assert store.get(job.id) is None
+    new, created = store.submit("run", {"q": 2}, idempotency_key="k")
+    assert created and new.id != job.id
+
+
+def test_claim_leases_one_job_until_the_lease_runs_out(store, clock):
+    job, _ = store.submit("run", {"q": 1})
+    store.submit("ask", {"q": 1})
+
+    claimed = store.claim("run", 60, 3, 100)
+    assert (claimed.id, claimed.status, claimed.attempts) == (job.id, RUNNING, 1)
+    assert store.claim("run", 60, 3, 100) is None
+
+    clock[0] += 61
+    reclaimed = store.claim("run", 60, 3, 100)
+    assert (reclaimed.id, reclaimed.attempts) == (job.id, 2)
+
+
+def test_renewed_lease_is_not_reclaimed(store, clock):
+    store.submit("run", {"q": 1})
+    job = store.claim("run", 60, 3, 100)
+
+    clock[0] += 50
+    store.renew(job.id, 60)
+    clock[0] += 50
+    assert store.claim("run", 60, 3, 100) is None
+
+
+def test_expired_lease_fails_the_job_once_out_of_attempts(store, clock):
+    job, _ = store.submit("run", {"q": 1})
+    store.claim("run", 60, 1, 100)
+
+    clock[0] += 61
+    assert store.claim("run", 60, 1, 100) is None
+    failed = store.get(job.id)
+    assert failed.status == FAILED
+    assert "Worker stopped" in failed.error
+
+
+def test_retry_waits_before_the_job_is_claimed_again(store, clock):
+    store.submit("run", {"q": 1})
+    job = store.claim("run", 60, 3, 100)
+    store.retry(job.id, "boom", delay=30)
+
+    assert store.get(job.id).status == QUEUED
+    assert store.claim("run", 60, 3, 100) is None
+    clock[0] += 31
+    assert store.claim("run", 60, 3, 100).attempts == 2
+
+
+def test_release_puts_the_job_back_without_using_an_attempt(store):
+    job, _ = store.submit("run", {"q": 1})
+    store.claim("run", 60, 3, 100)
+    store.release(job.id)
+
+    assert (store.get(job.id).status, store.get(job.id).attempts) == (QUEUED, 0)
+
+
+# ---- Workers ----
+def test_jobs_run_and_store_their_result(store):
+    async def handler(payload):
+        return {"answer": payload["q"] * 2}
+
+    [job] = run_queue(fast_queue(store, handler), {"q": 21})
+    assert (job.status, job.result, job.attempts) == (SUCCEEDED, {"answer": 42}, 1)
+
+
+def test_failures_are_retried_up_to_max_attempts(store):
+    calls = []
+
+    async def flaky(payload):
+        calls.append(payload["q"])
+        if payload["q"] == "always" or len([c for c in calls if c == "twice"]) < 3:
+            raise RuntimeError("provider timeout")
+        return "ok"
+
+    done, failed = run_queue(fast_queue(store, flaky, max_attempts=3), {"q": "twice"}, {"q": "always"})
+    assert (done.status, done.attempts) == (SUCCEEDED, 3)
+    assert (failed.status, failed.attempts) == (FAILED, 3)
+    assert failed.error == "RuntimeError: provider timeout"
+
+
+def test_permanent_errors_are_not_retried(store):
+    async def handler(payload):
+        raise PermanentJobError("no such employer")
+
+    [job] = run_queue(fast_queue(store, handler), {"q": 1})
+    assert (job.status, job.attempts) == (FAILED, 1)
+
+
+def test_workers_survive_store_errors(store, monkeypatch):
+    claim = store.claim
+    failures = [sqlite3.OperationalError("database is locked")] * 2
+
+    def flaky_claim(*args):
+        if failures:
+            raise failures.pop()
+        return claim(*args)
+
+    monkeypatch.setattr(store, "claim", flaky_claim)
+
+    async def handler(payload):
+        return "ok"
+
+    [job] = run_queue(fast_queue(store, handler, concurrency=1), {"q": 1})
+    assert job.status == SUCCEEDED
+    assert failures == []
+
+
+def test_workers_start_with_the_first_submit(store):
+    async def handler(payload):
+        return "ok"
+
+    async def main():
+        queue = fast_queue(store, handler)
+        await queue.resume()
+        assert not store.exists()
+        assert await queue.get("missing") is None
+        assert queue.counts()[QUEUED] == 0
+        assert not store.exists()
+
+        job, _ = await queue.submit({"q": 1})
+        finished = await queue.wait(job.id, timeout=5)
+        await queue.stop()
+        return finished
+
+    assert asyncio.run(main()).status == SUCCEEDED
+
+
+def test_resume_picks_up_jobs_queued_before_a_restart(store):
+    job, _ = store.submit("run", {"q": 1})
+
+    async def handler(payload):
+        return "ok"
+
+    async def main():
+        queue = fast_queue(store, handler)
+        await queue.resume()
+        finished = await queue.wait(job.id, timeout=5)
+        await queue.stop()
+        return finished
+
+    assert asyncio.run(main()).status == SUCCEEDED
+
+
+# ---- HTTP ----
+def test_run_jobs_endpoint_idempotency(store, monkeypatch):
+    import main
+
+    async def handler(payload):
+        return {"result": "Gold PPO"}
+
+    monkeypatch.setattr(main, "run_jobs", fast_queue(store, handler))
+    body = {"preferences": "low deductible", "plans": [{"name": "Gold PPO"}]}
+
+    async def requests():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.post("/run/jobs", json=body, headers={"Idempotency-Key": "abc"})
+            again = await client.post("/run/jobs", json=body, headers={"Idempotency-Key": "abc"})
+            conflict = await client.post("/run/jobs", json={**body, "preferences": "other"},
+                                         headers={"Idempotency-Key": "abc"})
+            result = await client.get(f"/run/jobs/{first.json()['job_id']}", params={"wait": 5})
+            missing = await client.get("/run/jobs/nope")
+        await main.run_jobs.stop()
+        return first, again, conflict, result, missing
+
+    first, again, conflict, result, missing = asyncio.run(requests())
+    assert (first.status_code, again.status_code, conflict.status_code) == (202, 200, 409)
+    assert again.json()["job_id"] == first.json()["job_id"]
+    assert result.json()["result"] == {"result": "Gold PPO"}
+    assert missing.status_code == 404
@@ -0,0 +1,75 @@
+import logging
+
+import planyear_kb_content_generator as app
+from dbg_index import get_guide
+from prompt_cache import DEFAULT_MIN_TOKENS, LocalContextCache, PromptPrefixCache
+
+MODEL = "gemini-1.5-pro-002"
+
+
+class FailingBackend(LocalContextCache):
+    def __init__(self):
+        self.creates = 0
+
+    def create(self, model, prefix, ttl):
+        self.creates += 1
+        raise RuntimeError("quota exceeded")
+
+
+def test_stage_preambles_are_below_the_default_minimum(caplog):
+    cache = PromptPrefixCache(LocalContextCache(), MODEL)
+    assert cache.min_tokens == DEFAULT_MIN_TOKENS == app.GEMINI_PROMPT_CACHE_MIN_TOKENS
+    cache.register("stage1", app.STAGE_1_PREFIX)
+    cache.register("stage2", app.STAGE_2_PREFIX)
+
+    with caplog.at_level(logging.WARNING, logger="prompt_cache"):
+        for _ in range(2):
+            for prefix in (app.STAGE_1_PREFIX, app.STAGE_2_PREFIX):
+                client, contents, entry = cache.resolve(prefix + "QUESTION: Is dental covered?", "base")
+                assert (client, entry) == ("base", False)
+                assert contents.startswith(prefix)
+
+    # Warned once per prefix, not per call
+    assert len([r for r in caplog.records if "caching minimum" in r.message]) == 2
+    assert cache.stats()["prefixes"] == 0
+
+
+def test_preamble_with_the_full_guide_is_still_below_gemini_1_5_minimum():
+    cache = PromptPrefixCache(LocalContextCache(), MODEL)
+    prefix = app.STAGE_1_PREFIX + get_guide(app.DEFAULT_EMPLOYER).full_text
+    cache.register("stage1:automattic", prefix)
+
+    assert cache.resolve(prefix + "QUESTION: Is dental covered?", "base")[2] is False
+
+
+def test_prefix_above_the_default_minimum_is_cached_once():
+    cache = PromptPrefixCache(LocalContextCache(), MODEL)
+    prefix = app.STAGE_1_PREFIX + get_guide(app.DEFAULT_EMPLOYER).full_text * 5
+    cache.register("stage1:big", prefix)
+
+    first = cache.resolve(prefix + "QUESTION: Is dental covered?", "base")
+    second = cache.resolve(prefix + "QUESTION: Is vision covered?", "base")
+
+    assert first[1] == "QUESTION: Is dental covered?"
+    assert first[2] is second[2]
+    assert first[2].tokens >= DEFAULT_MIN_TOKENS
+    cache.record(first[2], first[1], latency_ms=10)
+    assert cache.stats()["input_tokens_saved"] == first[2].tokens
+
+
+def test_refused_prefix_is_retried_after_the_ttl(monkeypatch):
+    backend = FailingBackend()
+    cache = PromptPrefixCache(backend, MODEL, ttl=60, min_tokens=1)
+    cache.register("stage1", "You answer benefits questions. ")
+    prompt = "You answer benefits questions. Is dental covered?"
+
+    now = [1000.0]
+    monkeypatch.setattr("prompt_cache.time.monotonic", lambda: now[0])
+    assert cache.resolve(prompt, "base")[2] is False
+    assert cache.resolve(prompt, "base")[2] is False
+    assert backend.creates == 1
+
+    now[0] += 61
+    cache.resolve(prompt, "base")
+    assert backend.creates == 2
+    assert cache.stats()["create_errors"] == 2
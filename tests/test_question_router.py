@@ -0,0 +1,99 @@
+import pytest
+
+from dbg_index import DigitalBenefitsGuide
+from question_router import (
+    FOLLOW_UP,
+    NEW_QUESTION,
+    NOT_ALLOWED,
+    REFUSE,
+    STAGE_1,
+    STAGE_2,
+    UNCLEAR,
+    Verdict,
+    classify_local,
+    parse_verdict,
+)
+
+GUIDE = DigitalBenefitsGuide("acme", [
+    {"page": "1", "content": "Medical plans: the PPO deductible is $500 and the HDHP deductible is $3,000."},
+    {"page": "2", "content": "HSA contributions are matched up to $1,000. Dental and vision coverage are included."},
+    {"page": "3", "content": "Pet insurance is offered through Nationwide. Reimbursements are paid monthly."},
+    {"page": "4", "content": "Your 401(k) plan has a 4% employer match."},
+])
+
+
+def classify(question, chat_history=""):
+    return classify_local(question, chat_history, GUIDE, min_score=1.0)
+
+
+@pytest.mark.parametrize("verdict, route", [
+    (Verdict(NOT_ALLOWED, False), REFUSE),
+    (Verdict(NEW_QUESTION, True), STAGE_1),
+    (Verdict(NEW_QUESTION, False), STAGE_2),
+    (Verdict(FOLLOW_UP, False), STAGE_2),
+    (Verdict(UNCLEAR, True), STAGE_1),
+    # A hint never refuses or skips Stage 1
+    (Verdict(NOT_ALLOWED, False, confident=False), STAGE_1),
+    (Verdict(NEW_QUESTION, False, confident=False), STAGE_1),
+])
+def test_route_table(verdict, route):
+    assert verdict.route == route
+
+
+@pytest.mark.parametrize("question", [
+    "What's the weather like tomorrow?",
+    "Tell me a joke",
+    "What is the capital of France?",
+    "asdkj qwe",
+    "Should I invest in crypto?",
+])
+def test_off_topic_questions_are_refused(question):
+    verdict = classify(question)
+    assert (verdict.label, verdict.route) == (NOT_ALLOWED, REFUSE)
+
+
+@pytest.mark.parametrize("question", [
+    "Is there a commuter benefit for transit passes?",
+    "How does parental leave work?",
+    "Is there a tuition assistance program?",
+])
+def test_benefits_the_guide_never_mentions_skip_stage_1(question):
+    verdict = classify(question)
+    assert (verdict.label, verdict.route) == (NEW_QUESTION, STAGE_2)
+
+
+@pytest.mark.parametrize("question", [
+    "What is the PPO deductible?",
+    "Are pets covered?",
+    "Can I get reimbursed for a standing desk?",
+    "Is there a 401k match?",
+])
+def test_questions_the_guide_may_answer_go_to_stage_1(question):
+    assert classify(question).route == STAGE_1
+
+
+def test_advice_on_a_benefit_is_left_to_stage_1():
+    verdict = classify("Should I invest my 401k in crypto?")
+    assert verdict.label == NOT_ALLOWED
+    assert verdict.route == STAGE_1
+
+
+def test_off_topic_request_about_benefits_is_not_sent_to_stage_2():
+    assert classify("Tell me a joke about benefits").route == STAGE_1
+
+
+def test_follow_up_uses_the_previous_turn():
+    verdict = classify("And for dependents?", "user: What is the HDHP deductible?")
+    assert verdict.label == FOLLOW_UP
+    assert verdict.answerable
+    assert verdict.route == STAGE_1
+    # Without history the same words are just unclear
+    assert classify("And them?").label == UNCLEAR
+
+
+def test_parse_verdict():
+    assert parse_verdict('{"label": "new question", "answerable": false}') == Verdict(NEW_QUESTION, False, source="llm")
+    assert parse_verdict("Sure! ```json\n{\"label\": \"Not allowed\", \"answerable\": false}```").route == REFUSE
+    assert parse_verdict('{"label": "Maybe", "answerable": true}') is None
+    assert parse_verdict('{"label": "Unclear", "answerable": "yes"}') is None
+    assert parse_verdict("not json") is None
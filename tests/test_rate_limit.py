@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+from rate_limit import RateLimiter
+
+
+def test_sync_callers_share_the_concurrency_cap():
+    limiter = RateLimiter(max_concurrency=2)
+    peak = []
+
+    def work():
+        with limiter.slot():
+            peak.append(limiter.in_use)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) == 2
+    assert limiter.in_use == 0
+
+
+def test_async_waiters_are_woken_by_release():
+    limiter = RateLimiter(max_concurrency=1)
+    order = []
+
+    async def work(i):
+        async with limiter.async_slot():
+            order.append(i)
+            assert limiter.in_use == 1
+            await asyncio.sleep(0.01)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*(work(i) for i in range(5)))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(main())
+    assert sorted(order) == list(range(5))
+    assert limiter.in_use == 0
+    assert elapsed < 1
+
+
+def test_async_waiter_is_woken_by_a_sync_release():
+    limiter = RateLimiter(max_concurrency=1)
+    holding = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with limiter.slot():
+            holding.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    holding.wait()
+
+    async def main():
+        waiter = asyncio.create_task(_enter(limiter))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        release.set()
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(main()) == "entered"
+    thread.join()
+    assert limiter.in_use == 0
+
+
+async def _enter(limiter):
+    async with limiter.async_slot():
+        return "entered"
+
+
+def test_cancelled_waiter_never_holds_a_slot():
+    limiter = RateLimiter(max_concurrency=1)
+
+    async def main():
+        async with limiter.async_slot():
+            waiter = asyncio.create_task(_enter(limiter))
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.in_use == 0
+        return await asyncio.wait_for(_enter(limiter), 1)
+
+    assert asyncio.run(main()) == "entered"
+
+
+def test_requests_per_minute_spaces_out_starts():
+    limiter = RateLimiter(requests_per_minute=1200)  # one start every 50 ms
+    starts = []
+    for _ in range(3):
+        with limiter.slot():
+            starts.append(time.monotonic())
+    assert starts[2] - starts[0] >= 0.09
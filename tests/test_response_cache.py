@@ -0,0 +1,140 @@
+import pytest
+
+from response_cache import CacheBackend, InMemoryCache, ResponseCache, fingerprint, make_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("response_cache.time.monotonic", clock)
+    return clock
+
+
+def embedder(vectors):
+    """Embeds the normalized questions in ``vectors``; anything else points nowhere near them."""
+    calls = []
+
+    def embed(text):
+        calls.append(text)
+        return vectors.get(text, [0.0, 0.0, 1.0])
+
+    embed.calls = calls
+    return embed
+
+
+# ---- InMemoryCache ----
+def test_entries_expire_after_the_ttl(clock):
+    cache = InMemoryCache(ttl=60)
+    cache.set("k", "v")
+
+    clock.now += 59
+    assert cache.get("k") == "v"
+    clock.now += 2
+    assert cache.get("k") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = InMemoryCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # b is now the oldest
+    cache.set("c", 3)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.evictions == 1
+
+
+def test_backends_must_implement_the_interface():
+    class Partial(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+# ---- ResponseCache ----
+def test_exact_hits_ignore_case_and_punctuation():
+    cache = ResponseCache()
+    cache.set("stage1", "What is the HSA limit?", "v1", "", "answer")
+
+    assert cache.get("stage1", "what is the  HSA limit", "v1") == "answer"
+    assert cache.get("stage2", "What is the HSA limit?", "v1") is None
+    assert cache.get("stage1", "What is the HSA limit?", "v2") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_entries_are_keyed_on_chat_history():
+    cache = ResponseCache()
+    cache.set("stage1", "And for dependents?", "v1", "user: dental?", "dental answer")
+    cache.set("stage1", "And for dependents?", "v1", "user: vision?", "vision answer")
+
+    assert cache.get("stage1", "And for dependents?", "v1", "user: dental?") == "dental answer"
+    assert cache.get("stage1", "And for dependents?", "v1", "user: vision?") == "vision answer"
+    assert cache.get("stage1", "And for dependents?", "v1", "") is None
+    assert make_key("s", "q", "v", "a") != make_key("s", "q", "v", "b")
+
+
+def test_peek_does_not_count():
+    cache = ResponseCache()
+    cache.set("stage2", "q", "v1", "", "answer")
+
+    assert cache.peek("stage2", "q", "v1") == "answer"
+    assert cache.peek("stage2", "other", "v1") is None
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
+
+
+def test_semantic_match_above_the_threshold():
+    embed = embedder({
+        "what is the hsa limit": [1.0, 0.0, 0.0],
+        "how much can i put in my hsa": [0.95, 0.31, 0.0],  # cosine ~0.95
+        "what is the fsa limit": [0.8, 0.6, 0.0],  # cosine 0.8
+    })
+    cache = ResponseCache(embed_fn=embed, similarity_threshold=0.9)
+    cache.set("stage1", "What is the HSA limit?", "v1", "", "hsa answer")
+
+    assert cache.get("stage1", "How much can I put in my HSA?", "v1") == "hsa answer"
+    assert cache.get("stage1", "What is the FSA limit?", "v1") is None
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["misses"]) == (1, 1)
+
+
+def test_semantic_match_stays_within_stage_version_and_history():
+    embed = embedder({"what is the hsa limit": [1.0, 0.0, 0.0], "hsa limit please": [1.0, 0.0, 0.0]})
+    cache = ResponseCache(embed_fn=embed, similarity_threshold=0.9)
+    cache.set("stage1", "What is the HSA limit?", "v1", "user: hi", "hsa answer")
+
+    assert cache.get("stage1", "HSA limit please", "v1", "user: hi") == "hsa answer"
+    assert cache.get("stage1", "HSA limit please", "v1", "") is None
+    assert cache.get("stage1", "HSA limit please", "v2", "user: hi") is None
+    assert cache.get("stage2", "HSA limit please", "v1", "user: hi") is None
+
+
+def test_semantic_match_forgets_expired_entries(clock):
+    embed = embedder({"what is the hsa limit": [1.0, 0.0, 0.0], "hsa limit please": [1.0, 0.0, 0.0]})
+    cache = ResponseCache(InMemoryCache(ttl=60), embed_fn=embed)
+    cache.set("stage1", "What is the HSA limit?", "v1", "", "hsa answer")
+
+    clock.now += 61
+    assert cache.get("stage1", "HSA limit please", "v1") is None
+    assert cache._vectors[("stage1", "v1", fingerprint(""))] == {}
+
+
+def test_exact_hits_skip_the_embedder():
+    embed = embedder({})
+    cache = ResponseCache(embed_fn=embed)
+    cache.set("stage1", "q", "v1", "", "answer")
+    embed.calls.clear()
+
+    assert cache.get("stage1", "q", "v1") == "answer"
+    assert embed.calls == []
@@ -0,0 +1,68 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import main
+
+PLANS = [
+    {"name": "Bronze HMO", "deductible": 6000, "monthly_premium": 180, "network": "HMO"},
+    {"name": "Gold PPO", "deductible": 500, "monthly_premium": 520, "network": "PPO"},
+]
+
+
+def parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+@pytest.fixture
+def kickoffs(monkeypatch):
+    calls = []
+
+    def kickoff(name, inputs):
+        calls.append((name, inputs))
+        if name == "analyzer":
+            return SimpleNamespace(raw="Wants a low deductible")
+        return SimpleNamespace(raw="Gold PPO")
+
+    monkeypatch.setattr(main.crew_registry, "kickoff", kickoff)
+    return calls
+
+
+def stream(preferences="I see a specialist often, low deductible please"):
+    async def post():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/run/stream", json={"preferences": preferences, "plans": PLANS})
+
+    response = asyncio.run(post())
+    assert response.status_code == 200
+    return parse_sse(response.text)
+
+
+@pytest.mark.parametrize("mode, crew", [("engine", "ranked_explanation_stream"),
+                                        ("assisted", "ranked_selection_stream")])
+def test_ranked_modes_stream_the_engine_ranking(kickoffs, monkeypatch, mode, crew):
+    monkeypatch.setattr(main, "RUN_RANKING_MODE", mode)
+    events = stream()
+
+    assert [name for name, _ in kickoffs] == ["analyzer", crew]
+    assert "Gold PPO" in kickoffs[1][1]["ranked_plans"]
+    [ranking] = [data for event, data in events if event == "stage" and data["stage"] == "ranking"]
+    assert {entry["name"] for entry in ranking["ranking"]} == {"Bronze HMO", "Gold PPO"}
+    assert events[-1] == ("done", {"answer": "Gold PPO", "elapsed_ms": events[-1][1]["elapsed_ms"]})
+
+
+def test_llm_mode_streams_the_full_crew(kickoffs, monkeypatch):
+    monkeypatch.setattr(main, "RUN_RANKING_MODE", "llm")
+    events = stream()
+
+    assert [name for name, _ in kickoffs] == ["recommendation_stream"]
+    assert "Gold PPO" in kickoffs[0][1]["plans"]
+    assert not any(event == "stage" and data["stage"] == "ranking" for event, data in events)
@@ -0,0 +1,96 @@
+import pytest
+from crewai.crews.crew_output import CrewOutput
+
+import planyear_kb_content_generator as app
+from response_cache import InMemoryCache, ResponseCache
+
+DBG_QUESTION = "What is the HSA contribution limit?"
+KB_QUESTION = "Is there a commuter benefit for transit passes?"
+
+
+class FakeVectorize:
+    def __init__(self):
+        self.questions = []
+
+    def retrieve(self, question):
+        self.questions.append(question)
+        return {"documents": [{"text": "Transit passes are reimbursed up to $300.", "relevancy": 0.9}]}
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Run run_workflow with fake crews; Stage 1 gives up on commuter questions."""
+    kickoffs = []
+
+    def kickoff(stage, inputs):
+        kickoffs.append((stage, inputs))
+        if stage == "stage1" and "commuter" in inputs["question"]:
+            return CrewOutput(raw="Insufficient information")
+        return CrewOutput(raw=f"{stage} answer")
+
+    vectorize = FakeVectorize()
+    monkeypatch.setattr(app, "SPECULATIVE_MODE", "retrieval")
+    monkeypatch.setattr(app.crew_registry, "kickoff", kickoff)
+    app.services.override(
+        vectorize_client=vectorize,
+        prompt_cache=None,
+        response_cache=ResponseCache(InMemoryCache()),
+        route_cache=ResponseCache(InMemoryCache()),
+    )
+    yield kickoffs, vectorize
+    app.services.close()
+
+
+def outcomes():
+    return {name: app.SPECULATIONS.value(outcome=name) for name in ("started", "used", "wasted")}
+
+
+def test_likely_fallback_follows_the_guide_vocabulary():
+    assert app.likely_fallback(KB_QUESTION, app.DEFAULT_EMPLOYER)
+    assert not app.likely_fallback(DBG_QUESTION, app.DEFAULT_EMPLOYER)
+    assert not app.likely_fallback("What vision coverage do we have?", app.DEFAULT_EMPLOYER)
+
+
+def test_speculative_retrieval_is_used_when_stage_1_falls_back(pipeline):
+    kickoffs, vectorize = pipeline
+    before = outcomes()
+
+    answer = app.run_workflow(KB_QUESTION, "user", chat_history="")
+
+    assert answer.raw == "stage2 answer"
+    assert [stage for stage, _ in kickoffs] == ["stage1", "stage2"]
+    assert "Transit passes" in kickoffs[1][1]["vector_knowledge"]
+    assert vectorize.questions == [KB_QUESTION]  # Stage 2 didn't look it up again
+    after = outcomes()
+    assert after["started"] - before["started"] == 1
+    assert after["used"] - before["used"] == 1
+    assert after["wasted"] == before["wasted"]
+
+
+def test_speculation_is_wasted_when_stage_1_answers(pipeline, monkeypatch):
+    kickoffs, vectorize = pipeline
+    # Speculate on everything so Stage 1's answer makes it wasted
+    monkeypatch.setattr(app, "likely_fallback", lambda question, employer: True)
+    before = outcomes()
+
+    answer = app.run_workflow(DBG_QUESTION, "user", chat_history="")
+
+    assert answer.raw == "stage1 answer"
+    assert [stage for stage, _ in kickoffs] == ["stage1"]
+    after = outcomes()
+    assert after["started"] - before["started"] == 1
+    assert after["wasted"] - before["wasted"] == 1
+    assert after["used"] == before["used"]
+
+
+def test_questions_the_guide_covers_are_not_speculated_on(pipeline):
+    kickoffs, vectorize = pipeline
+    before = outcomes()
+
+    app.run_workflow(DBG_QUESTION, "user", chat_history="")
+
+    assert outcomes() == before
+    assert vectorize.questions == []
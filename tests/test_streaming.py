@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+from streaming import begin_answer, current_stream, emit, output_text, stream_events
+
+
+def run_stream(fn, **kwargs):
+    """Run ``fn`` on a worker thread through stream_events and return the parsed SSE events."""
+    async def main():
+        return [chunk async for chunk in stream_events(asyncio.to_thread, fn, **kwargs)]
+
+    events = []
+    for message in asyncio.run(main()):
+        event, data = message.strip().split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def tokens(events):
+    return [data["text"] for event, data in events if event == "token"]
+
+
+def names(events):
+    return [event for event, _ in events]
+
+
+def send(*chunks):
+    stream = current_stream()
+    for chunk in chunks:
+        stream.token(chunk)
+
+
+def test_reasoning_before_a_split_final_answer_marker_is_not_sent():
+    def answer():
+        begin_answer()
+        send("Thought: the guide has it\nFinal", " Answer: Dental is", " covered.")
+        return "Dental is covered."
+
+    events = run_stream(answer)
+    assert tokens(events) == ["Dental is", " covered."]
+    assert events[-1] == ("done", {"answer": "Dental is covered.", "elapsed_ms": events[-1][1]["elapsed_ms"]})
+
+
+def test_insufficient_information_is_held_back_and_suppressed():
+    def answer():
+        begin_answer(holdback="Insufficient information")
+        send("Final Answer: Insuff", "icient inform", "ation")
+        return "Insufficient information"
+
+    assert tokens(run_stream(answer)) == []
+
+
+def test_held_back_prefix_is_released_once_it_diverges():
+    def answer():
+        begin_answer(holdback="Insufficient information")
+        send("Final Answer: Ins", "urance covers", " it.")
+        return "Insurance covers it."
+
+    assert tokens(run_stream(answer)) == ["Insurance covers", " it."]
+
+
+def test_answer_reset_when_stage_2_takes_over():
+    def answer():
+        begin_answer()
+        send("Final Answer: Maybe")
+        emit("stage", stage="stage2", status="started")
+        begin_answer()
+        send("Final Answer: Yes")
+        return "Yes"
+
+    events = run_stream(answer)
+    assert names(events) == ["started", "token", "stage", "answer_reset", "token", "done"]
+    assert tokens(events) == ["Maybe", "Yes"]
+
+
+def test_no_reset_when_nothing_was_sent():
+    def answer():
+        begin_answer(holdback="Insufficient information")
+        send("Final Answer: Insufficient information")
+        begin_answer()
+        send("Final Answer: From the knowledge base")
+        return "From the knowledge base"
+
+    events = run_stream(answer)
+    assert "answer_reset" not in names(events)
+    assert tokens(events) == ["From the knowledge base"]
+
+
+def test_tokens_before_begin_answer_are_ignored():
+    def answer():
+        send("Final Answer: router chatter")
+        return "ok"
+
+    assert tokens(run_stream(answer)) == []
+
+
+def test_errors_end_the_stream():
+    def answer():
+        emit("stage", stage="stage1", status="started")
+        raise RuntimeError("crew failed")
+
+    events = run_stream(answer)
+    assert names(events) == ["started", "stage", "error"]
+    assert events[-1][1]["detail"] == "crew failed"
+
+
+def test_result_text_formats_the_done_answer():
+    class CrewOutput:
+        raw = "the answer"
+
+    events = run_stream(lambda: CrewOutput(), result_text=output_text)
+    assert events[-1][1]["answer"] == "the answer"
@@ -0,0 +1,242 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+import requests
+
+from benchmarks.fakes import VectorizeStub
+from vectorize_client import AsyncVectorizeClient, CircuitBreaker, CircuitOpenError, VectorizeClient, VectorizeError
+
+URL = "http://vectorize.test/retrieval"
+BATCH_URL = "http://vectorize.test/retrieval/batch"
+
+
+def documents(question):
+    return {"documents": [{"text": f"About {question}", "relevancy": 0.9}]}
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, text=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = text if text is not None else json.dumps(payload)
+
+    def json(self):
+        if self._payload is None:
+            raise ValueError("not JSON")
+        return self._payload
+
+
+class FakeSession:
+    """Replays ``responses`` (FakeResponse or an exception) for requests.Session.post."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.calls.append({"url": url, "json": json, "timeout": timeout})
+        if self.responses:
+            response = self.responses.pop(0)
+        else:
+            response = FakeResponse(200, documents(json.get("question")))
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        pass
+
+
+def make_client(session, **kwargs):
+    client = VectorizeClient(URL, "key", backoff=0, **kwargs)
+    client.session = session
+    return client
+
+
+# ---- Sync client ----
+def test_retrieve_sends_query_with_timeouts():
+    session = FakeSession()
+    client = make_client(session, connect_timeout=1, read_timeout=2, num_results=5)
+    assert client.retrieve("dental") == documents("dental")
+    assert session.calls == [{"url": URL, "json": {"question": "dental", "numResults": 5}, "timeout": (1, 2)}]
+
+
+def test_retries_transient_failures():
+    session = FakeSession(requests.ConnectionError("reset"), FakeResponse(503, {}))
+    client = make_client(session, retries=2)
+    assert client.retrieve("vision") == documents("vision")
+    assert len(session.calls) == 3
+
+
+def test_client_errors_are_not_retried():
+    session = FakeSession(FakeResponse(401, text="bad key"))
+    client = make_client(session, retries=2)
+    with pytest.raises(VectorizeError, match="401"):
+        client.retrieve("vision")
+    assert len(session.calls) == 1
+    assert client.breaker.state == "closed"
+
+
+def test_unparseable_body_raises():
+    client = make_client(FakeSession(FakeResponse(200, text="<html>")))
+    with pytest.raises(VectorizeError, match="parse"):
+        client.retrieve("vision")
+
+
+def test_breaker_opens_after_repeated_failures():
+    session = FakeSession(*[FakeResponse(500, {})] * 4)
+    client = make_client(session, retries=1, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(VectorizeError, match="after 2 attempts"):
+            client.retrieve("vision")
+    with pytest.raises(CircuitOpenError):
+        client.retrieve("vision")
+    assert len(session.calls) == 4
+
+
+def test_retrieve_many_uses_the_batch_endpoint():
+    session = FakeSession(FakeResponse(200, {"results": [documents("a"), documents("b")]}))
+    client = make_client(session, batch_url=BATCH_URL)
+    assert client.retrieve_many(["a", "b"]) == [documents("a"), documents("b")]
+    assert [c["url"] for c in session.calls] == [BATCH_URL]
+    assert session.calls[0]["json"]["queries"][1]["question"] == "b"
+
+
+def test_retrieve_many_rejects_a_short_batch():
+    client = make_client(FakeSession(FakeResponse(200, {"results": [documents("a")]})), batch_url=BATCH_URL)
+    with pytest.raises(VectorizeError, match="batch response"):
+        client.retrieve_many(["a", "b"])
+
+
+def test_retrieve_many_fans_out_without_a_batch_endpoint():
+    session = FakeSession()
+    client = make_client(session)
+    try:
+        assert client.retrieve_many(["a", "b", "c"]) == [documents(q) for q in "abc"]
+    finally:
+        client.close()
+    assert sorted(c["json"]["question"] for c in session.calls) == ["a", "b", "c"]
+
+
+# ---- Async client ----
+def make_async_client(handler, **kwargs):
+    client = AsyncVectorizeClient(URL, "key", backoff=0, **kwargs)
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def run(coro_fn):
+    return asyncio.run(coro_fn())
+
+
+def test_async_retrieve_retries_then_succeeds():
+    calls = []
+
+    def handler(request):
+        calls.append(json.loads(request.content))
+        if len(calls) == 1:
+            raise httpx.ConnectError("refused")
+        if len(calls) == 2:
+            return httpx.Response(502)
+        return httpx.Response(200, json=documents(calls[-1]["question"]))
+
+    async def main():
+        client = make_async_client(handler, retries=2)
+        try:
+            return await client.retrieve("hsa")
+        finally:
+            await client.aclose()
+
+    assert run(main) == documents("hsa")
+    assert len(calls) == 3
+
+
+def test_async_gives_up_and_records_a_failure():
+    async def main():
+        client = make_async_client(lambda request: httpx.Response(500), retries=1,
+                                   breaker=CircuitBreaker(failure_threshold=1))
+        try:
+            with pytest.raises(VectorizeError, match="after 2 attempts"):
+                await client.retrieve("hsa")
+            with pytest.raises(CircuitOpenError):
+                await client.retrieve("hsa")
+        finally:
+            await client.aclose()
+
+    run(main)
+
+
+def test_async_retrieve_many_batch_and_fanout():
+    def handler(request):
+        body = json.loads(request.content)
+        if str(request.url) == BATCH_URL:
+            return httpx.Response(200, json={"results": [documents(q["question"]) for q in body["queries"]]})
+        return httpx.Response(200, json=documents(body["question"]))
+
+    async def main():
+        batched = make_async_client(handler, batch_url=BATCH_URL)
+        fanned = make_async_client(handler)
+        try:
+            return await batched.retrieve_many(["a", "b"]), await fanned.retrieve_many(["a", "b"])
+        finally:
+            await batched.aclose()
+            await fanned.aclose()
+
+    assert run(main) == ([documents("a"), documents("b")], [documents("a"), documents("b")])
+
+
+# ---- Over a real socket ----
+def test_stub_server_round_trip():
+    with VectorizeStub(latency=0, num_documents=2) as stub:
+        client = VectorizeClient(stub.url, "key", backoff=0)
+        batched = AsyncVectorizeClient(stub.url, "key", backoff=0, batch_url=stub.url)
+
+        async def batch():
+            try:
+                return await batched.retrieve_many(["a", "b"])
+            finally:
+                await batched.aclose()
+
+        try:
+            assert client.retrieve("dental") == stub.documents("dental")
+        finally:
+            client.close()
+        assert run(batch) == [stub.documents("a"), stub.documents("b")]
+        assert stub.requests == 2
+
+
+def test_read_timeout_is_retried_then_gives_up():
+    with VectorizeStub(latency=0.5) as stub:
+        client = VectorizeClient(stub.url, "key", read_timeout=0.05, retries=1, backoff=0,
+                                 breaker=CircuitBreaker(failure_threshold=1))
+        try:
+            with pytest.raises(VectorizeError, match="after 2 attempts.*timed out"):
+                client.retrieve("dental")
+        finally:
+            client.close()
+        assert stub.requests == 2
+        assert client.breaker.state == "open"
+
+
+def test_connection_refused_gives_up():
+    with VectorizeStub() as stub:
+        url = stub.url
+    # The stub has shut down, so nothing listens on its port any more
+    client = VectorizeClient(url, "key", connect_timeout=0.5, retries=1, backoff=0)
+    async_client = AsyncVectorizeClient(url, "key", connect_timeout=0.5, retries=1, backoff=0)
+
+    async def retrieve():
+        try:
+            with pytest.raises(VectorizeError, match="after 2 attempts"):
+                await async_client.retrieve("dental")
+        finally:
+            await async_client.aclose()
+
+    try:
+        with pytest.raises(VectorizeError, match="after 2 attempts"):
+            client.retrieve("dental")
+    finally:
+        client.close()
+    run(retrieve)
@@ -0,0 +1,218 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class VectorizeError(Exception):
+    pass
+
+
+class CircuitOpenError(VectorizeError):
+    pass
+
+
+class CircuitBreaker:
+    """Stops calling a failing backend for ``reset_timeout`` seconds after
+    ``failure_threshold`` consecutive failures, then lets one trial call through."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                raise CircuitOpenError("Vectorize circuit is open, skipping call")
+            if self.state == "half-open":
+                # Only one trial call at a time; re-arm until it reports back
+                self._opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+def backoff_delay(attempt: int, base: float, cap: float = 5.0) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class _RetryableStatus(VectorizeError):
+    pass
+
+
+class _BaseClient:
+    """Settings, request bodies and the retry/breaker policy shared by both clients.
+
+    Subclasses only send the request: ``_post`` loops over ``_delays``, passes
+    each response to ``_parse`` and treats transport errors and
+    ``_RetryableStatus`` as retryable, then raises ``_give_up``.
+    """
+
+    def __init__(self, url, api_key, connect_timeout=3.0, read_timeout=15.0, retries=2,
+                 backoff=0.25, pool_size=10, num_results=10, batch_url=None, breaker=None):
+        self.url = url
+        self.api_key = api_key
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.num_results = num_results
+        self.batch_url = batch_url
+        self.breaker = breaker or CircuitBreaker()
+
+    @property
+    def headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    def _query(self, question):
+        return {"question": question, "numResults": self.num_results}
+
+    def _batch_body(self, questions):
+        return {"queries": [self._query(q) for q in questions]}
+
+    @staticmethod
+    def _batch_results(data, expected):
+        results = data.get("results") if isinstance(data, dict) else None
+        if not isinstance(results, list) or len(results) != expected:
+            raise VectorizeError("Unexpected Vectorize batch response shape")
+        return results
+
+    def _delays(self):
+        """How long to wait before each attempt; raises CircuitOpenError while the breaker is open."""
+        self.breaker.before_call()
+        yield 0.0
+        for attempt in range(self.retries):
+            yield backoff_delay(attempt, self.backoff)
+
+    def _parse(self, res):
+        # requests and httpx responses share status_code, text and json()
+        if res.status_code in RETRY_STATUSES:
+            raise _RetryableStatus(f"Vectorize returned HTTP {res.status_code}")
+        if res.status_code >= 400:
+            # Client errors won't succeed on retry, but the backend is up
+            self.breaker.record_success()
+            raise VectorizeError(f"Vectorize returned HTTP {res.status_code}: {res.text[:200]}")
+        try:
+            data = res.json()
+        except ValueError as e:
+            raise VectorizeError(f"Could not parse Vectorize JSON: {res.text[:200]}") from e
+        self.breaker.record_success()
+        return data
+
+    def _give_up(self, last_error):
+        self.breaker.record_failure()
+        return VectorizeError(f"Vectorize request failed after {self.retries + 1} attempts: {last_error}")
+
+
+class VectorizeClient(_BaseClient):
+    """Vectorize retrieval over a persistent, pooled requests session.
+
+    ``retrieve_many`` sends one request to ``batch_url`` when it is
+    configured and otherwise fans the questions out over the pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._fanout = None
+
+    def _post(self, url, body):
+        last_error = None
+        for delay in self._delays():
+            if delay:
+                time.sleep(delay)
+            try:
+                return self._parse(self.session.post(
+                    url,
+                    headers=self.headers,
+                    json=body,
+                    timeout=(self.connect_timeout, self.read_timeout),
+                ))
+            except (requests.RequestException, _RetryableStatus) as e:
+                last_error = e
+        raise self._give_up(last_error)
+
+    def retrieve(self, question: str):
+        return self._post(self.url, self._query(question))
+
+    def retrieve_many(self, questions):
+        questions = list(questions)
+        if self.batch_url:
+            return self._batch_results(self._post(self.batch_url, self._batch_body(questions)), len(questions))
+
+        if self._fanout is None:
+            self._fanout = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="vectorize")
+        return list(self._fanout.map(self.retrieve, questions))
+
+    def close(self):
+        self.session.close()
+        if self._fanout is not None:
+            self._fanout.shutdown(wait=False)
+
+
+class AsyncVectorizeClient(_BaseClient):
+    """asyncio variant of VectorizeClient backed by a pooled httpx.AsyncClient."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+        )
+
+    async def _post(self, url, body):
+        last_error = None
+        for delay in self._delays():
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                return self._parse(await self.client.post(url, headers=self.headers, json=body))
+            except (httpx.HTTPError, _RetryableStatus) as e:
+                last_error = e
+        raise self._give_up(last_error)
+
+    async def retrieve(self, question: str):
+        return await self._post(self.url, self._query(question))
+
+    async def retrieve_many(self, questions):
+        questions = list(questions)
+        if self.batch_url:
+            return self._batch_results(await self._post(self.batch_url, self._batch_body(questions)), len(questions))
+        return list(await asyncio.gather(*(self.retrieve(q) for q in questions)))
+
+    async def aclose(self):
+        await self.client.aclose()